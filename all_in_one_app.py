@@ -5,6 +5,9 @@ import plotly.graph_objects as go
 import warnings
 import logging
 import os
+import hashlib
+import tempfile
+import uuid
 
 from datetime import timedelta
 from snowflake.snowpark import Session
@@ -56,14 +59,77 @@ def create_snowflake_session(creds: dict = None, **kwargs) -> Session:
             logging.info(f"Error creating Snowpark session: {e}")
             return None
 
-def run_query(query):
-    df = create_snowflake_session().sql(query).to_pandas()
+def run_query(query, session=None):
+    df = (session or create_snowflake_session()).sql(query).to_pandas()
     return df
 
-def run_command(query):
-    df = create_snowflake_session().sql(query).collect()
+def run_command(query, session=None):
+    df = (session or create_snowflake_session()).sql(query).collect()
     return df
 
+def is_active_session(session) -> bool:
+    # The SiS session belongs to the platform and must not be closed by the app
+    try:
+        return session is get_active_session()
+    except Exception:
+        return False
+
+ACCESS_SUMMARY_TABLE = "storage_table_access_summary"
+
+def refresh_access_summary():
+    # Keeps a per-table last-access summary current by merging only ACCESS_HISTORY rows
+    # newer than its high-water mark (minus the view's three hour landing latency)
+    run_command(f"""
+    CREATE TABLE IF NOT EXISTS {ACCESS_SUMMARY_TABLE} (
+        table_id INTEGER,
+        last_accessed_at TIMESTAMP_LTZ,
+        last_accessed_by TEXT,
+        last_query_id TEXT
+    )
+    """)
+    high_water_mark = run_query(f"SELECT MAX(last_accessed_at) AS high_water_mark FROM {ACCESS_SUMMARY_TABLE}")['HIGH_WATER_MARK'].iloc[0]
+    if pd.isna(high_water_mark):
+        since = "'1970-01-01'::TIMESTAMP_LTZ"
+    else:
+        since = f"DATEADD(hour, -3, '{high_water_mark.isoformat()}'::TIMESTAMP_LTZ)"
+
+    run_command(f"""
+    MERGE INTO {ACCESS_SUMMARY_TABLE} AS summary
+    USING (
+        WITH
+        access_history AS (
+            SELECT query_id, query_start_time, user_name, base_objects_accessed
+            FROM snowflake.account_usage.access_history
+            WHERE query_start_time > {since}
+        ),
+        table_access_history AS (
+            SELECT
+                access_history.query_id,
+                access_history.query_start_time,
+                access_history.user_name,
+                objects_accessed.value:objectId::integer AS table_id
+            FROM access_history, LATERAL FLATTEN(access_history.base_objects_accessed) AS objects_accessed
+            WHERE
+                objects_accessed.value:objectDomain::text = 'Table'
+                AND objects_accessed.value:objectId IS NOT NULL
+        )
+        SELECT
+            table_id,
+            MAX(query_start_time) AS last_accessed_at,
+            MAX_BY(user_name, query_start_time) AS last_accessed_by,
+            MAX_BY(query_id, query_start_time) AS last_query_id
+        FROM table_access_history
+        GROUP BY 1
+    ) AS changes
+    ON summary.table_id = changes.table_id
+    WHEN MATCHED AND changes.last_accessed_at > summary.last_accessed_at THEN UPDATE SET
+        last_accessed_at = changes.last_accessed_at,
+        last_accessed_by = changes.last_accessed_by,
+        last_query_id = changes.last_query_id
+    WHEN NOT MATCHED THEN INSERT (table_id, last_accessed_at, last_accessed_by, last_query_id)
+        VALUES (changes.table_id, changes.last_accessed_at, changes.last_accessed_by, changes.last_query_id)
+    """)
+
 # Initialize session state
 if 'storage_data' not in st.session_state:
     st.session_state.storage_data = None
@@ -79,6 +145,8 @@ if 'actual_data' not in st.session_state:
     st.session_state.actual_data = None
 if 'unused_tables' not in st.session_state:
     st.session_state.unused_tables = None
+if 'table_access' not in st.session_state:
+    st.session_state.table_access = None
 
 # Streamlit app
 st.title("Snowflake Storage Analysis")
@@ -179,16 +247,21 @@ with col1:
 with col2:
     storage_cost_per_tb = st.number_input("Storage cost per TB per month ($)", min_value=0.0, value=st.session_state.storage_cost_per_tb)
 
-# Re-run the query only if the inputs have changed
-if st.session_state.unused_tables is None or \
-   unused_days != st.session_state.unused_days or \
-   storage_cost_per_tb != st.session_state.storage_cost_per_tb:
-    
-    st.session_state.unused_days = unused_days
-    st.session_state.storage_cost_per_tb = storage_cost_per_tb
-
-    unused_tables_query = f"""
-    WITH
+# Fetch the per-table storage and last access once, at the widest window (1 day);
+# cost and day-threshold changes are applied locally below
+if st.session_state.table_access is None:
+    # Prefer the incrementally maintained summary table; fall back to a full scan
+    # when the current schema does not allow creating it
+    try:
+        with st.spinner("Refreshing table access summary..."):
+            refresh_access_summary()
+        table_access_summary_cte = f"""
+    table_access_summary AS (
+        SELECT * FROM {ACCESS_SUMMARY_TABLE}
+    ),"""
+    except Exception as e:
+        logging.info(f"Could not refresh {ACCESS_SUMMARY_TABLE}, scanning full access history instead: {e}")
+        table_access_summary_cte = """
     access_history AS (
         SELECT *
         FROM snowflake.account_usage.access_history
@@ -224,13 +297,15 @@ if st.session_state.unused_tables is None or \
             MAX_BY(query_id, query_start_time) AS last_query_id
         FROM table_access_history
         GROUP BY 1
-    ),
+    ),"""
+
+    unused_tables_query = f"""
+    WITH{table_access_summary_cte}
     table_storage_metrics AS (
         SELECT
             id AS table_id,
             table_catalog || '.' ||table_schema ||'.' || table_name AS fully_qualified_table_name,
-            (active_bytes + time_travel_bytes + failsafe_bytes + retained_for_clone_bytes)/POWER(1024,4) AS total_storage_tb,
-            total_storage_tb*12*{storage_cost_per_tb} AS annualized_storage_cost
+            (active_bytes + time_travel_bytes + failsafe_bytes + retained_for_clone_bytes)/POWER(1024,4) AS total_storage_tb
         FROM snowflake.account_usage.table_storage_metrics
         WHERE
             NOT deleted
@@ -243,12 +318,25 @@ if st.session_state.unused_tables is None or \
     INNER JOIN table_access_summary
         ON table_storage_metrics.table_id=table_access_summary.table_id
     WHERE
-        last_accessed_at < DATEADD(day, -{unused_days}, CURRENT_DATE())
-    ORDER BY table_storage_metrics.annualized_storage_cost DESC
+        last_accessed_at < DATEADD(day, -1, CURRENT_DATE())
+    ORDER BY table_storage_metrics.total_storage_tb DESC
     """
 
     with st.spinner("Analyzing unused tables..."):
-        st.session_state.unused_tables = run_query(unused_tables_query)
+        st.session_state.table_access = run_query(unused_tables_query)
+
+# DATEDIFF(day, ts, CURRENT_DATE()) > n matches ts < DATEADD(day, -n, CURRENT_DATE()); the frame
+# is already ordered by storage, which is the same order as cost
+st.session_state.unused_days = unused_days
+st.session_state.storage_cost_per_tb = storage_cost_per_tb
+table_access = st.session_state.table_access
+# Tables with no known last access (NA days) are never selected
+unused_tables = table_access.loc[(table_access['DAYS_SINCE_LAST_ACCESS'] > unused_days).to_numpy(dtype=bool, na_value=False)]
+unused_tables = unused_tables.assign(ANNUALIZED_STORAGE_COST=unused_tables['TOTAL_STORAGE_TB'] * (12 * storage_cost_per_tb))
+st.session_state.unused_tables = unused_tables[[
+    'TABLE_ID', 'FULLY_QUALIFIED_TABLE_NAME', 'TOTAL_STORAGE_TB', 'ANNUALIZED_STORAGE_COST',
+    'LAST_ACCESSED_AT', 'LAST_ACCESSED_BY', 'LAST_QUERY_ID', 'DAYS_SINCE_LAST_ACCESS'
+]].reset_index(drop=True)
 
 # Display the results
 if st.session_state.unused_tables.empty:
@@ -259,20 +347,38 @@ else:
     st.write(f"Total potential annual savings: ${total_savings:.2f}")
     st.dataframe(st.session_state.unused_tables)
 
+    # The chart is only rebuilt when the top 10 rows change, not on every rerun
     top_10_unused = st.session_state.unused_tables.nlargest(10, 'ANNUALIZED_STORAGE_COST')
-    fig = px.bar(top_10_unused, x='FULLY_QUALIFIED_TABLE_NAME', y='ANNUALIZED_STORAGE_COST',
-                    title="Top 10 Unused Tables by Annualized Storage Cost")
-    fig.update_layout(xaxis_title="Table Name", yaxis_title="Annualized Storage Cost ($)")
-    st.session_state.unused_fig = fig
-    st.plotly_chart(st.session_state.unused_fig)
+    # Column names, dtypes and every row hash in order, so reordered or relabelled frames get a new key
+    fig_key = hashlib.blake2b(
+        repr((list(top_10_unused.columns), [str(dtype) for dtype in top_10_unused.dtypes])).encode()
+        + pd.util.hash_pandas_object(top_10_unused).to_numpy().tobytes(), digest_size=16).hexdigest()
+    if st.session_state.get('unused_fig') is None or st.session_state.unused_fig[0] != fig_key:
+        fig = px.bar(top_10_unused, x='FULLY_QUALIFIED_TABLE_NAME', y='ANNUALIZED_STORAGE_COST',
+                        title="Top 10 Unused Tables by Annualized Storage Cost")
+        fig.update_layout(xaxis_title="Table Name", yaxis_title="Annualized Storage Cost ($)")
+        st.session_state.unused_fig = (fig_key, fig)
+    st.plotly_chart(st.session_state.unused_fig[1])
     
-    csv = st.session_state.unused_tables.to_csv(index=False)
-    st.download_button(
-        label="Download full results as CSV",
-        data=csv,
-        file_name="unused_tables_analysis.csv",
-        mime="text/csv",
-    )
+    # Build the CSV only when asked for, in chunks, into a file that spills to disk when large
+    export_key = (unused_days, storage_cost_per_tb)
+    if st.button("Prepare CSV download"):
+        export = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+        unused_tables = st.session_state.unused_tables
+        for start in range(0, len(unused_tables), 50_000):
+            chunk = unused_tables.iloc[start:start + 50_000]
+            export.write(chunk.to_csv(index=False, header=start == 0).encode('utf-8'))
+        # download_button takes bytes; read them once here rather than on every rerun
+        export.seek(0)
+        st.session_state.unused_export = (export_key, export.read())
+        export.close()
+    if st.session_state.get('unused_export') and st.session_state.unused_export[0] == export_key:
+        st.download_button(
+            label="Download full results as CSV",
+            data=st.session_state.unused_export[1],
+            file_name="unused_tables_analysis.csv",
+            mime="text/csv",
+        )
 
 
 # Storage Prediction
@@ -290,66 +396,96 @@ if st.session_state.forecast_generated:
     
     if st.button("Run Forecast"):
     
-        with st.spinner("Generating forecast..."):
-            # Step 1: Create training table
-            st.text("Step 1/4: Creating training table...")
-            run_command(f"""
-            CREATE OR REPLACE TABLE storage_usage_train AS
-            SELECT 
-                TO_TIMESTAMP_NTZ(usage_date) AS usage_date,
-                storage_bytes / POWER(1024, 3) AS storage_gb
-            FROM snowflake.account_usage.storage_usage
-            WHERE TO_TIMESTAMP_NTZ(usage_date) < DATEADD(day, -{training_days}, CURRENT_DATE());
-            """)
-
-            # Step 2: Create forecast model
-            st.text("Step 2/4: Creating forecast model...")
-            run_command("""
-            CREATE OR REPLACE snowflake.ml.forecast storage_forecast_model(
-                input_data => system$reference('table', 'storage_usage_train'),
-                timestamp_colname => 'usage_date',
-                target_colname => 'storage_gb'
-            );
-            """)
-
-            # Step 3: Generate forecasts
-            st.text("Step 3/4: Generating forecasts...")
-            run_command(f"""
-            CREATE OR REPLACE TABLE storage_forecast_results AS
-            SELECT
-                ts AS usage_date,
-                CASE WHEN forecast < 0 THEN 0 ELSE forecast END AS forecast_gb,
-                CASE WHEN lower_bound < 0 THEN 0 ELSE lower_bound END AS lower_bound_gb,
-                CASE WHEN upper_bound < 0 THEN 0 ELSE upper_bound END AS upper_bound_gb
-            FROM
-                TABLE(storage_forecast_model!FORECAST(
-                    FORECASTING_PERIODS => {predicted_days},
-                    CONFIG_OBJECT => {{'prediction_interval': 0.95}}
-                ));
-            """)
-
-            # Step 4: Fetch results
-            st.text("Step 4/4: Fetching results...")
-            forecast_query = """
-            SELECT 
-                usage_date,
-                forecast_gb,
-                lower_bound_gb,
-                upper_bound_gb
-            FROM storage_forecast_results
-            ORDER BY usage_date
-            """
-            st.session_state.forecast_data = run_query(forecast_query)
+        # Session-scoped temporary tables with per-run names, so concurrent users never share
+        # objects and nothing is left behind if a step fails
+        run_id = uuid.uuid4().hex[:12]
+        training_table = f"storage_usage_train_{run_id}"
+        results_table = f"storage_forecast_results_{run_id}"
+        model_name = f"storage_forecast_model_{run_id}"
+
+        # Temporary tables and the model only exist in the session that created them, so
+        # every step runs on this one session instead of a fresh one per statement
+        forecast_session = create_snowflake_session()
+        if forecast_session is None:
+            st.error("Could not open a Snowflake session for the forecast.")
+            st.stop()
 
-            actual_data_query = """
-            SELECT 
-                usage_date,
-                storage_bytes / POWER(1024, 3) AS storage_gb
-            FROM snowflake.account_usage.storage_usage
-            WHERE usage_date >= DATEADD(day, -30, CURRENT_DATE())
-            ORDER BY usage_date
-            """
-            st.session_state.actual_data = run_query(actual_data_query)
+        with st.spinner("Generating forecast..."):
+            try:
+                # Step 1: Create training table
+                st.text("Step 1/4: Creating training table...")
+                run_command(f"""
+                CREATE TEMPORARY TABLE {training_table} AS
+                SELECT 
+                    TO_TIMESTAMP_NTZ(usage_date) AS usage_date,
+                    storage_bytes / POWER(1024, 3) AS storage_gb
+                FROM snowflake.account_usage.storage_usage
+                WHERE TO_TIMESTAMP_NTZ(usage_date) < DATEADD(day, -{training_days}, CURRENT_DATE());
+                """, session=forecast_session)
+
+                # Step 2: Create forecast model
+                st.text("Step 2/4: Creating forecast model...")
+                run_command(f"""
+                CREATE snowflake.ml.forecast {model_name}(
+                    input_data => system$reference('table', '{training_table}'),
+                    timestamp_colname => 'usage_date',
+                    target_colname => 'storage_gb'
+                );
+                """, session=forecast_session)
+
+                # Step 3: Generate forecasts
+                st.text("Step 3/4: Generating forecasts...")
+                run_command(f"""
+                CREATE TEMPORARY TABLE {results_table} AS
+                SELECT
+                    ts AS usage_date,
+                    CASE WHEN forecast < 0 THEN 0 ELSE forecast END AS forecast_gb,
+                    CASE WHEN lower_bound < 0 THEN 0 ELSE lower_bound END AS lower_bound_gb,
+                    CASE WHEN upper_bound < 0 THEN 0 ELSE upper_bound END AS upper_bound_gb
+                FROM
+                    TABLE({model_name}!FORECAST(
+                        FORECASTING_PERIODS => {predicted_days},
+                        CONFIG_OBJECT => {{'prediction_interval': 0.95}}
+                    ));
+                """, session=forecast_session)
+
+                # Step 4: Fetch results
+                st.text("Step 4/4: Fetching results...")
+                forecast_query = f"""
+                SELECT 
+                    usage_date,
+                    forecast_gb,
+                    lower_bound_gb,
+                    upper_bound_gb
+                FROM {results_table}
+                ORDER BY usage_date
+                """
+                st.session_state.forecast_data = run_query(forecast_query, session=forecast_session)
+
+                actual_data_query = """
+                SELECT 
+                    usage_date,
+                    storage_bytes / POWER(1024, 3) AS storage_gb
+                FROM snowflake.account_usage.storage_usage
+                WHERE usage_date >= DATEADD(day, -30, CURRENT_DATE())
+                ORDER BY usage_date
+                """
+                st.session_state.actual_data = run_query(actual_data_query, session=forecast_session)
+            finally:
+                try:
+                    # Clean up created objects in a single round trip
+                    run_command(f"""
+                    EXECUTE IMMEDIATE $$
+                    BEGIN
+                        DROP TABLE IF EXISTS {results_table};
+                        DROP MODEL IF EXISTS {model_name};
+                        DROP TABLE IF EXISTS {training_table};
+                    END;
+                    $$
+                    """, session=forecast_session)
+                finally:
+                    if not is_active_session(forecast_session):
+                        forecast_session.close()
 
         st.success("Forecast generated successfully!")
 
@@ -381,27 +517,36 @@ if st.session_state.forecast_generated:
         st.write(f"- Upper Bound: ${upper_bound_monthly_cost:.2f}")
         st.write(f"- Lower Bound: ${lower_bound_monthly_cost:.2f}")
 
-        # Clean up created objects
-        cleanup_commands = """
-        DROP TABLE IF EXISTS storage_usage_train;
-        DROP TABLE IF EXISTS storage_usage_predict;
-        DROP TABLE IF EXISTS storage_forecast_results;
-        DROP MODEL IF EXISTS storage_forecast_model;
-        """
-
-        for command in cleanup_commands.split(';'):
-            if command.strip():
-                run_command(command)
-
 # Provide recommendations
 st.subheader("Recommendations")
 
+recommendations = []
+
 # Storage breakdown recommendations
 if st.session_state.breakdown_data is not None:
     stage_pct = st.session_state.breakdown_data["Stage %"].iloc[0]
     failsafe_pct = st.session_state.breakdown_data["Fail-Safe %"].iloc[0]
 
-recommendations = []
+    if stage_pct > 10:
+        recommendations.append({
+            "type": "warning",
+            "title": "Stage Storage Bloat",
+            "content": f"""
+            - Stages hold {stage_pct:.1f}% of account storage
+            - Remove loaded files with PURGE = TRUE on COPY INTO or a scheduled REMOVE
+            - Review internal stages for old unloads and exports
+            """
+        })
+    if failsafe_pct > 20:
+        recommendations.append({
+            "type": "warning",
+            "title": "High Fail-Safe Share",
+            "content": f"""
+            - Fail-safe holds {failsafe_pct:.1f}% of account storage
+            - Recreate staging and easily reloaded tables as TRANSIENT, which have no fail-safe
+            - Avoid full table rewrites where incremental loads are possible
+            """
+        })
 
 # Storage growth recommendations
 if 'forecast_data' in st.session_state and st.session_state.forecast_data is not None and not st.session_state.forecast_data.empty:
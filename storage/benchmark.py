@@ -0,0 +1,170 @@
+import sys
+import json
+import time
+import platform
+import statistics
+import tracemalloc
+
+from datetime import datetime, timezone
+from storage.forecast import LocalForecastBackend
+from storage.local import LocalSession, reset_local_database
+from storage.progress import NullProgress
+from storage.queries import clear_query_cache, run_command, run_query
+from storage.recommendations import generate_recommendations, load_table_details, recommendation_engine
+from storage.rollup import ROLLUP_TABLE, dashboard_queries, reset_rollup_refresh
+from storage.unused_tables import (
+    ACCESS_SUMMARY_TABLE,
+    filter_unused_tables,
+    load_table_access,
+    reset_access_summary_refresh
+)
+from storage.visualization import (
+    clear_figure_cache,
+    build_monthly_storage_figure,
+    build_daily_storage_figure,
+    build_storage_breakdown_figure,
+    build_unused_tables_figure,
+    build_storage_forecast_figure
+)
+
+# Synthetic account sizes as (tables, access history rows); all run on the local backend
+BENCHMARK_SIZES = {
+    '1k': (1_000, 100_000),
+    '100k': (100_000, 1_000_000),
+    '10m': (10_000_000, 10_000_000),
+}
+BENCHMARK_REPEAT = 3
+REGRESSION_TOLERANCE = 0.2
+
+
+def _stage(timings, name, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[name] = time.perf_counter() - started
+    return result
+
+
+def _render(build, *data):
+    # What plot_* does without a running app: build the figure and serialize it for the browser
+    return build(*data).to_json()
+
+
+def build_page(session, unused_days=90, storage_cost_per_tb=23.0, training_days=60, predicted_days=30):
+    # Every step behind a full dashboard visit, timed per stage
+    timings = {}
+    queries = _stage(timings, 'dashboard_queries', dashboard_queries, session=session)
+    data = {name: _stage(timings, f'run_query.{name}', run_query, query, session=session)
+            for name, query in queries.items()}
+    table_access = _stage(timings, 'run_query.table_access', load_table_access, session=session)
+    unused_tables = _stage(timings, 'filter_unused_tables', filter_unused_tables,
+                           table_access, unused_days, storage_cost_per_tb)
+    forecast_data, actual_data = _stage(timings, 'forecast', LocalForecastBackend().forecast,
+                                        training_days, predicted_days, NullProgress(), session)
+    table_details = _stage(timings, 'run_query.table_details', load_table_details, session=session)
+    _stage(timings, 'generate_recommendations', generate_recommendations,
+           forecast_data, unused_tables, data['breakdown_data'], table_details, storage_cost_per_tb)
+    _stage(timings, 'plot_monthly_storage', _render, build_monthly_storage_figure, data['storage_data'])
+    _stage(timings, 'plot_daily_storage', _render, build_daily_storage_figure, data['daily_storage_data'])
+    _stage(timings, 'plot_storage_breakdown', _render, build_storage_breakdown_figure, data['breakdown_data'])
+    _stage(timings, 'plot_unused_tables', _render, build_unused_tables_figure, unused_tables)
+    _stage(timings, 'plot_storage_forecast', _render, build_storage_forecast_figure, forecast_data, actual_data)
+    return timings
+
+
+def reset_caches(session):
+    # A first visit: no client, figure or rule caches, and the rollup and access summary built from scratch
+    clear_query_cache()
+    clear_figure_cache()
+    recommendation_engine.clear()
+    reset_rollup_refresh()
+    reset_access_summary_refresh()
+    run_command(f"DROP TABLE IF EXISTS {ROLLUP_TABLE}", session=session)
+    run_command(f"DROP TABLE IF EXISTS {ACCESS_SUMMARY_TABLE}", session=session)
+
+
+def _summary(runs):
+    stages = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+    return {'total_seconds': statistics.median(sum(run.values()) for run in runs), 'stages': stages}
+
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def run_benchmark(size, repeat=BENCHMARK_REPEAT, **page_args):
+    tables, access_rows = BENCHMARK_SIZES[size]
+    started = time.perf_counter()
+    reset_local_database(tables=tables, access_rows=access_rows)
+    seed_seconds = time.perf_counter() - started
+    session = LocalSession()
+    try:
+        cold, warm = [], []
+        for _ in range(repeat):
+            reset_caches(session)
+            cold.append(build_page(session, **page_args))
+            warm.append(build_page(session, **page_args))
+
+        # Separate pass, since tracing allocations slows the Python stages down
+        reset_caches(session)
+        tracemalloc.start()
+        try:
+            build_page(session, **page_args)
+            peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        session.close()
+
+    return {
+        'size': size,
+        'tables': tables,
+        'access_rows': access_rows,
+        'repeat': repeat,
+        'seed_seconds': seed_seconds,
+        'cold': _summary(cold),
+        'warm': _summary(warm),
+        'peak_traced_bytes': peak_traced_bytes,
+        'max_rss_bytes': _max_rss_bytes(),
+    }
+
+
+def run_benchmarks(sizes=('1k',), repeat=BENCHMARK_REPEAT, **page_args):
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': [run_benchmark(size, repeat, **page_args) for size in sizes],
+    }
+
+
+def compare_results(baseline, current, tolerance=REGRESSION_TOLERANCE):
+    # Stages that got slower than the baseline by more than the tolerance, per size
+    baseline_by_size = {result['size']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_by_size.get(result['size'])
+        if previous is None:
+            continue
+        for phase in ('cold', 'warm'):
+            pairs = [('total', previous[phase]['total_seconds'], result[phase]['total_seconds'])]
+            pairs += [(name, previous[phase]['stages'].get(name), seconds)
+                      for name, seconds in result[phase]['stages'].items()]
+            for name, before, after in pairs:
+                if before and after > before * (1 + tolerance):
+                    regressions.append(f"{result['size']} {phase} {name}: {before:.3f}s -> {after:.3f}s")
+    return regressions
+
+
+def write_results(results, path=None):
+    payload = json.dumps(results, indent=2)
+    if path:
+        with open(path, 'w') as results_file:
+            results_file.write(payload)
+    else:
+        print(payload)
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import logging
+import argparse
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from storage.fleet import FLEET_ACCOUNT_TIMEOUT, FLEET_ANALYSES, FLEET_RETRIES, FLEET_WORKERS, run_fleet
+from storage.forecast import FORECAST_BACKEND, FORECAST_BACKENDS
+from storage.growth import add_growth_arguments, run_growth
+from storage.progress import LoggingProgress
+from storage.report import REPORT_FORMATS, build_report, write_report
+from storage.retention import add_retention_arguments, run_retention
+from storage.rollup import add_rollup_arguments, run_rollup
+from storage.session import get_session, load_profiles, profile_session_args
+from storage.stages import add_stages_arguments, run_stages
+
+DEFAULT_REPORT_WORKERS = 4
+
+
+def account_report(name, profile, args):
+    creds, kwargs = profile_session_args(profile)
+    session = get_session(creds, **kwargs)
+    if session is None:
+        raise RuntimeError(f"Could not create a session for {name}")
+    report = build_report(
+        session=session,
+        unused_days=args.unused_days,
+        storage_cost_per_tb=args.storage_cost,
+        training_days=args.training_days,
+        predicted_days=args.predicted_days,
+        forecast_backend=args.forecast_backend,
+        progress=LoggingProgress(f"[{name}] "),
+    )
+    return write_report(report, os.path.join(args.output, name), args.format)
+
+
+def selected_profiles(args):
+    # Without a profiles file the report runs once against the environment's connection
+    if not args.profiles:
+        return {'default': {}}
+    profiles = load_profiles(args.profiles)
+    if args.account:
+        missing = set(args.account) - set(profiles)
+        if missing:
+            raise SystemExit(f"Unknown profiles: {', '.join(sorted(missing))}")
+        profiles = {name: profiles[name] for name in args.account}
+    return profiles
+
+
+def run_report(args):
+    profiles = selected_profiles(args)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=min(args.workers, len(profiles))) as executor:
+        futures = {executor.submit(account_report, name, profile, args): name for name, profile in profiles.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                logging.info(f"[{name}] Report written to {future.result()}")
+            except Exception as e:
+                failures += 1
+                logging.error(f"[{name}] Report failed: {e}")
+    return 1 if failures else 0
+
+
+def run_fleet_scan(args):
+    # One merged Parquet file per dataset, tagged by ACCOUNT, plus the accounts that failed
+    merged, errors = run_fleet(
+        selected_profiles(args),
+        analyses=args.analysis,
+        max_workers=args.workers,
+        timeout=args.timeout,
+        retries=args.retries,
+        unused_days=args.unused_days,
+        storage_cost_per_tb=args.storage_cost,
+        training_days=args.training_days,
+        predicted_days=args.predicted_days,
+        forecast_backend=args.forecast_backend,
+    )
+    os.makedirs(args.output, exist_ok=True)
+    for name, data in merged.items():
+        data.to_parquet(os.path.join(args.output, f"{name}.parquet"), index=False)
+    with open(os.path.join(args.output, "errors.json"), 'w') as errors_file:
+        json.dump(errors, errors_file, indent=2)
+    logging.info(f"Fleet scan written to {args.output} ({len(errors)} failed accounts)")
+    return 1 if errors else 0
+
+
+def run_benchmark_suite(args):
+    # Imported here: the benchmark needs DuckDB, which the other commands do not
+    from storage.benchmark import compare_results, run_benchmarks, write_results
+
+    results = run_benchmarks(args.size, args.repeat)
+    write_results(results, args.output)
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            regressions = compare_results(json.load(baseline_file), results, args.tolerance)
+        for regression in regressions:
+            logging.error(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+def add_analysis_arguments(parser):
+    parser.add_argument("--profiles", help="JSON or TOML file of connection profiles")
+    parser.add_argument("--account", action="append", help="Profile to analyze (repeatable, default: all)")
+    parser.add_argument("--unused-days", type=int, default=90)
+    parser.add_argument("--storage-cost", type=float, default=23.0, help="Storage cost per TB per month ($)")
+    parser.add_argument("--training-days", type=int, default=60)
+    parser.add_argument("--predicted-days", type=int, default=30)
+    parser.add_argument("--forecast-backend", choices=sorted(FORECAST_BACKENDS), default=FORECAST_BACKEND)
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="storage_check", description="Snowflake storage analysis without Streamlit.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report = add_analysis_arguments(subparsers.add_parser("report", help="Write storage reports for one or more accounts"))
+    report.add_argument("--output", default="storage_reports", help="Directory for the reports")
+    report.add_argument("--format", nargs="+", choices=REPORT_FORMATS, default=REPORT_FORMATS)
+    report.add_argument("--workers", type=int, default=DEFAULT_REPORT_WORKERS)
+
+    fleet = add_analysis_arguments(subparsers.add_parser("fleet", help="Scan many accounts into merged datasets"))
+    fleet.add_argument("--output", default="storage_fleet", help="Directory for the merged datasets")
+    fleet.add_argument("--analysis", nargs="+", choices=list(FLEET_ANALYSES), default=list(FLEET_ANALYSES))
+    fleet.add_argument("--workers", type=int, default=FLEET_WORKERS)
+    fleet.add_argument("--timeout", type=int, default=FLEET_ACCOUNT_TIMEOUT, help="Seconds per account")
+    fleet.add_argument("--retries", type=int, default=FLEET_RETRIES)
+
+    benchmark = subparsers.add_parser("benchmark", help="Time the dashboard pipeline on synthetic accounts")
+    benchmark.add_argument("--size", nargs="+", choices=["1k", "100k", "10m"], default=["1k"],
+                           help="Number of tables in the synthetic account")
+    benchmark.add_argument("--repeat", type=int, default=3)
+    benchmark.add_argument("--output", help="JSON results file (default: stdout)")
+    benchmark.add_argument("--baseline", help="Earlier results to check for regressions")
+    benchmark.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a stage counts as a regression")
+
+    rollup = subparsers.add_parser("rollup", help="Refresh the storage usage rollup table")
+    add_rollup_arguments(rollup)
+
+    growth = subparsers.add_parser("growth", help="Snapshot table storage and rank growth contributors")
+    add_growth_arguments(growth)
+
+    retention = subparsers.add_parser("retention", help="Simulate time travel and fail-safe savings per table")
+    add_retention_arguments(retention)
+
+    stages = subparsers.add_parser("stages", help="Summarize internal stage files and flag stale ones")
+    add_stages_arguments(stages)
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "report":
+        return run_report(args)
+    if args.command == "fleet":
+        return run_fleet_scan(args)
+    if args.command == "benchmark":
+        return run_benchmark_suite(args)
+    if args.command == "growth":
+        run_growth(args, parser)
+        return 0
+    if args.command == "retention":
+        run_retention(args)
+        return 0
+    if args.command == "stages":
+        run_stages(args)
+        return 0
+    run_rollup(args, parser)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
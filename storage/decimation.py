@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+# Point reduction for line charts. min-max keeps every peak and trough of each bucket;
+# LTTB (largest triangle three buckets) keeps the points that best preserve the shape.
+# LTTB runs on a min-max preselection (MinMaxLTTB), so its sequential pass only ever
+# sees a few points per output point, however long the input series is.
+
+MINMAX_PRESELECTION_RATIO = 4
+DECIMATION_METHODS = ('lttb', 'minmax')
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(float)
+    # Categories such as month labels are plotted in order, so their position is their x
+    return np.arange(len(values), dtype=float)
+
+
+def minmax_indices(y, n_out):
+    # Index of the minimum and maximum of each of (n_out - 2) // 2 equal buckets, plus the end
+    # points, so at most n_out indices
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    size = -(-n // ((n_out - 2) // 2))
+    buckets = -(-n // size)
+    padding = buckets * size - n
+    # NaNs and padding are never picked over a real value
+    high = np.pad(np.where(np.isnan(y), -np.inf, y), (0, padding), constant_values=-np.inf).reshape(buckets, size)
+    low = np.pad(np.where(np.isnan(y), np.inf, y), (0, padding), constant_values=np.inf).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    selected = np.concatenate([[0, n - 1], offsets + high.argmax(axis=1), offsets + low.argmin(axis=1)])
+    return np.unique(selected[selected < n])
+
+
+def _lttb(x, y, n_out):
+    n = len(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], np.maximum(edges[1:], edges[:-1] + 1)
+    # Bucket means for every bucket at once, from cumulative sums
+    sum_x = np.concatenate([[0.0], np.cumsum(x)])
+    sum_y = np.concatenate([[0.0], np.cumsum(np.nan_to_num(y))])
+    mean_x = (sum_x[ends] - sum_x[starts]) / (ends - starts)
+    mean_y = (sum_y[ends] - sum_y[starts]) / (ends - starts)
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    # Only the anchor (the previously selected point) is sequential
+    for bucket, (start, end) in enumerate(zip(starts, ends)):
+        area = np.abs((x[anchor] - next_x[bucket]) * (y[start:end] - y[anchor])
+                      - (x[anchor] - x[start:end]) * (next_y[bucket] - y[anchor]))
+        anchor = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[bucket + 1] = anchor
+    return np.unique(selected)
+
+
+def lttb_indices(x, y, n_out):
+    x, y = _as_float(x), np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    if n > n_out * MINMAX_PRESELECTION_RATIO:
+        preselected = minmax_indices(y, n_out * MINMAX_PRESELECTION_RATIO)
+        return preselected[_lttb(x[preselected], y[preselected], n_out)]
+    return _lttb(x, y, n_out)
+
+
+def decimation_indices(x, y, n_out, method='lttb'):
+    if method == 'minmax':
+        return minmax_indices(y, n_out)
+    return lttb_indices(x, y, n_out)
+
+
+def _x_values(column):
+    # Datetimes of any kind (tz-aware, Arrow-backed, dates) become integers in their own unit;
+    # LTTB only compares areas, so the unit does not matter. Any other non-numeric x, such as
+    # month labels, is plotted in order and so is spaced evenly by position.
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return pd.to_datetime(column).astype('int64').to_numpy(dtype=float)
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=float, na_value=np.nan)
+    return np.arange(len(column), dtype=float)
+
+
+def decimate(data, x, y, budget, method='lttb', group=None):
+    # Rows of data to plot, at most budget per group (each group is one series per y column).
+    # Every y column shares the rows, so each is reduced to its share of the budget and the
+    # union of the rows they need is kept; at least 4 rows per column are kept regardless.
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Unknown decimation method '{method}', expected one of {DECIMATION_METHODS}.")
+    columns = [y] if isinstance(y, str) else list(y)
+    if group is None:
+        positions = [np.arange(len(data))]
+    else:
+        positions = [np.asarray(rows) for rows in data.groupby(group, sort=False, observed=True).indices.values()]
+    if all(len(rows) <= budget for rows in positions):
+        return data
+    share = max(budget // len(columns), 4)
+    x_all = _x_values(data[x])
+    keep = []
+    for rows in positions:
+        x_values = x_all[rows]
+        for column in columns:
+            y_values = data[column].to_numpy(dtype=float, na_value=np.nan)[rows]
+            keep.append(rows[decimation_indices(x_values, y_values, share, method)])
+    return data.iloc[np.unique(np.concatenate(keep))]
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from storage.queries import run_query
+
+# Account -> database -> schema -> table storage, aggregated at every level by one
+# GROUPING SETS query per refresh. StorageCube indexes the result by path, so moving
+# between levels is a dictionary lookup instead of another warehouse query.
+
+DRILLDOWN_LEVELS = ['TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME']
+DRILLDOWN_BYTE_COLUMNS = ['ACTIVE_BYTES', 'TIME_TRAVEL_BYTES', 'FAILSAFE_BYTES', 'RETAINED_FOR_CLONE_BYTES']
+# Children shown per node in a chart; the rest are folded into one "Other" node
+DRILLDOWN_TOP_CHILDREN = 25
+
+DRILLDOWN_QUERY = f"""
+    SELECT
+        3 - GROUPING(table_catalog) - GROUPING(table_schema) - GROUPING(table_name) AS depth,
+        table_catalog,
+        table_schema,
+        table_name,
+        COUNT(*) AS tables,
+        {', '.join(f'SUM({column})::DOUBLE AS {column}' for column in map(str.lower, DRILLDOWN_BYTE_COLUMNS))},
+        SUM(active_bytes + time_travel_bytes + failsafe_bytes + retained_for_clone_bytes)::DOUBLE AS total_bytes
+    FROM snowflake.account_usage.table_storage_metrics
+    WHERE
+        NOT deleted
+    GROUP BY GROUPING SETS (
+        (),
+        (table_catalog),
+        (table_catalog, table_schema),
+        (table_catalog, table_schema, table_name)
+    )
+"""
+
+
+class StorageCube:
+    def __init__(self, cube):
+        # Largest first, so every node's children come out of the index already ranked
+        frame = cube.assign(DEPTH=cube['DEPTH'].astype(int))
+        self.frame = frame.sort_values(['DEPTH', 'TOTAL_BYTES'], ascending=[True, False]).reset_index(drop=True)
+        self.nodes = {}
+        self.children_of = {}
+        depths = self.frame['DEPTH'].to_numpy()
+        for depth in range(len(DRILLDOWN_LEVELS) + 1):
+            rows = np.flatnonzero(depths == depth)
+            level = self.frame.iloc[rows]
+            # Tables are too many to index one by one; node() finds them among their schema's rows
+            if depth < len(DRILLDOWN_LEVELS):
+                paths = zip(*(level[column].tolist() for column in DRILLDOWN_LEVELS[:depth])) if depth else [()]
+                self.nodes.update(zip(paths, rows))
+            if depth == 1:
+                self.children_of[()] = rows
+            elif depth > 1:
+                parents = level.groupby(DRILLDOWN_LEVELS[:depth - 1], sort=False, dropna=False).indices
+                for parent, positions in parents.items():
+                    self.children_of[parent if isinstance(parent, tuple) else (parent,)] = rows[positions]
+
+    def node(self, path=()):
+        path = tuple(path)
+        if path in self.nodes:
+            return self.frame.iloc[self.nodes[path]]
+        siblings = self.children(path[:-1])
+        matches = siblings[(siblings[DRILLDOWN_LEVELS[len(path) - 1]] == path[-1]).to_numpy(dtype=bool, na_value=False)]
+        if matches.empty:
+            raise KeyError(path)
+        return matches.iloc[0]
+
+    def children(self, path=(), n=None):
+        rows = self.children_of.get(tuple(path), np.array([], dtype=int))
+        return self.frame.iloc[rows if n is None else rows[:n]]
+
+    def summary(self, path=(), n=DRILLDOWN_TOP_CHILDREN):
+        # The largest children of path in GB, for a table next to the chart
+        children = self.children(path, n)
+        if len(path) >= len(DRILLDOWN_LEVELS):
+            return children.iloc[:0]
+        summary = children[[DRILLDOWN_LEVELS[len(path)], 'TABLES']].reset_index(drop=True)
+        for column in DRILLDOWN_BYTE_COLUMNS + ['TOTAL_BYTES']:
+            summary[column.replace('_BYTES', '_GB')] = children[column].to_numpy(dtype=float) / 1024 ** 3
+        return summary
+
+    def hierarchy(self, path=(), depth=2, n=DRILLDOWN_TOP_CHILDREN):
+        # Nodes under path, depth levels down, as ID/PARENT/LABEL rows for a treemap or sunburst
+        path = tuple(path)
+        root = self.node(path)
+        records = [_record(path, None, root)]
+        level = [path]
+        for _ in range(depth):
+            next_level = []
+            for parent in level:
+                rows = self.children_of.get(parent)
+                if rows is None:
+                    continue
+                for child in self.frame.iloc[rows[:n]].itertuples(index=False):
+                    child_path = parent + (getattr(child, DRILLDOWN_LEVELS[len(parent)]),)
+                    records.append(_record(child_path, parent, child._asdict()))
+                    next_level.append(child_path)
+                if len(rows) > n:
+                    rest = self.frame.iloc[rows[n:]]
+                    other = {'TABLES': rest['TABLES'].sum(), 'TOTAL_BYTES': rest['TOTAL_BYTES'].sum(),
+                             **{column: rest[column].sum() for column in DRILLDOWN_BYTE_COLUMNS}}
+                    records.append(_record(parent + (f"Other ({len(rest)})",), parent, other))
+            level = next_level
+        hierarchy = pd.DataFrame(records)
+        hierarchy['TOTAL_GB'] = hierarchy['TOTAL_BYTES'] / 1024 ** 3
+        return hierarchy
+
+
+def _record(path, parent, values):
+    return {
+        'ID': '/'.join(map(str, path)) or 'Account',
+        'PARENT': '' if parent is None else '/'.join(map(str, parent)) or 'Account',
+        'LABEL': str(path[-1]) if path else 'Account',
+        'TABLES': values['TABLES'],
+        'TOTAL_BYTES': values['TOTAL_BYTES'],
+        **{column: values[column] for column in DRILLDOWN_BYTE_COLUMNS},
+    }
+
+
+def load_storage_cube(session=None, use_cache=True):
+    cube = run_query(DRILLDOWN_QUERY, use_cache=use_cache, session=session, result_format='arrow_pandas')
+    return None if cube is None else StorageCube(cube)
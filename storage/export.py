@@ -0,0 +1,100 @@
+import tempfile
+
+from storage.frames import is_arrow_table
+from storage.queries import run_command, run_query
+from storage.stages import stage_identifier, stage_path
+
+EXPORT_CHUNK_ROWS = 50_000
+# Exports stay in memory up to this size and spill to a temporary file beyond it
+EXPORT_SPOOL_BYTES = 32 * 1024 * 1024
+EXPORT_MIME_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def _batches(source, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Yields pandas frames from a frame, a pyarrow.Table or an iterator of frames
+    if is_arrow_table(source):
+        for batch in source.to_batches(max_chunksize=chunk_rows):
+            yield batch.to_pandas()
+    elif hasattr(source, 'iloc'):
+        for start in range(0, max(len(source), 1), chunk_rows):
+            yield source.iloc[start:start + chunk_rows]
+    else:
+        yield from source
+
+
+def write_csv(source, file, chunk_rows=EXPORT_CHUNK_ROWS):
+    header = True
+    for batch in _batches(source, chunk_rows):
+        file.write(batch.to_csv(index=False, header=header).encode('utf-8'))
+        header = False
+    return file
+
+
+def write_parquet(source, file, chunk_rows=EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for batch in _batches(source, chunk_rows):
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(file, table.schema)
+            writer.write_table(table)
+        if writer is None:
+            # An empty Arrow table has no batches but still has a schema to write; an empty
+            # iterator has neither, and a zero-byte file would not be valid parquet
+            if not is_arrow_table(source):
+                raise ValueError("Nothing to export: the source yielded no batches.")
+            pq.write_table(source.schema.empty_table(), file)
+    finally:
+        if writer is not None:
+            writer.close()
+    return file
+
+
+EXPORT_WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+}
+
+
+def export_file(source, export_format='csv'):
+    # Returns a rewound file object; large exports live on disk rather than in one string
+    file = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    EXPORT_WRITERS[export_format](source, file)
+    file.seek(0)
+    return file
+
+
+def export_bytes(source, export_format='csv'):
+    # st.download_button takes bytes; read the finished export once and keep those
+    with export_file(source, export_format) as file:
+        return file.read()
+
+
+def export_query(query, export_format='csv', session=None):
+    # Streams the result batch by batch straight into the export file
+    return export_file(run_query(query, session=session, result_format='batches'), export_format)
+
+
+def unload_to_stage(query, stage, path, export_format='parquet', session=None):
+    # Server-side unload for results too large to pull through the client; stage may come from user input
+    file_format = "TYPE = PARQUET" if export_format == 'parquet' else \
+        "TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '\"' COMPRESSION = GZIP"
+    return run_command(f"""
+    COPY INTO @{stage_identifier(stage)}/{stage_path(path)}
+    FROM ({query})
+    FILE_FORMAT = ({file_format})
+    HEADER = TRUE
+    OVERWRITE = TRUE
+    """, session=session)
+
+
+def stage_file_url(stage, path, expiration_seconds=3600, session=None):
+    result = run_query(f"SELECT GET_PRESIGNED_URL(@{stage_identifier(stage)}, '{stage_path(path)}', {int(expiration_seconds)}) AS url",
+                       use_cache=False, session=session)
+    return result['URL'].iloc[0]
@@ -0,0 +1,179 @@
+import os
+import time
+import queue
+import logging
+import threading
+import pandas as pd
+
+from storage.forecast import generate_storage_forecast
+from storage.progress import LoggingProgress
+from storage.queries import run_command, run_query
+from storage.rollup import dashboard_queries
+from storage.session import has_active_session, new_session, profile_session_args
+from storage.unused_tables import load_unused_tables
+
+FLEET_WORKERS = int(os.getenv('STORAGE_FLEET_WORKERS', 8))
+# Wall-clock budget per account once its worker starts; also applied server-side
+# as STATEMENT_TIMEOUT_IN_SECONDS so a stuck query cannot outlive it
+FLEET_ACCOUNT_TIMEOUT = int(os.getenv('STORAGE_FLEET_TIMEOUT', 15 * 60))
+FLEET_RETRIES = 2
+FLEET_RETRY_BACKOFF = 5
+FLEET_POLL_INTERVAL = 1
+
+
+def storage_analysis(session, progress, **params):
+    progress("Loading storage usage...")
+    return {name: run_query(query, session=session) for name, query in dashboard_queries(session=session).items()}
+
+
+def unused_tables_analysis(session, progress, unused_days=90, storage_cost_per_tb=23.0, **params):
+    progress("Loading unused tables...")
+    return {'unused_tables': load_unused_tables(unused_days, storage_cost_per_tb, session=session)}
+
+
+def forecast_analysis(session, progress, training_days=60, predicted_days=30, forecast_backend=None, **params):
+    forecast_data, actual_data = generate_storage_forecast(
+        training_days, predicted_days, backend=forecast_backend, progress=progress, session=session)
+    return {'forecast_data': forecast_data, 'actual_data': actual_data}
+
+
+FLEET_ANALYSES = {
+    'storage': storage_analysis,
+    'unused_tables': unused_tables_analysis,
+    'forecast': forecast_analysis,
+}
+
+
+class AccountCancelled(Exception):
+    pass
+
+
+class _FleetRun:
+    def __init__(self, analyses, timeout, retries, backoff, progress, params):
+        self.analyses = analyses
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = progress
+        self.params = params
+        self.started = {}
+        self.sessions = {}
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    def _retry(self, name, step, fn):
+        for attempt in range(self.retries + 1):
+            if name in self.cancelled:
+                raise AccountCancelled(f"{name} timed out")
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.retries or name in self.cancelled:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logging.info(f"[{name}] {step} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+
+    def analyze(self, name, profile):
+        with self.lock:
+            self.started[name] = time.monotonic()
+        progress = lambda message: self.progress(f"[{name}] {message}")
+        # A session of its own, so the timeout and cancellation below never reach other callers
+        creds, kwargs = profile_session_args(profile)
+        session = self._retry(name, "connect", lambda: new_session(creds, **kwargs))
+        with self.lock:
+            self.sessions[name] = session
+        try:
+            if self.timeout:
+                run_command(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {max(1, int(self.timeout))}",
+                            session=session)
+            results = {}
+            for analysis in self.analyses:
+                results.update(self._retry(name, analysis,
+                                           lambda: FLEET_ANALYSES[analysis](session, progress, **self.params)))
+            return results
+        finally:
+            with self.lock:
+                self.sessions.pop(name, None)
+            try:
+                session.close()
+            except Exception as e:
+                logging.info(f"[{name}] Error closing session: {e}")
+
+    def expired(self, running):
+        # Accounts past their budget are cancelled server-side and reported as failed
+        if not self.timeout:
+            return []
+        now = time.monotonic()
+        with self.lock:
+            expired = [name for name in running
+                       if name in self.started and now - self.started[name] > self.timeout]
+            for name in expired:
+                self.cancelled.add(name)
+                session = self.sessions.get(name)
+                if session is not None:
+                    try:
+                        session.cancel_all()
+                    except Exception as e:
+                        logging.info(f"[{name}] Could not cancel running queries: {e}")
+        return expired
+
+
+def merge_results(results):
+    # One frame per dataset across accounts, tagged with an ACCOUNT column
+    merged = {}
+    for account, datasets in results.items():
+        for name, data in datasets.items():
+            if data is not None:
+                merged.setdefault(name, []).append(data.assign(ACCOUNT=account)[['ACCOUNT', *data.columns]])
+    return {name: pd.concat(frames, ignore_index=True) for name, frames in merged.items()}
+
+
+def run_fleet(profiles, analyses=tuple(FLEET_ANALYSES), max_workers=FLEET_WORKERS, timeout=FLEET_ACCOUNT_TIMEOUT,
+              retries=FLEET_RETRIES, backoff=FLEET_RETRY_BACKOFF, progress=None, **params):
+    # profiles: {name: profile} as returned by storage.session.load_profiles.
+    # Returns (merged frames by dataset, {account: error message}).
+    if has_active_session():
+        # Inside Streamlit in Snowflake every profile would resolve to the one platform session
+        raise RuntimeError("Fleet scans connect to each account separately and cannot run on an active SiS session.")
+    run = _FleetRun(analyses, timeout, retries, backoff, progress or LoggingProgress(), params)
+    results, errors = {}, {}
+    accounts, finished = queue.Queue(), queue.Queue()
+    for item in profiles.items():
+        accounts.put(item)
+
+    def worker():
+        while True:
+            try:
+                name, profile = accounts.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                finished.put((name, run.analyze(name, profile), None))
+            except Exception as e:
+                finished.put((name, None, e))
+
+    # Daemon threads rather than an executor, whose workers are joined at interpreter exit:
+    # a timed-out account unwinds once its queries are cancelled without holding up the process
+    for _ in range(max(1, min(max_workers, len(profiles)))):
+        threading.Thread(target=worker, daemon=True).start()
+    pending = set(profiles)
+    while pending:
+        try:
+            name, result, error = finished.get(timeout=FLEET_POLL_INTERVAL if timeout else None)
+        except queue.Empty:
+            pass
+        else:
+            if name in pending:
+                pending.discard(name)
+                if error is None:
+                    results[name] = result
+                    run.progress(f"[{name}] Done")
+                else:
+                    errors[name] = str(error)
+                    logging.error(f"[{name}] Analysis failed: {error}")
+        for name in run.expired(pending):
+            pending.discard(name)
+            errors[name] = f"timed out after {timeout}s"
+            logging.error(f"[{name}] Analysis timed out after {timeout}s")
+    return merge_results(results), errors
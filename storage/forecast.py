@@ -1,83 +1,335 @@
-import streamlit as st
-from storage.queries import run_command, run_query
+import os
+import logging
+import numpy as np
+import pandas as pd
 
-def generate_storage_forecast(training_days, predicted_days):
-    # Step 1: Create training table
-    st.write("Step 1/4: Creating training table...")
-    run_command(f"""
-    CREATE OR REPLACE TABLE storage_usage_train AS
-    SELECT 
-        TO_TIMESTAMP_NTZ(usage_date) AS usage_date,
-        storage_bytes / POWER(1024, 3) AS storage_gb
-    FROM   
-    (
-        SELECT * 
-        FROM snowflake.account_usage.storage_usage
-        WHERE usage_date < CURRENT_DATE()
+from abc import ABC, abstractmethod
+from statistics import NormalDist
+from storage.queries import quote_identifier, quote_literal, run_command, run_query, run_script, temporary_objects
+from storage.progress import resolve_progress
+from storage.session import QUERY_BACKEND, pooled_session
+
+FORECAST_MODEL_PREFIX = "storage_forecast_model"
+FORECAST_REGISTRY_TABLE = "storage_forecast_registry"
+FORECAST_RESULTS_TABLE = "storage_forecast_result_cache"
+# Stored forecasts never change for a given (model, predicted_days), so they can be cached for long
+FORECAST_RESULTS_TTL = 24 * 60 * 60
+# A superseded model is only dropped once its successor is this old, so sessions that
+# looked it up just before the successor was registered can still forecast from it
+FORECAST_MODEL_GRACE_PERIOD = 60 * 60
+# Snowflake ML is not available on the local query backend
+FORECAST_BACKEND = os.getenv('STORAGE_FORECAST_BACKEND', 'local' if QUERY_BACKEND == 'local' else 'snowflake')
+FORECAST_COLUMNS = ['USAGE_DATE', 'FORECAST_GB', 'LOWER_BOUND_GB', 'UPPER_BOUND_GB']
+
+ACTUAL_DATA_QUERY = """
+SELECT
+    usage_date,
+    storage_bytes / POWER(1024, 3) AS storage_gb
+FROM snowflake.account_usage.storage_usage
+WHERE usage_date >= DATEADD(day, -30, CURRENT_DATE())
+ORDER BY usage_date
+"""
+
+STORAGE_HISTORY_QUERY = """
+SELECT
+    usage_date,
+    storage_bytes / POWER(1024, 3) AS storage_gb
+FROM snowflake.account_usage.storage_usage
+ORDER BY usage_date
+"""
+
+
+def forecast_model_name(training_days, last_usage_date):
+    return f"{FORECAST_MODEL_PREFIX}_{int(training_days)}_{last_usage_date:%Y%m%d}"
+
+
+def model_identifier(model_name):
+    # Models were first created unquoted, so their names resolve upper-cased
+    return quote_identifier(model_name.upper())
+
+
+def create_forecast_registry(session=None):
+    run_script([f"""
+    CREATE TABLE IF NOT EXISTS {FORECAST_REGISTRY_TABLE} (
+        model_name TEXT,
+        training_days INTEGER,
+        last_usage_date DATE,
+        created_at TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """, f"""
+    CREATE TABLE IF NOT EXISTS {FORECAST_RESULTS_TABLE} (
+        model_name TEXT,
+        predicted_days INTEGER,
+        usage_date TIMESTAMP_NTZ,
+        forecast_gb FLOAT,
+        lower_bound_gb FLOAT,
+        upper_bound_gb FLOAT
     )
-    WHERE TO_TIMESTAMP_NTZ(usage_date) < DATEADD(day, -{training_days}, CURRENT_DATE());
-    """)
-
-    # Step 2: Create forecast model
-    st.write("Step 2/4: Creating forecast model...")
-    run_command("""
-    CREATE OR REPLACE snowflake.ml.forecast storage_forecast_model(
-        input_data => system$reference('table', 'storage_usage_train'),
-        timestamp_colname => 'usage_date',
-        target_colname => 'storage_gb'
-    );
-    """)
+    """], session=session)
 
-    # Step 3: Generate forecasts
-    st.write("Step 3/4: Generating forecasts...")
+
+def last_training_date(training_days, session=None):
+    result = run_query(f"""
+    SELECT MAX(usage_date) AS last_usage_date
+    FROM snowflake.account_usage.storage_usage
+    WHERE usage_date < CURRENT_DATE()
+      AND TO_TIMESTAMP_NTZ(usage_date) < DATEADD(day, -{training_days}, CURRENT_DATE())
+    """, session=session)
+    last_usage_date = result['LAST_USAGE_DATE'].iloc[0]
+    if pd.isna(last_usage_date):
+        raise ValueError(f"No storage usage history older than {training_days} days to train on.")
+    return last_usage_date
+
+
+def train_forecast_model(model_name, training_days, last_usage_date, session, progress=None):
+    progress = resolve_progress(progress)
+    with temporary_objects(session) as temporary:
+        # Step 1: Create training table, private to this session
+        progress("Step 1/4: Creating training table...")
+        training_table = temporary.name("storage_usage_train")
+        run_command(f"""
+        CREATE TEMPORARY TABLE {training_table} AS
+        SELECT
+            TO_TIMESTAMP_NTZ(usage_date) AS usage_date,
+            storage_bytes / POWER(1024, 3) AS storage_gb
+        FROM snowflake.account_usage.storage_usage
+        WHERE usage_date <= '{last_usage_date:%Y-%m-%d}'::DATE;
+        """, session=session)
+
+        # Step 2: Create forecast model. The name is derived from the training data, so a
+        # concurrent caller that already built it leaves us an identical model to reuse.
+        progress("Step 2/4: Creating forecast model...")
+        run_command(f"""
+        CREATE snowflake.ml.forecast IF NOT EXISTS {model_identifier(model_name)}(
+            input_data => system$reference('table', '{training_table}'),
+            timestamp_colname => 'usage_date',
+            target_colname => 'storage_gb'
+        );
+        """, session=session)
+    run_command(f"""
+    MERGE INTO {FORECAST_REGISTRY_TABLE} AS registry
+    USING (SELECT {quote_literal(model_name)} AS model_name) AS model
+    ON registry.model_name = model.model_name
+    WHEN NOT MATCHED THEN INSERT (model_name, training_days, last_usage_date)
+        VALUES ({quote_literal(model_name)}, {int(training_days)}, '{last_usage_date:%Y-%m-%d}'::DATE)
+    """, session=session)
+    prune_forecast_models(training_days, keep=model_name, session=session)
+
+
+def prune_forecast_models(training_days, keep, grace_period=FORECAST_MODEL_GRACE_PERIOD, session=None):
+    # Older versions for the same training window are superseded by new storage_usage days,
+    # but are only dropped once a newer version has been registered for the grace period
+    stale = run_query(f"""
+    SELECT model_name
+    FROM {FORECAST_REGISTRY_TABLE} AS registry
+    WHERE training_days = {int(training_days)}
+        AND model_name <> {quote_literal(keep)}
+        AND EXISTS (
+            SELECT 1
+            FROM {FORECAST_REGISTRY_TABLE} AS newer
+            WHERE newer.training_days = registry.training_days
+                AND newer.last_usage_date > registry.last_usage_date
+                AND newer.created_at <= DATEADD(second, -{int(grace_period)}, CURRENT_TIMESTAMP())
+        )
+    """, use_cache=False, session=session)
+    statements = []
+    for model_name in stale['MODEL_NAME']:
+        statements += [
+            f"DROP MODEL IF EXISTS {model_identifier(model_name)}",
+            f"DELETE FROM {FORECAST_RESULTS_TABLE} WHERE model_name = {quote_literal(model_name)}",
+            f"DELETE FROM {FORECAST_REGISTRY_TABLE} WHERE model_name = {quote_literal(model_name)}",
+        ]
+    run_script(statements, session=session)
+
+
+def snowflake_ml_forecast(training_days, predicted_days, progress=None, session=None):
+    # Every statement runs on one exclusive session so temporary tables stay visible
+    progress = resolve_progress(progress)
+    if session is not None:
+        return _snowflake_ml_forecast(training_days, predicted_days, session, progress)
+    with pooled_session() as session:
+        return _snowflake_ml_forecast(training_days, predicted_days, session, progress)
+
+
+def store_forecast(model_name, predicted_days, session):
     run_command(f"""
-    CREATE OR REPLACE TABLE storage_forecast_results AS
+    MERGE INTO {FORECAST_RESULTS_TABLE} AS results
+    USING (
+        SELECT
+            ts AS usage_date,
+            CASE WHEN forecast < 0 THEN 0 ELSE forecast END AS forecast_gb,
+            CASE WHEN lower_bound < 0 THEN 0 ELSE lower_bound END AS lower_bound_gb,
+            CASE WHEN upper_bound < 0 THEN 0 ELSE upper_bound END AS upper_bound_gb
+        FROM
+            TABLE({model_identifier(model_name)}!FORECAST(
+                FORECASTING_PERIODS => {int(predicted_days)},
+                CONFIG_OBJECT => {{'prediction_interval': 0.95}}
+            ))
+    ) AS forecast
+    ON results.model_name = {quote_literal(model_name)}
+        AND results.predicted_days = {int(predicted_days)}
+        AND results.usage_date = forecast.usage_date
+    WHEN NOT MATCHED THEN INSERT (model_name, predicted_days, usage_date, forecast_gb, lower_bound_gb, upper_bound_gb)
+        VALUES ({quote_literal(model_name)}, {int(predicted_days)}, forecast.usage_date, forecast.forecast_gb,
+                forecast.lower_bound_gb, forecast.upper_bound_gb)
+    """, session=session)
+
+
+def _snowflake_ml_forecast(training_days, predicted_days, session, progress):
+    create_forecast_registry(session)
+    last_usage_date = last_training_date(training_days, session)
+    model_name = forecast_model_name(training_days, last_usage_date)
+    status = run_query(f"""
     SELECT
-        ts AS usage_date,
-        CASE WHEN forecast < 0 THEN 0 ELSE forecast END AS forecast_gb,
-        CASE WHEN lower_bound < 0 THEN 0 ELSE lower_bound END AS lower_bound_gb,
-        CASE WHEN upper_bound < 0 THEN 0 ELSE upper_bound END AS upper_bound_gb
-    FROM
-        TABLE(storage_forecast_model!FORECAST(
-            FORECASTING_PERIODS => {predicted_days},
-            CONFIG_OBJECT => {{'prediction_interval': 0.95}}
-        ));
-    """)
+        COUNT(*) AS registered,
+        (SELECT COUNT(*) FROM {FORECAST_RESULTS_TABLE}
+         WHERE model_name = {quote_literal(model_name)} AND predicted_days = {int(predicted_days)}) AS result_rows
+    FROM {FORECAST_REGISTRY_TABLE}
+    WHERE model_name = {quote_literal(model_name)}
+    """, use_cache=False, session=session)
+
+    if status['REGISTERED'].iloc[0] == 0:
+        train_forecast_model(model_name, training_days, last_usage_date, session, progress)
+    else:
+        progress(f"Steps 1-2/4: Reusing forecast model {model_name}...")
+
+    # Step 3: Generate forecasts
+    if status['RESULT_ROWS'].iloc[0] == 0:
+        progress("Step 3/4: Generating forecasts...")
+        try:
+            store_forecast(model_name, predicted_days, session)
+        except Exception as e:
+            # Dropped by a concurrent prune since the registry lookup: train it again
+            logging.info(f"Could not forecast with {model_name}, retraining: {e}")
+            train_forecast_model(model_name, training_days, last_usage_date, session, progress)
+            store_forecast(model_name, predicted_days, session)
+    else:
+        progress("Step 3/4: Reusing stored forecast...")
 
     # Step 4: Fetch results
-    st.write("Step 4/4: Fetching forecast results...")
-    forecast_query = """
-    SELECT 
+    progress("Step 4/4: Fetching forecast results...")
+    forecast_query = f"""
+    SELECT
         usage_date,
         forecast_gb,
         lower_bound_gb,
         upper_bound_gb
-    FROM storage_forecast_results
+    FROM {FORECAST_RESULTS_TABLE}
+    WHERE model_name = {quote_literal(model_name)} AND predicted_days = {int(predicted_days)}
     ORDER BY usage_date
     """
-    forecast_data = run_query(forecast_query)
+    forecast_data = run_query(forecast_query, ttl=FORECAST_RESULTS_TTL, session=session)
+    actual_data = run_query(ACTUAL_DATA_QUERY, session=session)
 
-    actual_data_query = """
-    SELECT 
-        usage_date,
-        storage_bytes / POWER(1024, 3) AS storage_gb
-    FROM snowflake.account_usage.storage_usage
-    WHERE usage_date >= DATEADD(day, -30, CURRENT_DATE())
-    ORDER BY usage_date
-    """
-    actual_data = run_query(actual_data_query)
-
-    # Clean up created objects
-    st.write("Cleaning up temporary tables and models...")
-    cleanup_commands = """
-    DROP TABLE IF EXISTS storage_usage_train;
-    DROP TABLE IF EXISTS storage_usage_predict;
-    DROP TABLE IF EXISTS storage_forecast_results;
-    DROP MODEL IF EXISTS storage_forecast_model;
-    """
+    return forecast_data, actual_data
 
-    for command in cleanup_commands.split(';'):
-        if command.strip():
-            run_command(command)
 
-    return forecast_data, actual_data
+def _linear_forecast(y, horizon, z):
+    n = len(y)
+    x = np.arange(n, dtype=float)
+    slope, intercept = np.polyfit(x, y, 1)
+    residuals = y - (intercept + slope * x)
+    sigma = np.sqrt(residuals @ residuals / max(n - 2, 1))
+    x_future = n - 1 + horizon
+    spread = z * sigma * np.sqrt(1 + 1 / n + (x_future - x.mean()) ** 2 / ((x - x.mean()) ** 2).sum())
+    forecast = intercept + slope * x_future
+    return forecast, forecast - spread, forecast + spread
+
+
+def _holt_forecast(y, horizon, z, grid=np.linspace(0.05, 0.95, 19)):
+    # Additive-trend exponential smoothing. Every (alpha, beta) pair on the grid is
+    # smoothed at once, so the only Python loop is over the (short) daily series.
+    alpha, beta = (values.ravel() for values in np.meshgrid(grid, grid))
+    level = np.full(alpha.shape, y[0])
+    trend = np.full(alpha.shape, y[1] - y[0])
+    sse = np.zeros(alpha.shape)
+    for value in y[1:]:
+        error = value - (level + trend)
+        sse += error ** 2
+        previous_level = level
+        level = level + trend + alpha * error
+        trend = trend + beta * (level - previous_level - trend)
+
+    best = np.argmin(sse)
+    # The trend update above is trend += alpha * beta * error in error-correction form,
+    # which is the beta the variance formula expects
+    a, b = alpha[best], alpha[best] * beta[best]
+    sigma = np.sqrt(sse[best] / max(len(y) - 2, 1))
+    forecast = level[best] + horizon * trend[best]
+    variance = sigma ** 2 * (1 + (horizon - 1) * (a ** 2 + a * b * horizon + b ** 2 * horizon * (2 * horizon - 1) / 6))
+    spread = z * np.sqrt(variance)
+    return forecast, forecast - spread, forecast + spread
+
+
+def local_forecast(history, predicted_days, method='holt', prediction_interval=0.95):
+    # history: daily USAGE_DATE / STORAGE_GB frame, as returned by STORAGE_HISTORY_QUERY
+    history = history.sort_values('USAGE_DATE')
+    y = history['STORAGE_GB'].to_numpy(dtype=float)
+    if len(y) < 3:
+        raise ValueError("At least three days of storage history are needed to forecast.")
+    horizon = np.arange(1, int(predicted_days) + 1, dtype=float)
+    z = NormalDist().inv_cdf((1 + prediction_interval) / 2)
+    if method == 'linear':
+        forecast, lower, upper = _linear_forecast(y, horizon, z)
+    elif method == 'holt':
+        forecast, lower, upper = _holt_forecast(y, horizon, z)
+    else:
+        raise ValueError(f"Unknown local forecast method '{method}'.")
+
+    last_date = pd.Timestamp(history['USAGE_DATE'].iloc[-1])
+    return pd.DataFrame({
+        'USAGE_DATE': pd.date_range(last_date + pd.Timedelta(days=1), periods=len(horizon), freq='D'),
+        'FORECAST_GB': np.clip(forecast, 0, None),
+        'LOWER_BOUND_GB': np.clip(lower, 0, None),
+        'UPPER_BOUND_GB': np.clip(upper, 0, None),
+    }, columns=FORECAST_COLUMNS)
+
+
+class ForecastBackend(ABC):
+    # Returns (forecast_data, actual_data); forecast_data has FORECAST_COLUMNS.
+    # progress is called with a message as each step starts (see storage.progress);
+    # session pins the work to one account's session instead of the default pool.
+    @abstractmethod
+    def forecast(self, training_days, predicted_days, progress=None, session=None):
+        pass
+
+
+class SnowflakeMLForecastBackend(ForecastBackend):
+    def forecast(self, training_days, predicted_days, progress=None, session=None):
+        return snowflake_ml_forecast(training_days, predicted_days, progress, session)
+
+
+class LocalForecastBackend(ForecastBackend):
+    def __init__(self, history=None, method='holt', prediction_interval=0.95):
+        self.history = history
+        self.method = method
+        self.prediction_interval = prediction_interval
+
+    def forecast(self, training_days, predicted_days, progress=None, session=None):
+        progress = resolve_progress(progress)
+        history = self.history if self.history is not None else run_query(STORAGE_HISTORY_QUERY, session=session)
+        dates = pd.to_datetime(history['USAGE_DATE'])
+        today = pd.Timestamp.today().normalize()
+        # Same training window as the Snowflake ML backend
+        training = history[(dates < today) & (dates < today - pd.Timedelta(days=int(training_days)))]
+        progress("Step 1/1: Fitting local forecast...")
+        forecast_data = local_forecast(training, predicted_days, self.method, self.prediction_interval)
+        actual_data = history[dates >= today - pd.Timedelta(days=30)].reset_index(drop=True)
+        return forecast_data, actual_data
+
+
+FORECAST_BACKENDS = {
+    'snowflake': SnowflakeMLForecastBackend,
+    'local': LocalForecastBackend,
+}
+
+
+def get_forecast_backend(backend=None):
+    backend = backend or FORECAST_BACKEND
+    if isinstance(backend, ForecastBackend):
+        return backend
+    return FORECAST_BACKENDS[backend]()
+
+
+def generate_storage_forecast(training_days, predicted_days, backend=None, progress=None, session=None):
+    return get_forecast_backend(backend).forecast(training_days, predicted_days, progress, session)
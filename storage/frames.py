@@ -0,0 +1,75 @@
+# Helpers that let the plotting and recommendation code take any run_query result
+# format (pandas, Arrow-backed pandas or a pyarrow.Table) without converting it first.
+
+
+def is_arrow_table(data):
+    return hasattr(data, 'schema') and hasattr(data, 'num_rows')
+
+
+def row_count(data):
+    return data.num_rows if is_arrow_table(data) else len(data)
+
+
+def is_empty(data):
+    return data is None or row_count(data) == 0
+
+
+def column_sum(data, column):
+    if is_arrow_table(data):
+        import pyarrow.compute as pc
+        return pc.sum(data[column]).as_py() or 0
+    return data[column].sum()
+
+
+def top_n(data, n, column):
+    # Only the selected rows are materialized as pandas
+    if is_arrow_table(data):
+        import pyarrow.compute as pc
+        indices = pc.select_k_unstable(data, k=n, sort_keys=[(column, 'descending')])
+        return data.take(indices).to_pandas()
+    return data.nlargest(n, column)
+
+
+def _hash_arrow(digest, array):
+    # Offset and length too: slices of one array share its buffers
+    for chunk in getattr(array, 'chunks', [array]):
+        digest.update(f"{chunk.offset}:{len(chunk)}".encode())
+        for buffer in chunk.buffers():
+            if buffer is not None:
+                digest.update(memoryview(buffer))
+
+
+def frame_fingerprint(data):
+    # Cheap content hash, so equal frames (and tables) give the same key across reruns.
+    # Arrow and NumPy columns hash their buffers; only object columns are hashed per value.
+    import hashlib
+    digest = hashlib.blake2b(digest_size=16)
+    if data is None:
+        return 'none'
+    if is_arrow_table(data):
+        digest.update(str(data.schema).encode())
+        for column in data.columns:
+            _hash_arrow(digest, column)
+        return digest.hexdigest()
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    digest.update(repr((list(data.columns), [str(dtype) for dtype in data.dtypes])).encode())
+    if isinstance(data.index, pd.RangeIndex):
+        digest.update(repr(data.index).encode())
+    else:
+        digest.update(pd.util.hash_pandas_object(data.index).to_numpy().tobytes())
+    for _, column in data.items():
+        if hasattr(column.array, '__arrow_array__'):
+            _hash_arrow(digest, pa.array(column.array))
+        elif isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biufcmM':
+            digest.update(np.ascontiguousarray(column.to_numpy()).view(np.uint8))
+        else:
+            try:
+                digest.update(pd.util.hash_pandas_object(column, index=False).to_numpy().tobytes())
+            except TypeError:
+                # Unhashable values such as dicts from VARIANT columns
+                digest.update(repr(column.tolist()).encode())
+    return digest.hexdigest()
@@ -0,0 +1,230 @@
+import os
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+
+from storage.queries import cache_scope, run_command, run_query
+
+# Per-table storage history for attributing account growth to databases, schemas and tables.
+# Each snapshot only appends the tables whose bytes changed since their last recorded row,
+# so the history grows with the churn of the account rather than with its size.
+
+GROWTH_TABLE = "storage_table_growth"
+GROWTH_TASK = "storage_table_growth_snapshot"
+GROWTH_TASK_SCHEDULE = "USING CRON 0 4 * * * UTC"
+GROWTH_SNAPSHOT_INTERVAL = 24 * 60 * 60
+GROWTH_WINDOW_DAYS = 7
+# Changes smaller than this are not recorded; they still count once they add up past it
+GROWTH_MIN_CHANGE_BYTES = int(os.getenv('STORAGE_GROWTH_MIN_CHANGE_BYTES', 1024 * 1024))
+GROWTH_BYTE_COLUMNS = ['ACTIVE_BYTES', 'TIME_TRAVEL_BYTES', 'FAILSAFE_BYTES', 'RETAINED_FOR_CLONE_BYTES']
+GROWTH_LEVELS = {
+    'database': ['TABLE_CATALOG'],
+    'schema': ['TABLE_CATALOG', 'TABLE_SCHEMA'],
+    'table': ['TABLE_ID', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME'],
+}
+
+_last_snapshot = {}
+_snapshot_lock = threading.Lock()
+
+
+def growth_snapshot_script(table=GROWTH_TABLE, min_change_bytes=GROWTH_MIN_CHANGE_BYTES):
+    changed = " OR ".join(
+        f"ABS(metrics.{column} - latest.{column}) >= {min_change_bytes}" for column in map(str.lower, GROWTH_BYTE_COLUMNS))
+    return f"""
+EXECUTE IMMEDIATE $$
+BEGIN
+    CREATE TABLE IF NOT EXISTS {table} (
+        snapshot_at TIMESTAMP_LTZ,
+        table_id INTEGER,
+        table_catalog TEXT,
+        table_schema TEXT,
+        table_name TEXT,
+        active_bytes BIGINT,
+        time_travel_bytes BIGINT,
+        failsafe_bytes BIGINT,
+        retained_for_clone_bytes BIGINT,
+        deleted BOOLEAN
+    );
+
+    INSERT INTO {table}
+    WITH latest AS (
+        SELECT table_id, active_bytes, time_travel_bytes, failsafe_bytes, retained_for_clone_bytes, deleted
+        FROM {table}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY table_id ORDER BY snapshot_at DESC) = 1
+    )
+    SELECT
+        CURRENT_TIMESTAMP(),
+        metrics.id,
+        metrics.table_catalog,
+        metrics.table_schema,
+        metrics.table_name,
+        metrics.active_bytes,
+        metrics.time_travel_bytes,
+        metrics.failsafe_bytes,
+        metrics.retained_for_clone_bytes,
+        metrics.deleted
+    FROM snowflake.account_usage.table_storage_metrics AS metrics
+    LEFT JOIN latest ON latest.table_id = metrics.id
+    WHERE
+        latest.table_id IS NULL
+        OR metrics.deleted IS DISTINCT FROM latest.deleted
+        OR {changed};
+END;
+$$
+"""
+
+
+def snapshot_table_storage(table=GROWTH_TABLE, session=None):
+    run_command(growth_snapshot_script(table), session=session)
+
+
+def create_growth_task(warehouse, schedule=GROWTH_TASK_SCHEDULE, table=GROWTH_TABLE, task=GROWTH_TASK, session=None):
+    run_command(f"""
+    CREATE OR REPLACE TASK {task}
+        WAREHOUSE = {warehouse}
+        SCHEDULE = '{schedule}'
+    AS
+    {growth_snapshot_script(table)}
+    """, session=session)
+    run_command(f"ALTER TASK {task} RESUME", session=session)
+
+
+def snapshot_times(table=GROWTH_TABLE, session=None):
+    return run_query(f"""
+    SELECT snapshot_at, COUNT(*) AS tables_changed
+    FROM {table}
+    GROUP BY 1
+    ORDER BY 1
+    """, use_cache=False, session=session)
+
+
+def growth_query(days=GROWTH_WINDOW_DAYS, table=GROWTH_TABLE):
+    # Start and end state of every table that changed in the window. The start is never
+    # earlier than the first snapshot, which would count every table as new.
+    start = f"GREATEST(DATEADD(day, -{days}, CURRENT_TIMESTAMP()), (SELECT MIN(snapshot_at) FROM {table}))"
+    columns = ", ".join(f"changed.{column} AS end_{column}, previous.{column} AS start_{column}"
+                        for column in map(str.lower, GROWTH_BYTE_COLUMNS))
+    return f"""
+    WITH
+    changed AS (
+        SELECT *
+        FROM {table}
+        WHERE snapshot_at > {start}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY table_id ORDER BY snapshot_at DESC) = 1
+    ),
+    previous AS (
+        SELECT *
+        FROM {table}
+        WHERE snapshot_at <= {start} AND table_id IN (SELECT table_id FROM changed)
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY table_id ORDER BY snapshot_at DESC) = 1
+    )
+    SELECT
+        changed.table_id,
+        changed.table_catalog,
+        changed.table_schema,
+        changed.table_name,
+        changed.deleted,
+        previous.table_id IS NULL AS created,
+        {columns}
+    FROM changed
+    LEFT JOIN previous ON previous.table_id = changed.table_id
+    """
+
+
+def table_growth(changes):
+    # Byte deltas for every changed table at once; tables created in the window start from zero
+    end = changes[[f'END_{column}' for column in GROWTH_BYTE_COLUMNS]].to_numpy(dtype=float, na_value=0)
+    start = changes[[f'START_{column}' for column in GROWTH_BYTE_COLUMNS]].to_numpy(dtype=float, na_value=0)
+    delta = end - start
+    growth = changes[GROWTH_LEVELS['table'] + ['DELETED', 'CREATED']].reset_index(drop=True)
+    for position, column in enumerate(GROWTH_BYTE_COLUMNS):
+        growth[f'{column}_DELTA'] = delta[:, position]
+    growth['START_BYTES'] = start.sum(axis=1)
+    growth['END_BYTES'] = end.sum(axis=1)
+    growth['TOTAL_BYTES_DELTA'] = delta.sum(axis=1)
+    return growth
+
+
+def top_contributors(growth, level='table', n=10):
+    # Largest contributors to growth at one level, with their share of the account's net growth
+    if level not in GROWTH_LEVELS:
+        raise ValueError(f"Unknown growth level '{level}', expected one of {list(GROWTH_LEVELS)}.")
+    deltas = [f'{column}_DELTA' for column in GROWTH_BYTE_COLUMNS] + ['TOTAL_BYTES_DELTA']
+    totals = growth.groupby(GROWTH_LEVELS[level], sort=False, observed=True).agg(
+        TABLES=('TOTAL_BYTES_DELTA', 'size'),
+        **{column: (column, 'sum') for column in deltas})
+    net_growth = totals['TOTAL_BYTES_DELTA'].sum()
+    totals['TOTAL_GB_DELTA'] = totals['TOTAL_BYTES_DELTA'] / 1024 ** 3
+    totals['SHARE_OF_GROWTH'] = totals['TOTAL_BYTES_DELTA'] / net_growth if net_growth else np.nan
+    top = totals.nlargest(n, 'TOTAL_BYTES_DELTA').reset_index()
+    # DB, DB.SCHEMA or DB.SCHEMA.TABLE
+    names = [column for column in GROWTH_LEVELS[level] if column != 'TABLE_ID']
+    contributor = top[names[0]].astype(str)
+    for column in names[1:]:
+        contributor = contributor + '.' + top[column].astype(str)
+    top.insert(0, 'CONTRIBUTOR', contributor)
+    return top
+
+
+def _snapshot_if_due(table, session):
+    key = (table, cache_scope(session))
+    with _snapshot_lock:
+        if time.time() - _last_snapshot.get(key, 0) < GROWTH_SNAPSHOT_INTERVAL:
+            return
+        snapshot_table_storage(table, session=session)
+        _last_snapshot[key] = time.time()
+
+
+def reset_growth_snapshot():
+    with _snapshot_lock:
+        _last_snapshot.clear()
+
+
+def load_table_growth(days=GROWTH_WINDOW_DAYS, table=GROWTH_TABLE, session=None, use_cache=True):
+    # Takes a snapshot at most once per interval when no TASK does it, then diffs the window
+    try:
+        _snapshot_if_due(table, session)
+    except Exception as e:
+        logging.info(f"Could not snapshot table storage into {table}: {e}")
+    try:
+        changes = run_query(growth_query(days, table), use_cache=use_cache, session=session,
+                            result_format='arrow_pandas')
+    except Exception as e:
+        # No snapshot has ever been written, e.g. without CREATE TABLE privilege in the current schema
+        logging.info(f"Could not read table storage history from {table}: {e}")
+        return None
+    return None if changes is None else table_growth(changes)
+
+
+def add_growth_arguments(parser):
+    parser.add_argument("--table", default=GROWTH_TABLE)
+    parser.add_argument("--create-task", action="store_true", help="Schedule the snapshot as a Snowflake TASK")
+    parser.add_argument("--warehouse", help="Warehouse for the TASK")
+    parser.add_argument("--schedule", default=GROWTH_TASK_SCHEDULE)
+    parser.add_argument("--days", type=int, default=GROWTH_WINDOW_DAYS, help="Growth window in days")
+    parser.add_argument("--level", choices=list(GROWTH_LEVELS), default='table')
+    parser.add_argument("--top", type=int, default=20)
+    return parser
+
+
+def run_growth(args, parser, session=None):
+    if args.create_task:
+        if not args.warehouse:
+            parser.error("--warehouse is required with --create-task")
+        create_growth_task(args.warehouse, args.schedule, args.table, session=session)
+        return
+    snapshot_table_storage(args.table, session=session)
+    growth = table_growth(run_query(growth_query(args.days, args.table), use_cache=False, session=session,
+                                    result_format='arrow_pandas'))
+    print(top_contributors(growth, args.level, args.top).to_string(index=False))
+
+
+def main(argv=None):
+    parser = add_growth_arguments(argparse.ArgumentParser(description="Snapshot table storage and rank growth contributors."))
+    run_growth(parser.parse_args(argv), parser)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+import os
+import re
+import uuid
+import logging
+import datetime
+import threading
+
+from collections import namedtuple
+
+# A DuckDB stand-in for a Snowpark session, seeded with synthetic ACCOUNT_USAGE data.
+# It implements the part of the Session API this package uses (sql(...).to_pandas/
+# to_arrow/to_pandas_batches/collect, query_history, cancel_all) and translates the
+# Snowflake SQL in storage/ to DuckDB, so the apps and benchmarks run without an account.
+# Select it with STORAGE_QUERY_BACKEND=local.
+
+LOCAL_DATABASE = os.getenv('STORAGE_LOCAL_DATABASE', ':memory:')
+LOCAL_SCALE = os.getenv('STORAGE_LOCAL_SCALE', 'small')
+LOCAL_BATCH_ROWS = 50_000
+SEED_SCALES = {
+    'small': {'tables': 1_000, 'access_rows': 100_000},
+    'medium': {'tables': 100_000, 'access_rows': 1_000_000},
+    'large': {'tables': 1_000_000, 'access_rows': 10_000_000},
+}
+SEED_HISTORY_DAYS = 400
+# Share of tables that stop being queried at some point, and so show up as unused
+SEED_DORMANT_SHARE = 0.4
+
+QueryRecord = namedtuple('QueryRecord', ['query_id', 'sql_text', 'thread_id'])
+
+_UNSUPPORTED = re.compile(
+    r'snowflake\.ml\.|!FORECAST|\bTASK\b|\bCOPY\s+INTO\b|GET_PRESIGNED_URL|query_history\s*\(|\bMODEL\b',
+    re.IGNORECASE)
+_SCRIPT = re.compile(r'^\s*EXECUTE\s+IMMEDIATE\s+\$\$(.*)\$\$\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+_SCRIPT_BODY = re.compile(r'\bBEGIN\b(.*)\bEND\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+_SELECT_INTO = re.compile(r'^\s*SELECT\s+(.*?)\s+INTO\s+:(\w+)\s+(FROM\b.*)$', re.IGNORECASE | re.DOTALL)
+_TO_CHAR = re.compile(r"\bTO_CHAR\(\s*([^,()]+?)\s*,\s*'([^']*)'\s*\)", re.IGNORECASE)
+_TO_CHAR_FORMAT = re.compile(r'YYYY|HH24|Mon|MM|DD|MI|SS')
+_STRFTIME = {'YYYY': '%Y', 'HH24': '%H', 'Mon': '%b', 'MM': '%m', 'DD': '%d', 'MI': '%M', 'SS': '%S'}
+_UNQUOTED_IDENTIFIER = re.compile(r'^[a-z_][a-z0-9_$]*$')
+_TO_TIMESTAMP = re.compile(r"\bTO_TIMESTAMP_TZ\(\s*([^,()]+?)\s*,\s*'([^']*)'\s*\)", re.IGNORECASE)
+_TO_TIMESTAMP_FORMAT = re.compile(r'YYYY|HH24|MON|DY|DD|MI|SS')
+_STRPTIME = {'YYYY': '%Y', 'HH24': '%H', 'MON': '%b', 'DY': '%a', 'DD': '%d', 'MI': '%M', 'SS': '%S'}
+_PIPE = re.compile(r'\s*->>\s*')
+_PIPE_RESULT = re.compile(r'\$(\d+)')
+_SHOW_DATABASES = re.compile(r'^\s*SHOW\s+DATABASES\s*$', re.IGNORECASE)
+_SHOW_STAGES = re.compile(r'^\s*SHOW\s+STAGES\s+IN\s+DATABASE\s+("(?:[^"]|"")+"|\w+)\s*$', re.IGNORECASE)
+_LIST = re.compile(r'^\s*LIST\s+@((?:"(?:[^"]|"")+"|\w+)(?:\.(?:"(?:[^"]|"")+"|\w+)){2})(?:/(\S*))?\s*$', re.IGNORECASE)
+_IDENTIFIER = re.compile(r'"(?:[^"]|"")+"|\w+')
+
+_MACROS = [
+    """CREATE OR REPLACE MACRO dateadd(part, n, x) AS x + CASE lower(part)
+        WHEN 'year' THEN to_years(CAST(n AS INTEGER))
+        WHEN 'month' THEN to_months(CAST(n AS INTEGER))
+        WHEN 'week' THEN to_days(CAST(n AS INTEGER) * 7)
+        WHEN 'day' THEN to_days(CAST(n AS INTEGER))
+        WHEN 'hour' THEN to_hours(CAST(n AS BIGINT))
+        WHEN 'minute' THEN to_minutes(CAST(n AS BIGINT))
+        ELSE to_seconds(CAST(n AS DOUBLE)) END""",
+    "CREATE OR REPLACE MACRO to_timestamp_ntz(x) AS CAST(x AS TIMESTAMP)",
+]
+
+
+def _identifier(name):
+    # Quoted identifiers keep their case, unquoted ones are upper-cased
+    if name.startswith('"'):
+        return name[1:-1].replace('""', '"')
+    return name.upper()
+
+
+def _show_or_list(query):
+    # SHOW DATABASES, SHOW STAGES IN DATABASE and LIST @stage over the seeded local_stages schema
+    if _SHOW_DATABASES.match(query):
+        return 'SELECT DISTINCT table_catalog AS "name" FROM account_usage.table_storage_metrics'
+    show_stages = _SHOW_STAGES.match(query)
+    if show_stages:
+        return (f'SELECT database_name AS "database_name", schema_name AS "schema_name", name AS "name", type AS "type" '
+                f'FROM local_stages.stages WHERE database_name = {_literal(_identifier(show_stages.group(1)))}')
+    listing = _LIST.match(query)
+    if listing:
+        database, schema, stage = map(_identifier, _IDENTIFIER.findall(listing.group(1)))
+        return f"""
+        SELECT files.name AS "name", files.size AS "size", files.md5 AS "md5", files.last_modified AS "last_modified"
+        FROM local_stages.stage_files AS files
+        JOIN local_stages.stages AS stages ON stages.stage_id = files.stage_id
+        WHERE stages.database_name = {_literal(database)} AND stages.schema_name = {_literal(schema)}
+            AND stages.name = {_literal(stage)}
+            AND starts_with(files.name, lower(stages.name) || '/' || {_literal(listing.group(2) or '')})
+        """
+    return None
+
+
+def _translate_pipe(query):
+    # SHOW/LIST ->> SELECT ... FROM $1 [->> ...]: each $n becomes the nth statement as a subquery
+    first, *rest = _PIPE.split(query)
+    translated = [_show_or_list(first)]
+    if translated[0] is None:
+        raise NotImplementedError(f"Not supported by the local backend: {' '.join(first.split())[:120]}")
+    for statement in rest:
+        translated.append(_PIPE_RESULT.sub(lambda match: f"({translated[int(match.group(1)) - 1]})",
+                                           translate_sql(statement)))
+    return translated[-1]
+
+
+def translate_sql(query):
+    # Rewrites the Snowflake dialect used in storage/ into DuckDB
+    if _UNSUPPORTED.search(query):
+        raise NotImplementedError(f"Not supported by the local backend: {' '.join(query.split())[:120]}")
+    query = query.strip().rstrip(';')
+    if re.match(r'^(SHOW|LIST)\b', query, re.IGNORECASE):
+        return _translate_pipe(query)
+    query = re.sub(r'\bsnowflake\.account_usage\.', 'account_usage.', query, flags=re.IGNORECASE)
+    query = re.sub(r'\bTIMESTAMP_LTZ\b', 'TIMESTAMPTZ', query, flags=re.IGNORECASE)
+    query = re.sub(r'\bTIMESTAMP_NTZ\b', 'TIMESTAMP', query, flags=re.IGNORECASE)
+    # Snowflake FLOAT is double precision; DuckDB's is single
+    query = re.sub(r'\bFLOAT\b', 'DOUBLE', query, flags=re.IGNORECASE)
+    query = re.sub(r'\bCURRENT_TIMESTAMP\(\)', 'CURRENT_TIMESTAMP', query, flags=re.IGNORECASE)
+    query = re.sub(r'\b(DATEADD|DATEDIFF)\(\s*(\w+)\s*,', r"\1('\2',", query, flags=re.IGNORECASE)
+    query = _TO_CHAR.sub(
+        lambda match: f"strftime({match.group(1)}, '{_TO_CHAR_FORMAT.sub(lambda token: _STRFTIME[token.group(0)], match.group(2))}')",
+        query)
+    query = _TO_TIMESTAMP.sub(
+        lambda match: f"(strptime({match.group(1)}, '{_TO_TIMESTAMP_FORMAT.sub(lambda token: _STRPTIME[token.group(0)], match.group(2))}') AT TIME ZONE 'UTC')",
+        query)
+    query = re.sub(r'\bLATERAL\s+FLATTEN\(\s*(?:input\s*=>\s*)?([^()]+?)\s*\)\s+AS\s+(\w+)',
+                   r'unnest(CAST(\1 AS JSON[])) AS \2(value)', query, flags=re.IGNORECASE)
+    # VARIANT paths: alias.value:field -> JSON text, cast afterwards like Snowflake does
+    query = re.sub(r'\b(\w+)\.value:(\w+)', r"(\1.value->>'\2')", query)
+    return query
+
+
+def _literal(value):
+    if value is None or value != value:
+        return 'NULL'
+    if isinstance(value, datetime.datetime):
+        return f"'{value.isoformat()}'::TIMESTAMP"
+    if isinstance(value, datetime.date):
+        return f"'{value.isoformat()}'::DATE"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def script_statements(block):
+    # EXECUTE IMMEDIATE $$ [DECLARE ...] BEGIN ...; END; $$ -> statements in order
+    body = _SCRIPT_BODY.search(block)
+    if body is None:
+        raise NotImplementedError("Only BEGIN ... END scripting blocks are supported locally.")
+    return [statement.strip() for statement in body.group(1).split(';') if statement.strip()]
+
+
+def _normalize_columns(names):
+    # Snowflake upper-cases unquoted identifiers; quoted ones like "Stage %" keep their case
+    return [name.upper() if _UNQUOTED_IDENTIFIER.match(name) else name for name in names]
+
+
+def seed_account_usage(connection, tables=None, access_rows=None, days=SEED_HISTORY_DAYS, scale=LOCAL_SCALE, seed=0.42):
+    # Synthetic STORAGE_USAGE, TABLE_STORAGE_METRICS, TABLES and ACCESS_HISTORY, plus stages and
+    # their files for SHOW STAGES and LIST, generated inside DuckDB so tens of millions of rows
+    # never pass through Python
+    tables = int(tables or SEED_SCALES[scale]['tables'])
+    access_rows = int(access_rows or SEED_SCALES[scale]['access_rows'])
+    dormant = int(SEED_DORMANT_SHARE * 100)
+    logging.info(f"Seeding local ACCOUNT_USAGE: {tables} tables, {access_rows} access history rows.")
+    connection.execute(f"SELECT setseed({seed})")
+    connection.execute("CREATE SCHEMA IF NOT EXISTS account_usage")
+    connection.execute(f"""
+    CREATE OR REPLACE TABLE account_usage.storage_usage AS
+    SELECT
+        CAST(CURRENT_DATE - to_days(CAST(d AS INTEGER)) AS DATE) AS usage_date,
+        CAST(5e12 * (1 + 0.002 * ({days} - d)) * (1 + 0.02 * (random() - 0.5)) AS BIGINT) AS storage_bytes,
+        CAST(2e11 * (1 + 0.001 * ({days} - d)) * (1 + 0.05 * (random() - 0.5)) AS BIGINT) AS stage_bytes,
+        CAST(4e11 * (1 + 0.002 * ({days} - d)) * (1 + 0.05 * (random() - 0.5)) AS BIGINT) AS failsafe_bytes
+    FROM range(1, {days} + 1) AS days(d)
+    """)
+    connection.execute(f"""
+    CREATE OR REPLACE TABLE account_usage.table_storage_metrics AS
+    SELECT
+        *,
+        -- Every 9th table has a long retention, every 23rd is rewritten often
+        CAST(active_bytes * CASE WHEN id % 9 = 0 THEN 2 ELSE 0.1 END * random() AS BIGINT) AS time_travel_bytes,
+        CAST(active_bytes * CASE WHEN id % 23 = 0 THEN 3 ELSE 0.2 END * random() AS BIGINT) AS failsafe_bytes,
+        CAST(CASE WHEN random() < 0.05 THEN active_bytes * random() ELSE 0 END AS BIGINT) AS retained_for_clone_bytes
+    FROM (
+        SELECT
+            i AS id,
+            'DB_' || (i % 20) AS table_catalog,
+            'SCHEMA_' || (i % 7) AS table_schema,
+            'TABLE_' || i AS table_name,
+            CASE WHEN i % 11 = 0 THEN 'YES' ELSE 'NO' END AS is_transient,
+            CAST(pow(random(), 4) * 2e12 AS BIGINT) AS active_bytes,
+            CURRENT_TIMESTAMP - to_days(CAST(30 + (i * 31) % {days * 2} AS INTEGER)) AS table_created,
+            i % 50 = 0 AS deleted
+        FROM range({tables}) AS ids(i)
+    )
+    """)
+    connection.execute("""
+    CREATE OR REPLACE TABLE account_usage.tables AS
+    SELECT
+        id AS table_id,
+        table_name,
+        table_schema,
+        table_catalog,
+        'BASE TABLE' AS table_type,
+        is_transient,
+        CASE WHEN is_transient = 'YES' THEN 1 WHEN id % 9 = 0 THEN 90 WHEN id % 5 = 0 THEN 30 ELSE 1 END AS retention_time,
+        table_created AS created,
+        CASE WHEN deleted THEN CURRENT_TIMESTAMP END AS deleted
+    FROM account_usage.table_storage_metrics
+    """)
+    connection.execute(f"""
+    CREATE OR REPLACE TABLE account_usage.access_history AS
+    WITH accesses AS (
+        SELECT
+            i,
+            CAST(floor(pow(random(), 2) * {tables}) AS BIGINT) AS primary_table,
+            CASE WHEN random() < 0.3 THEN CAST(floor(random() * {tables}) AS BIGINT) END AS joined_table,
+            random() AS age
+        FROM range({access_rows}) AS queries(i)
+    )
+    SELECT
+        '01b' || lpad(lower(hex(i)), 13, '0') AS query_id,
+        CURRENT_TIMESTAMP - to_seconds(86400 * (
+            CASE WHEN primary_table % 100 < {dormant} THEN 30 + (primary_table * 7919) % 365 ELSE 0 END
+            + age * 90)) AS query_start_time,
+        'USER_' || (i % 50) AS user_name,
+        CAST(to_json(list_transform(
+            list_filter([primary_table, CASE WHEN joined_table % 100 >= {dormant} THEN joined_table END],
+                        table_id -> table_id IS NOT NULL),
+            table_id -> {{'objectId': table_id, 'objectDomain': 'Table', 'objectName': 'TABLE_' || table_id}}
+        )) AS JSON) AS base_objects_accessed
+    FROM accesses
+    """)
+    stages = max(10, tables // 100)
+    connection.execute("CREATE SCHEMA IF NOT EXISTS local_stages")
+    connection.execute(f"""
+    CREATE OR REPLACE TABLE local_stages.stages AS
+    SELECT
+        i AS stage_id,
+        'DB_' || (i % 20) AS database_name,
+        'SCHEMA_' || (i % 7) AS schema_name,
+        'STAGE_' || i AS name,
+        CASE WHEN i % 10 = 9 THEN 'EXTERNAL' ELSE 'INTERNAL' END AS type
+    FROM range({stages}) AS ids(i)
+    """)
+    connection.execute(f"""
+    CREATE OR REPLACE TABLE local_stages.stage_files AS
+    WITH files AS (
+        SELECT
+            i,
+            CAST(floor(pow(random(), 2) * {stages}) AS BIGINT) AS stage_id,
+            ['loads/', 'unloads/', 'exports/', ''][1 + i % 4] AS prefix,
+            random() AS age
+        FROM range({tables * 5}) AS ids(i)
+    )
+    SELECT
+        stage_id,
+        'stage_' || stage_id || '/' || prefix || 'data_' || i || '.csv.gz' AS name,
+        CAST(pow(random(), 3) * 1e9 AS BIGINT) AS size,
+        md5(CAST(i AS VARCHAR)) AS md5,
+        -- Every third stage has an exports/ prefix nobody has written to for months
+        strftime(CAST(CURRENT_TIMESTAMP AT TIME ZONE 'UTC' AS TIMESTAMP) - to_days(CAST(
+            CASE WHEN prefix = 'exports/' AND stage_id % 3 = 0 THEN 120 + age * 600 ELSE age * age * 400 END AS INTEGER)),
+            '%a, %d %b %Y %H:%M:%S GMT') AS last_modified
+    FROM files
+    """)
+    return {'tables': tables, 'access_rows': access_rows, 'days': days}
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def local_database(path=LOCAL_DATABASE, **seed_args):
+    # One DuckDB database per process; every LocalSession works on its own cursor
+    global _database
+    import duckdb
+
+    with _database_lock:
+        if _database is None:
+            _database = duckdb.connect(path)
+            for macro in _MACROS:
+                _database.execute(macro)
+            seeded = _database.execute(
+                "SELECT COUNT(*) FROM information_schema.tables "
+                "WHERE table_schema = 'account_usage' AND table_name = 'storage_usage'").fetchone()[0]
+            if not seeded or seed_args:
+                seed_account_usage(_database, **seed_args)
+        return _database
+
+
+def reset_local_database(**seed_args):
+    # Drops the process database; the next session reseeds it, e.g. at another scale
+    global _database
+    with _database_lock:
+        if _database is not None:
+            _database.close()
+        _database = None
+    if seed_args:
+        local_database(**seed_args)
+
+
+class LocalConnection:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+
+class LocalQueryHistory:
+    def __init__(self, session):
+        self.session = session
+        self.queries = []
+
+    def __enter__(self):
+        with self.session.lock:
+            self.session.histories.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.session.lock:
+            self.session.histories.remove(self)
+
+
+class LocalDataFrame:
+    def __init__(self, session, query):
+        self.session = session
+        self.query = query
+
+    def _execute(self):
+        return self.session.execute(self.query)
+
+    def to_arrow(self, statement_params=None, **kwargs):
+        cursor = self._execute()
+        # to_arrow_table replaces the deprecated fetch_arrow_table in current DuckDB releases
+        fetch_arrow_table = getattr(cursor, 'to_arrow_table', None) or cursor.fetch_arrow_table
+        table = fetch_arrow_table()
+        return table.rename_columns(_normalize_columns(table.column_names))
+
+    def to_pandas(self, statement_params=None, **kwargs):
+        return self.to_arrow().to_pandas()
+
+    def to_pandas_batches(self, statement_params=None, **kwargs):
+        reader = self._execute().fetch_record_batch(LOCAL_BATCH_ROWS)
+        for batch in reader:
+            frame = batch.to_pandas()
+            frame.columns = _normalize_columns(list(frame.columns))
+            yield frame
+
+    def collect(self, statement_params=None, **kwargs):
+        from snowflake.snowpark import Row
+
+        cursor = self._execute()
+        if cursor.description is None:
+            return []
+        names = _normalize_columns([column[0] for column in cursor.description])
+        return [Row(**dict(zip(names, values))) for values in cursor.fetchall()]
+
+
+class LocalSession:
+    def __init__(self, database=None):
+        self.database = database or local_database()
+        self.connection = LocalConnection()
+        self.lock = threading.Lock()
+        self.histories = []
+        self.cursors = {}
+
+    def _cursor(self):
+        # DuckDB cursors are not thread-safe, and temporary tables live on the cursor,
+        # so each thread keeps one for the life of the session
+        thread_id = threading.get_ident()
+        with self.lock:
+            if thread_id not in self.cursors:
+                self.cursors[thread_id] = self.database.cursor()
+            return self.cursors[thread_id]
+
+    def _record(self, query):
+        record = QueryRecord(f"local-{uuid.uuid4().hex}", query, threading.get_ident())
+        with self.lock:
+            for history in self.histories:
+                history.queries.append(record)
+
+    def execute(self, query):
+        if self.connection.closed:
+            raise RuntimeError("Local session is closed.")
+        self._record(query)
+        cursor = self._cursor()
+        script = _SCRIPT.match(query)
+        if script:
+            return self._execute_script(cursor, script.group(1))
+        if re.match(r'^\s*ALTER\s+SESSION\b', query, re.IGNORECASE):
+            return cursor.execute("SELECT 'Statement executed successfully.' AS status")
+        return cursor.execute(translate_sql(query))
+
+    def _execute_script(self, cursor, block):
+        variables = {}
+        result = None
+        for statement in script_statements(block):
+            for name, value in variables.items():
+                statement = re.sub(rf'(?<!:):{name}\b', _literal(value), statement, flags=re.IGNORECASE)
+            select_into = _SELECT_INTO.match(statement)
+            if select_into:
+                expression, name, rest = select_into.groups()
+                row = cursor.execute(translate_sql(f"SELECT {expression} {rest}")).fetchone()
+                variables[name.lower()] = row[0] if row else None
+                continue
+            result = cursor.execute(translate_sql(statement))
+        return result if result is not None else cursor.execute("SELECT 'Anonymous block executed.' AS status")
+
+    def sql(self, query, params=None):
+        return LocalDataFrame(self, query)
+
+    def query_history(self, include_thread_id=False, **kwargs):
+        return LocalQueryHistory(self)
+
+    def get_current_account(self):
+        return 'LOCAL'
+
+    def get_current_role(self):
+        return 'LOCAL'
+
+    def get_current_database(self):
+        return None
+
+    def cancel_all(self):
+        with self.lock:
+            cursors = list(self.cursors.values())
+        for cursor in cursors:
+            cursor.interrupt()
+
+    def close(self):
+        self.connection.closed = True
+        with self.lock:
+            cursors, self.cursors = list(self.cursors.values()), {}
+        for cursor in cursors:
+            cursor.close()
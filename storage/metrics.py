@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+import pandas as pd
+
+from collections import deque
+from storage.frames import row_count
+
+METRICS_APP = "storage_check"
+METRICS_MAX_RECORDS = int(os.getenv('STORAGE_METRICS_MAX_RECORDS', 2000))
+# Optional export of every recorded statement: 'prometheus' or 'otel'
+METRICS_EXPORT = os.getenv('STORAGE_METRICS_EXPORT')
+PROMETHEUS_PORT = int(os.getenv('STORAGE_PROMETHEUS_PORT', 9464))
+QUERY_STATS_BATCH = 500
+
+# Standard warehouse credit rates; the estimate ignores the 60 second minimum and
+# other queries sharing the warehouse, so it is an upper bound for busy warehouses
+WAREHOUSE_CREDITS_PER_HOUR = {
+    'X-SMALL': 1, 'SMALL': 2, 'MEDIUM': 4, 'LARGE': 8, 'X-LARGE': 16,
+    '2X-LARGE': 32, '3X-LARGE': 64, '4X-LARGE': 128, '5X-LARGE': 256, '6X-LARGE': 512,
+}
+QUERY_STATS_COLUMNS = [
+    'QUERY_ID', 'WAREHOUSE_NAME', 'WAREHOUSE_SIZE', 'EXECUTION_TIME', 'TOTAL_ELAPSED_TIME',
+    'BYTES_SCANNED', 'PARTITIONS_SCANNED', 'PARTITIONS_TOTAL', 'ROWS_PRODUCED'
+]
+
+_TARGET = re.compile(r'\b(?:from|into|table)\s+([\w.$"]+)', re.IGNORECASE)
+
+
+def query_label(query):
+    # "SELECT storage_usage,tables": the statement verb and the objects it reads or writes
+    verb = query.split(None, 1)[0].upper() if query.strip() else ''
+    targets = []
+    for target in _TARGET.findall(query):
+        name = target.split('.')[-1].strip('"').lower()
+        if name and name not in targets:
+            targets.append(name)
+    return f"{verb} {','.join(targets[:3])}".strip()
+
+
+def query_tag(label):
+    return json.dumps({'app': METRICS_APP, 'label': label, 'id': uuid.uuid4().hex[:12]})
+
+
+def _last_query_id(history):
+    # Only this thread's statements; other threads may share the session
+    thread_id = threading.get_ident()
+    for record in reversed(history.queries):
+        if getattr(record, 'thread_id', thread_id) == thread_id:
+            return record.query_id
+    return None
+
+
+class QueryMetrics:
+    def __init__(self, max_records=METRICS_MAX_RECORDS):
+        self.records = deque(maxlen=max_records)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, query, wall_seconds, rows=None, query_id=None, cached=False, tag=None, error=None):
+        record = {
+            'STARTED_AT': pd.Timestamp.now(tz='UTC') - pd.Timedelta(seconds=wall_seconds),
+            'LABEL': query_label(query),
+            'QUERY_TAG': tag,
+            'QUERY_ID': query_id,
+            'CACHED': cached,
+            'WALL_SECONDS': wall_seconds,
+            'ROWS': rows,
+            'ERROR': error,
+            'SQL': ' '.join(query.split())[:500],
+        }
+        with self.lock:
+            self.records.append(record)
+        export_record(record)
+        return record
+
+    def measure(self, query, session, run):
+        # run(statement_params) executes the statement; the result is returned unchanged
+        tag = query_tag(query_label(query))
+        started = time.perf_counter()
+        query_id = result = error = None
+        try:
+            with session.query_history(include_thread_id=True) as history:
+                result = run({'QUERY_TAG': tag})
+            query_id = _last_query_id(history)
+            return result
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            rows = row_count(result) if hasattr(result, '__len__') or hasattr(result, 'num_rows') else None
+            self.record(query, time.perf_counter() - started, rows, query_id, tag=tag, error=error)
+
+    def fetch_stats(self, session):
+        # Server-side stats for recorded statements, batched into as few QUERY_HISTORY calls as possible.
+        # Errors are raised to the caller; returns how many recorded statements still have no stats.
+        with self.lock:
+            query_ids = [record['QUERY_ID'] for record in self.records
+                         if record['QUERY_ID'] and record['QUERY_ID'] not in self.stats]
+        source = query_history_source(session) if query_ids else None
+        for start in range(0, len(query_ids), QUERY_STATS_BATCH):
+            batch = query_ids[start:start + QUERY_STATS_BATCH]
+            id_list = ", ".join(f"'{query_id}'" for query_id in batch)
+            stats = session.sql(f"""
+            SELECT {', '.join(QUERY_STATS_COLUMNS)}
+            FROM {source}
+            WHERE query_id IN ({id_list})
+            """).to_pandas()
+            with self.lock:
+                for row in stats.to_dict(orient='records'):
+                    self.stats[row['QUERY_ID']] = row
+            for row in stats.to_dict(orient='records'):
+                export_stats(row)
+        with self.lock:
+            return sum(1 for record in self.records if record['QUERY_ID'] and record['QUERY_ID'] not in self.stats)
+
+    def frame(self):
+        with self.lock:
+            records = pd.DataFrame(list(self.records))
+            stats = pd.DataFrame(list(self.stats.values()), columns=QUERY_STATS_COLUMNS)
+        if records.empty:
+            return records
+        metrics = records.merge(stats, on='QUERY_ID', how='left')
+        rate = metrics['WAREHOUSE_SIZE'].str.upper().map(WAREHOUSE_CREDITS_PER_HOUR)
+        metrics['ESTIMATED_CREDITS'] = metrics['EXECUTION_TIME'] / 3_600_000 * rate
+        return metrics
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+            self.stats.clear()
+
+
+query_metrics = QueryMetrics()
+
+
+def query_history_source(session):
+    # INFORMATION_SCHEMA.QUERY_HISTORY has statements within seconds but needs a database;
+    # without one the ACCOUNT_USAGE view is read, which lags by up to 45 minutes
+    database = session.get_current_database()
+    if database:
+        return f"""TABLE({database}.information_schema.query_history(
+                end_time_range_start => DATEADD(day, -7, CURRENT_TIMESTAMP()),
+                result_limit => 10000))"""
+    return "(SELECT * FROM snowflake.account_usage.query_history WHERE start_time > DATEADD(day, -7, CURRENT_TIMESTAMP()))"
+
+
+def dashboard_cost(metrics):
+    # Totals for the "cost of this dashboard" panel
+    executed = metrics[~metrics['CACHED']]
+    return {
+        'queries': len(executed),
+        'cache_hits': int(metrics['CACHED'].sum()),
+        'wall_seconds': float(executed['WALL_SECONDS'].sum()),
+        'execution_seconds': float(executed['EXECUTION_TIME'].sum() / 1000),
+        'bytes_scanned': float(executed['BYTES_SCANNED'].sum()),
+        'estimated_credits': float(executed['ESTIMATED_CREDITS'].sum()),
+        # Statements without server stats count as zero above
+        'with_stats': int(executed['EXECUTION_TIME'].notna().sum()),
+    }
+
+
+def hot_queries(metrics, n=10):
+    executed = metrics[~metrics['CACHED']]
+    by_label = executed.groupby('LABEL').agg(
+        RUNS=('WALL_SECONDS', 'size'),
+        WALL_SECONDS=('WALL_SECONDS', 'sum'),
+        EXECUTION_TIME=('EXECUTION_TIME', 'sum'),
+        BYTES_SCANNED=('BYTES_SCANNED', 'sum'),
+        ESTIMATED_CREDITS=('ESTIMATED_CREDITS', 'sum'),
+    )
+    return by_label.sort_values(['ESTIMATED_CREDITS', 'WALL_SECONDS'], ascending=False).head(n).reset_index()
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def _prometheus():
+    from prometheus_client import Counter, Histogram, start_http_server
+    start_http_server(PROMETHEUS_PORT)
+    return {
+        'wall': Histogram('storage_check_query_seconds', "Client wall time per statement", ['label', 'cached']),
+        'rows': Counter('storage_check_query_rows', "Rows returned", ['label']),
+        'bytes': Counter('storage_check_query_bytes_scanned', "Bytes scanned", ['warehouse']),
+        'execution': Counter('storage_check_query_execution_seconds', "Server execution time", ['warehouse']),
+    }
+
+
+def _otel():
+    from opentelemetry import metrics
+    meter = metrics.get_meter(METRICS_APP)
+    return {
+        'wall': meter.create_histogram('storage_check.query.duration', unit='s'),
+        'rows': meter.create_counter('storage_check.query.rows'),
+        'bytes': meter.create_counter('storage_check.query.bytes_scanned', unit='By'),
+        'execution': meter.create_counter('storage_check.query.execution_time', unit='s'),
+    }
+
+
+def _exporter():
+    if METRICS_EXPORT not in ('prometheus', 'otel'):
+        return None
+    with _exporters_lock:
+        if METRICS_EXPORT not in _exporters:
+            try:
+                _exporters[METRICS_EXPORT] = _prometheus() if METRICS_EXPORT == 'prometheus' else _otel()
+            except Exception as e:
+                logging.info(f"Metrics export '{METRICS_EXPORT}' unavailable: {e}")
+                _exporters[METRICS_EXPORT] = None
+        return _exporters[METRICS_EXPORT]
+
+
+def export_record(record):
+    exporter = _exporter()
+    if exporter is None:
+        return
+    if METRICS_EXPORT == 'prometheus':
+        exporter['wall'].labels(record['LABEL'], str(record['CACHED'])).observe(record['WALL_SECONDS'])
+        if record['ROWS']:
+            exporter['rows'].labels(record['LABEL']).inc(record['ROWS'])
+    else:
+        exporter['wall'].record(record['WALL_SECONDS'], {'label': record['LABEL'], 'cached': record['CACHED']})
+        if record['ROWS']:
+            exporter['rows'].add(record['ROWS'], {'label': record['LABEL']})
+
+
+def export_stats(stats):
+    exporter = _exporter()
+    if exporter is None:
+        return
+    warehouse = stats['WAREHOUSE_NAME'] or ''
+    if METRICS_EXPORT == 'prometheus':
+        exporter['bytes'].labels(warehouse).inc(stats['BYTES_SCANNED'] or 0)
+        exporter['execution'].labels(warehouse).inc((stats['EXECUTION_TIME'] or 0) / 1000)
+    else:
+        exporter['bytes'].add(stats['BYTES_SCANNED'] or 0, {'warehouse': warehouse})
+        exporter['execution'].add((stats['EXECUTION_TIME'] or 0) / 1000, {'warehouse': warehouse})
@@ -0,0 +1,27 @@
+import logging
+
+# Long-running steps report progress by calling progress(message). Any callable works;
+# these cover the Streamlit app, headless runs and callers that want silence.
+
+
+class StreamlitProgress:
+    def __call__(self, message):
+        import streamlit as st
+        st.write(message)
+
+
+class LoggingProgress:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+
+    def __call__(self, message):
+        logging.info(f"{self.prefix}{message}")
+
+
+class NullProgress:
+    def __call__(self, message):
+        pass
+
+
+def resolve_progress(progress=None):
+    return progress if progress is not None else StreamlitProgress()
@@ -0,0 +1,154 @@
+import streamlit as st
+
+from datetime import datetime, timezone
+from storage.drilldown import load_storage_cube
+from storage.forecast import generate_storage_forecast
+from storage.growth import load_table_growth, reset_growth_snapshot
+from storage.queries import ACCOUNT_USAGE_LATENCY, cache_scope, clear_query_cache, run_query
+from storage.recommendations import load_table_details
+from storage.rollup import ROLLUP_REFRESH_INTERVAL, dashboard_queries, reset_rollup_refresh
+from storage.session import get_session, is_session_alive
+from storage.stages import load_stage_summary
+from storage.unused_tables import (
+    ACCESS_SUMMARY_REFRESH_INTERVAL,
+    filter_unused_tables,
+    load_table_access,
+    reset_access_summary_refresh
+)
+
+# One provider per dashboard section. Each fetches only what its section shows,
+# so a section's queries run when it is opened and not on every page load.
+
+STORAGE_DATA_TTL = ROLLUP_REFRESH_INTERVAL
+TABLE_ACCESS_TTL = ACCESS_SUMMARY_REFRESH_INTERVAL
+STORAGE_CUBE_TTL = ACCOUNT_USAGE_LATENCY['table_storage_metrics']
+# LIST runs against every internal stage, so a stage scan is reused for an hour
+STAGE_SUMMARY_TTL = 60 * 60
+
+
+def monthly_storage(session=None, use_cache=True):
+    return run_query(dashboard_queries(session=session)['storage_data'], use_cache=use_cache, session=session)
+
+
+def daily_storage(session=None, use_cache=True):
+    return run_query(dashboard_queries(session=session)['daily_storage_data'], use_cache=use_cache, session=session)
+
+
+def storage_breakdown(session=None, use_cache=True):
+    return run_query(dashboard_queries(session=session)['breakdown_data'], use_cache=use_cache, session=session)
+
+
+def table_access(session=None, use_cache=True):
+    return load_table_access(session=session, use_cache=use_cache)
+
+
+def table_details(session=None, use_cache=True):
+    return load_table_details(session=session, use_cache=use_cache)
+
+
+def storage_cube(session=None, use_cache=True):
+    return load_storage_cube(session=session, use_cache=use_cache)
+
+
+def table_growth(session=None, use_cache=True):
+    return load_table_growth(session=session, use_cache=use_cache)
+
+
+def stage_summary(session=None, use_cache=True):
+    return load_stage_summary(session=session, use_cache=use_cache)
+
+
+def unused_tables(unused_days, storage_cost_per_tb, session=None):
+    access = table_access(session=session)
+    return None if access is None else filter_unused_tables(access, unused_days, storage_cost_per_tb)
+
+
+def storage_forecast(training_days, predicted_days, backend=None, progress=None, session=None):
+    return generate_storage_forecast(training_days, predicted_days, backend=backend, progress=progress, session=session)
+
+
+# Streamlit caches shared by every viewer of this server process. The session is a
+# cached resource; results are cached data keyed by account and role, and the query
+# cache is bypassed underneath so each result is held once.
+
+@st.cache_resource(show_spinner=False, validate=is_session_alive)
+def shared_session():
+    return get_session()
+
+
+@st.cache_resource(show_spinner=False)
+def shared_scope():
+    return cache_scope(shared_session())
+
+
+def _fetched(provider):
+    return provider(session=shared_session(), use_cache=False), datetime.now(timezone.utc)
+
+
+@st.cache_data(ttl=STORAGE_DATA_TTL, show_spinner=False)
+def cached_monthly_storage(scope):
+    return _fetched(monthly_storage)
+
+
+@st.cache_data(ttl=STORAGE_DATA_TTL, show_spinner=False)
+def cached_daily_storage(scope):
+    return _fetched(daily_storage)
+
+
+@st.cache_data(ttl=STORAGE_DATA_TTL, show_spinner=False)
+def cached_storage_breakdown(scope):
+    return _fetched(storage_breakdown)
+
+
+@st.cache_data(ttl=TABLE_ACCESS_TTL, show_spinner=False)
+def cached_table_access(scope):
+    return _fetched(table_access)
+
+
+@st.cache_data(ttl=STORAGE_DATA_TTL, show_spinner=False)
+def cached_table_growth(scope):
+    return _fetched(table_growth)
+
+
+@st.cache_data(ttl=STORAGE_CUBE_TTL, show_spinner=False)
+def cached_table_details(scope):
+    return _fetched(table_details)
+
+
+@st.cache_data(ttl=STAGE_SUMMARY_TTL, show_spinner=False)
+def cached_stage_summary(scope):
+    return _fetched(stage_summary)
+
+
+# A resource rather than data: the indexed cube is shared as is instead of copied on every rerun
+@st.cache_resource(ttl=STORAGE_CUBE_TTL, show_spinner=False)
+def cached_storage_cube(scope):
+    return _fetched(storage_cube)
+
+
+PROVIDERS = {
+    'storage_data': cached_monthly_storage,
+    'daily_storage_data': cached_daily_storage,
+    'breakdown_data': cached_storage_breakdown,
+    'table_access': cached_table_access,
+    'table_growth': cached_table_growth,
+    'storage_cube': cached_storage_cube,
+    'table_details': cached_table_details,
+    'stage_summary': cached_stage_summary,
+}
+
+
+def load_section(name):
+    # Returns (data, fetched_at) from the shared cache, querying on a miss
+    return PROVIDERS[name](shared_scope())
+
+
+def invalidate(name=None):
+    # Drops cached results for one section, or for all of them, so the next load queries
+    # Snowflake again; the rollup, access summary and growth snapshot are refreshed on that load as well
+    for provider in ([PROVIDERS[name]] if name else PROVIDERS.values()):
+        provider.clear()
+    clear_query_cache()
+    reset_rollup_refresh()
+    reset_access_summary_refresh()
+    reset_growth_snapshot()
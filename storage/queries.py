@@ -1,11 +1,340 @@
-from storage.session import create_snowflake_session
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import uuid
+import weakref
+import pandas as pd
 
-def run_query(query):
-    session = create_snowflake_session()
-    df = session.sql(query).to_pandas() if session else None
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from storage.frames import row_count
+from storage.metrics import query_metrics
+from storage.session import SESSION_POOL_SIZE, get_session, pooled_session, session_key
+
+# Worst-case refresh latency of the ACCOUNT_USAGE views the app reads, in seconds.
+# A cached result is never older than the data Snowflake could have given us.
+ACCOUNT_USAGE_LATENCY = {
+    'storage_usage': 2 * 60 * 60,
+    'stage_storage_usage_history': 2 * 60 * 60,
+    'database_storage_usage_history': 3 * 60 * 60,
+    'access_history': 3 * 60 * 60,
+    'table_storage_metrics': 90 * 60,
+    'tables': 90 * 60,
+    'query_history': 45 * 60,
+}
+DEFAULT_QUERY_TTL = 15 * 60
+QUERY_CACHE_MAX_BYTES = int(os.getenv('STORAGE_QUERY_CACHE_MB', 256)) * 1024 * 1024
+QUERY_CACHE_DIR = os.getenv('STORAGE_QUERY_CACHE_DIR')
+
+_ACCOUNT_USAGE_VIEW = re.compile(r'account_usage\.(\w+)', re.IGNORECASE)
+
+
+def normalize_sql(query):
+    return re.sub(r'\s+', ' ', query).strip().rstrip(';').strip()
+
+
+def query_ttl(query):
+    views = [view.lower() for view in _ACCOUNT_USAGE_VIEW.findall(query)]
+    latencies = [ACCOUNT_USAGE_LATENCY[view] for view in views if view in ACCOUNT_USAGE_LATENCY]
+    return min(latencies) if latencies else DEFAULT_QUERY_TTL
+
+
+RESULT_FORMATS = ('pandas', 'arrow', 'arrow_pandas', 'categorical', 'batches')
+
+
+def _frame_bytes(df):
+    try:
+        if hasattr(df, 'nbytes'):
+            return int(df.nbytes)
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+def _from_arrow(table, result_format):
+    if result_format == 'arrow':
+        return table
+    if result_format == 'arrow_pandas':
+        # String columns stay in Arrow buffers instead of one Python object per value
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    if result_format == 'categorical':
+        return table.to_pandas(strings_to_categorical=True)
+    return table.to_pandas()
+
+
+def _read_parquet(path, result_format):
+    import pyarrow.parquet as pq
+    return _from_arrow(pq.read_table(path), result_format)
+
+
+def _write_parquet(df, path):
+    if hasattr(df, 'to_parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(df, path)
+
+
+class QueryCache:
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES, cache_dir=QUERY_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, query, scope, result_format='pandas'):
+        text = repr(tuple(scope)) + '\n' + result_format + '\n' + normalize_sql(query)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key, ttl, result_format='pandas'):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                df, stored_at, nbytes = entry
+                if now - stored_at <= ttl:
+                    self._entries.move_to_end(key)
+                    return df
+                self._evict(key)
+
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                stored_at = os.path.getmtime(path)
+                if now - stored_at <= ttl:
+                    df = _read_parquet(path, result_format)
+                    self._remember(key, df, stored_at)
+                    return df
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.info(f"Error reading cached query result {path}: {e}")
+        return None
+
+    def put(self, key, df):
+        stored_at = time.time()
+        self._remember(key, df, stored_at)
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                _write_parquet(df, path + '.tmp')
+                os.replace(path + '.tmp', path)
+            except Exception as e:
+                logging.info(f"Error writing cached query result {path}: {e}")
+
+    def _remember(self, key, df, stored_at):
+        nbytes = _frame_bytes(df)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._evict(key)
+            self._entries[key] = (df, stored_at, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.parquet'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+query_cache = QueryCache()
+
+
+def clear_query_cache():
+    query_cache.clear()
+
+
+_session_scopes = weakref.WeakKeyDictionary()
+_session_scopes_lock = threading.Lock()
+
+
+def cache_scope(session=None):
+    if session is None:
+        return session_key()
+    # Two server round trips, so they are looked up once per session object rather than
+    # on every cached call; forgotten when the session goes away
+    with _session_scopes_lock:
+        scope = _session_scopes.get(session)
+    if scope is None:
+        try:
+            scope = (session.get_current_account(), session.get_current_role())
+        except Exception:
+            scope = (id(session),)
+        with _session_scopes_lock:
+            _session_scopes[session] = scope
+    return scope
+
+
+def _fetch(session, query, result_format, statement_params=None):
+    dataframe = session.sql(query)
+    if result_format == 'pandas':
+        return dataframe.to_pandas(statement_params=statement_params)
+    if result_format == 'batches':
+        return dataframe.to_pandas_batches(statement_params=statement_params)
+    return _from_arrow(dataframe.to_arrow(statement_params=statement_params), result_format)
+
+
+def _run_query(query, session, scope, ttl, use_cache, result_format='pandas'):
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format '{result_format}', expected one of {RESULT_FORMATS}.")
+    # Batches are a one-shot iterator and are never cached
+    use_cache = use_cache and result_format != 'batches'
+    # Cached frames are shared between callers; treat them as read-only
+    if use_cache:
+        started = time.perf_counter()
+        key = query_cache.key(query, scope, result_format)
+        df = query_cache.get(key, query_ttl(query) if ttl is None else ttl, result_format)
+        if df is not None:
+            query_metrics.record(query, time.perf_counter() - started, row_count(df), cached=True)
+            return df
+
+    # Every statement is tagged and timed; see storage.metrics
+    df = query_metrics.measure(query, session, lambda params: _fetch(session, query, result_format, params)) \
+        if session else None
+    if use_cache and df is not None:
+        query_cache.put(key, df)
     return df
 
-def run_command(query):
-    session = create_snowflake_session()
-    df = session.sql(query).collect() if session else None
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def run_query(query, ttl=None, use_cache=True, session=None, result_format='pandas'):
+    # result_format: 'pandas', 'arrow' (pyarrow.Table), 'arrow_pandas' (Arrow-backed dtypes),
+    # 'categorical' (strings as categories) or 'batches' (iterator of pandas frames)
+    return _run_query(query, session or get_session(), cache_scope(session), ttl, use_cache, result_format)
+
+def run_command(query, session=None):
+    session = session or get_session()
+    df = query_metrics.measure(query, session, lambda params: session.sql(query).collect(statement_params=params)) \
+        if session else None
     return df
+
+def run_script(statements, session=None):
+    # One round trip for several statements, as an anonymous Snowflake Scripting block
+    statements = [statement.strip().rstrip(';') for statement in statements if statement.strip()]
+    if not statements:
+        return None
+    body = '\n'.join(f"    {statement};" for statement in statements)
+    return run_command(f"EXECUTE IMMEDIATE $$\nBEGIN\n{body}\nEND;\n$$", session=session)
+
+class TemporaryObjects:
+    def __init__(self, session=None):
+        self.session = session
+        self.objects = []
+
+    def name(self, prefix, kind='TABLE'):
+        # Unique per call, so concurrent users never share an object name
+        name = f"{prefix}_{uuid.uuid4().hex[:12]}"
+        self.objects.append((kind, name))
+        return name
+
+    def drop(self):
+        try:
+            run_script([f"DROP {kind} IF EXISTS {name}" for kind, name in reversed(self.objects)], session=self.session)
+        except Exception as e:
+            logging.info(f"Error dropping temporary objects {self.objects}: {e}")
+        self.objects = []
+
+@contextmanager
+def temporary_objects(session=None):
+    objects = TemporaryObjects(session)
+    try:
+        yield objects
+    finally:
+        objects.drop()
+
+def run_queries(queries, ttl=None, use_cache=True, max_workers=None):
+    # Runs independent named queries concurrently and yields (name, frame) as each one completes.
+    # A query is either SQL text or a callable taking a session keyword, for multi-step loaders.
+    scope = cache_scope()
+    pending = {}
+    for name, query in queries.items():
+        cached = None
+        if use_cache and not callable(query):
+            cached = query_cache.get(query_cache.key(query, scope), query_ttl(query) if ttl is None else ttl)
+        if cached is not None:
+            yield name, cached
+        else:
+            pending[name] = query
+    if not pending:
+        return
+
+    def _run_pooled(query):
+        with pooled_session() as session:
+            if callable(query):
+                return query(session=session)
+            return _run_query(query, session, scope, ttl, use_cache)
+
+    workers = max_workers or min(len(pending), SESSION_POOL_SIZE)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_run_pooled, query): name for name, query in pending.items()}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+MONTHLY_STORAGE_QUERY = """
+select to_char(usage_date,'YYYYMM') as sort_month,
+       to_char(usage_date,'Mon-YYYY') as month,
+       avg(storage_bytes) / power(1024, 3) as storage,
+       avg(stage_bytes) / power(1024, 3) as stage,
+       avg(failsafe_bytes) / power(1024, 3) as failsafe
+from snowflake.account_usage.storage_usage
+group by month, sort_month
+order by sort_month;
+"""
+
+DAILY_STORAGE_QUERY = """
+SELECT 
+    USAGE_DATE,
+    STORAGE_BYTES / POWER(1024, 3) AS STORAGE_GB,
+    STAGE_BYTES / POWER(1024, 3) AS STAGE_GB,
+    FAILSAFE_BYTES / POWER(1024, 3) AS FAILSAFE_GB
+FROM snowflake.account_usage.storage_usage
+WHERE USAGE_DATE >= DATEADD(day, -30, CURRENT_DATE())
+ORDER BY USAGE_DATE;
+"""
+
+STORAGE_BREAKDOWN_QUERY = """
+WITH storage_stats AS (
+    SELECT 
+        STORAGE_BYTES as total_active_bytes,
+        STAGE_BYTES as total_stage_bytes,
+        FAILSAFE_BYTES as total_failsafe_bytes
+    FROM snowflake.account_usage.storage_usage
+    WHERE USAGE_DATE = DATEADD(day, -1, (SELECT MAX(USAGE_DATE) FROM snowflake.account_usage.storage_usage))
+)
+SELECT 
+    ROUND(total_active_bytes / POWER(1024, 3), 1) AS "Active Storage (GB)",
+    ROUND(total_stage_bytes / POWER(1024, 3), 1) AS "Stage Storage (GB)",
+    ROUND(total_failsafe_bytes / POWER(1024, 3), 1) AS "Failsafe Storage (GB)",
+    ROUND((total_stage_bytes / (total_active_bytes + total_stage_bytes + total_failsafe_bytes)) * 100, 1) AS "Stage %",
+    ROUND((total_failsafe_bytes / (total_active_bytes + total_stage_bytes + total_failsafe_bytes)) * 100, 1) AS "Fail-Safe %"
+FROM storage_stats;
+"""
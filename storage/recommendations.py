@@ -1,56 +1,264 @@
+import threading
+import numpy as np
 import streamlit as st
 
-def generate_recommendations(forecast_data, unused_tables, breakdown_data):
-    recommendations = []
-
-    # Storage growth recommendations
-    if forecast_data is not None and not forecast_data.empty:
-        current_storage = forecast_data['FORECAST_GB'].iloc[0]
-        future_storage = forecast_data['FORECAST_GB'].iloc[-1]
-        growth_rate = (future_storage - current_storage) / current_storage
-
-        if growth_rate > 0.2:
-            recommendations.append({
-                "type": "warning",
-                "title": "High Projected Storage Growth",
-                "content": f"""
-                - Projected storage growth: {growth_rate:.2%} over the next {len(forecast_data)} days
-                - Implement data archiving strategies for old or infrequently accessed data
-                - Review and optimize data retention policies
-                - Consider compressing large tables or using clustering to improve query performance and reduce storage
-                """
-            })
-
-    # Unused tables recommendations
-    if unused_tables is not None and not unused_tables.empty:
-        total_savings = unused_tables['ANNUALIZED_STORAGE_COST'].sum()
-        num_unused_tables = len(unused_tables)
-        
-        recommendations.append({
-            "type": "info",
-            "title": "Potential Cost Savings from Unused Tables",
-            "content": f"""
-            - {num_unused_tables} tables haven't been accessed in the specified period
-            - Potential annual savings: ${total_savings:.2f}
-            - Review these tables for potential deletion or archiving
-            - For critical tables, consider using smaller samples or aggregations instead of full datasets
-            """
-        })
-
-    # General recommendations
-    recommendations.append({
+from storage.frames import column_sum, frame_fingerprint, is_empty, row_count
+from storage.queries import run_query
+
+# Recommendations come from rules registered with @rule. Table rules work on whole columns
+# of the per-table details frame at once, and every result is scored by its annual dollar
+# impact. RuleEngine reuses a rule's last result until one of its inputs changes.
+
+GROWTH_MAX_RATE = 0.2
+# Time travel bytes, as a share of active bytes, above which a long retention is flagged
+TIME_TRAVEL_MIN_SHARE = 0.5
+CLONE_MIN_BYTES = 1024 ** 3
+# Fail-safe bytes per active byte: permanent tables rewritten this often suit TRANSIENT
+TRANSIENT_FAILSAFE_RATIO = 1.0
+STAGE_MAX_PCT = 10
+FAILSAFE_MAX_PCT = 20
+RULE_TOP_TABLES = 5
+
+TABLE_DETAILS_QUERY = """
+    SELECT
+        metrics.id AS table_id,
+        metrics.table_catalog || '.' || metrics.table_schema || '.' || metrics.table_name AS fully_qualified_table_name,
+        metrics.table_catalog,
+        metrics.table_schema,
+        metrics.table_name,
+        metrics.is_transient,
+        tables.retention_time,
+        metrics.active_bytes,
+        metrics.time_travel_bytes,
+        metrics.failsafe_bytes,
+        metrics.retained_for_clone_bytes
+    FROM snowflake.account_usage.table_storage_metrics AS metrics
+    LEFT JOIN snowflake.account_usage.tables AS tables
+        ON tables.table_id = metrics.id AND tables.deleted IS NULL
+    WHERE
+        NOT metrics.deleted
+"""
+
+GENERAL_RECOMMENDATION = {
+    "type": "info",
+    "title": "General Storage Optimization Tips",
+    "content": """
+    - Regularly monitor and analyze query patterns to optimize table designs
+    - Use appropriate compression techniques for large tables
+    - Implement automated processes to clean up temporary and transient objects
+    - Periodically review and adjust resource monitors and usage alerts
+    - Consider using zero-copy cloning for backup and testing purposes
+    """
+}
+
+RULES = {}
+
+
+def load_table_details(session=None, use_cache=True):
+    return run_query(TABLE_DETAILS_QUERY, use_cache=use_cache, session=session, result_format='arrow_pandas')
+
+
+def rule(name, inputs):
+    # Registers evaluate(*inputs, storage_cost_per_tb) -> recommendation or None.
+    # A rule only runs when all of its inputs are available.
+    def register(evaluate):
+        RULES[name] = {'inputs': tuple(inputs), 'evaluate': evaluate}
+        return evaluate
+    return register
+
+
+def annual_cost(nbytes, storage_cost_per_tb):
+    return nbytes / 1024 ** 4 * storage_cost_per_tb * 12
+
+
+def _bullets(*lines):
+    return "\n".join(f"- {line}" for line in lines)
+
+
+def _columns(details, *names):
+    return [details[name].to_numpy(dtype=float, na_value=0) for name in names]
+
+
+def _top_tables(details, savings, n=RULE_TOP_TABLES):
+    # The n tables with the largest savings, without sorting the whole frame
+    flagged = np.flatnonzero(savings > 0)
+    if len(flagged) > n:
+        flagged = flagged[np.argpartition(-savings[flagged], n)[:n]]
+    flagged = flagged[np.argsort(-savings[flagged])]
+    names = details['FULLY_QUALIFIED_TABLE_NAME'].iloc[flagged]
+    return [f"{name}: ${saving:,.2f} per year" for name, saving in zip(names, savings[flagged])]
+
+
+@rule('storage_growth', ['forecast_data'])
+def storage_growth_rule(forecast_data, storage_cost_per_tb):
+    current_storage = forecast_data['FORECAST_GB'].iloc[0]
+    future_storage = forecast_data['FORECAST_GB'].iloc[-1]
+    growth_rate = (future_storage - current_storage) / current_storage
+    if not growth_rate > GROWTH_MAX_RATE:
+        return None
+    return {
+        "type": "warning",
+        "title": "High Projected Storage Growth",
+        "impact": annual_cost((future_storage - current_storage) * 1024 ** 3, storage_cost_per_tb),
+        "content": f"""
+        - Projected storage growth: {growth_rate:.2%} over the next {len(forecast_data)} days
+        - Implement data archiving strategies for old or infrequently accessed data
+        - Review and optimize data retention policies
+        - Consider compressing large tables or using clustering to improve query performance and reduce storage
+        """
+    }
+
+
+@rule('unused_tables', ['unused_tables'])
+def unused_tables_rule(unused_tables, storage_cost_per_tb):
+    total_savings = column_sum(unused_tables, 'ANNUALIZED_STORAGE_COST')
+    return {
         "type": "info",
-        "title": "General Storage Optimization Tips",
-        "content": """
-        - Regularly monitor and analyze query patterns to optimize table designs
-        - Use appropriate compression techniques for large tables
-        - Implement automated processes to clean up temporary and transient objects
-        - Periodically review and adjust resource monitors and usage alerts
-        - Consider using zero-copy cloning for backup and testing purposes
+        "title": "Potential Cost Savings from Unused Tables",
+        "impact": total_savings,
+        "content": f"""
+        - {row_count(unused_tables)} tables haven't been accessed in the specified period
+        - Potential annual savings: ${total_savings:.2f}
+        - Review these tables for potential deletion or archiving
+        - For critical tables, consider using smaller samples or aggregations instead of full datasets
         """
-    })
+    }
+
+
+@rule('time_travel_retention', ['table_details'])
+def time_travel_retention_rule(table_details, storage_cost_per_tb):
+    retention, time_travel, active = _columns(table_details, 'RETENTION_TIME', 'TIME_TRAVEL_BYTES', 'ACTIVE_BYTES')
+    flagged = (retention > 1) & (time_travel > 0) & (time_travel >= TIME_TRAVEL_MIN_SHARE * active)
+    # A 1 day retention keeps roughly 1/retention of today's time travel bytes
+    savings = np.where(flagged, annual_cost(time_travel * (1 - 1 / np.maximum(retention, 1)), storage_cost_per_tb), 0)
+    if not flagged.any():
+        return None
+    return {
+        "type": "warning",
+        "title": "Excessive Time Travel Retention",
+        "impact": float(savings.sum()),
+        "content": _bullets(
+            f"{int(flagged.sum())} tables keep more than 1 day of time travel holding at least "
+            f"{TIME_TRAVEL_MIN_SHARE:.0%} of their active bytes",
+            "Lower DATA_RETENTION_TIME_IN_DAYS where point-in-time recovery is not needed",
+            *_top_tables(table_details, savings)),
+    }
+
+
+@rule('clone_retained_bytes', ['table_details'])
+def clone_retained_bytes_rule(table_details, storage_cost_per_tb):
+    clone_bytes, = _columns(table_details, 'RETAINED_FOR_CLONE_BYTES')
+    flagged = clone_bytes >= CLONE_MIN_BYTES
+    if not flagged.any():
+        return None
+    savings = np.where(flagged, annual_cost(clone_bytes, storage_cost_per_tb), 0)
+    return {
+        "type": "info",
+        "title": "Storage Retained Only for Clones",
+        "impact": float(savings.sum()),
+        "content": _bullets(
+            f"{int(flagged.sum())} tables hold {clone_bytes[flagged].sum() / 1024 ** 4:,.2f} TB only because clones still reference it",
+            "Drop clones that are no longer used, such as old test or backup copies",
+            *_top_tables(table_details, savings)),
+    }
+
+
+@rule('transient_candidates', ['table_details'])
+def transient_candidates_rule(table_details, storage_cost_per_tb):
+    failsafe, active = _columns(table_details, 'FAILSAFE_BYTES', 'ACTIVE_BYTES')
+    permanent = (table_details['IS_TRANSIENT'] != 'YES').to_numpy(dtype=bool, na_value=True)
+    flagged = permanent & (failsafe > 0) & (failsafe >= TRANSIENT_FAILSAFE_RATIO * active)
+    if not flagged.any():
+        return None
+    savings = np.where(flagged, annual_cost(failsafe, storage_cost_per_tb), 0)
+    return {
+        "type": "info",
+        "title": "Transient Table Candidates",
+        "impact": float(savings.sum()),
+        "content": _bullets(
+            f"{int(flagged.sum())} permanent tables keep more fail-safe than active data, a sign of frequent full rewrites",
+            "Recreate staging and easily reloaded tables as TRANSIENT, which have no fail-safe",
+            *_top_tables(table_details, savings)),
+    }
+
+
+@rule('stage_bloat', ['breakdown_data'])
+def stage_bloat_rule(breakdown_data, storage_cost_per_tb):
+    stage_pct = breakdown_data["Stage %"].iloc[0]
+    if not stage_pct > STAGE_MAX_PCT:
+        return None
+    stage_gb = breakdown_data["Stage Storage (GB)"].iloc[0]
+    return {
+        "type": "warning",
+        "title": "Stage Storage Bloat",
+        "impact": annual_cost(stage_gb * 1024 ** 3, storage_cost_per_tb),
+        "content": _bullets(
+            f"Stages hold {stage_pct:.1f}% of account storage ({stage_gb:,.1f} GB)",
+            "Remove loaded files with PURGE = TRUE on COPY INTO or a scheduled REMOVE",
+            "Review internal stages for old unloads and exports"),
+    }
+
+
+@rule('failsafe_share', ['breakdown_data'])
+def failsafe_share_rule(breakdown_data, storage_cost_per_tb):
+    failsafe_pct = breakdown_data["Fail-Safe %"].iloc[0]
+    if not failsafe_pct > FAILSAFE_MAX_PCT:
+        return None
+    failsafe_gb = breakdown_data["Failsafe Storage (GB)"].iloc[0]
+    return {
+        "type": "warning",
+        "title": "High Fail-Safe Share",
+        # Upper bound; the transient table candidates are the part that can actually be avoided
+        "impact": annual_cost(failsafe_gb * 1024 ** 3, storage_cost_per_tb),
+        "content": _bullets(
+            f"Fail-safe holds {failsafe_pct:.1f}% of account storage ({failsafe_gb:,.1f} GB)",
+            "Fail-safe grows with churn on permanent tables; see the transient table candidates",
+            "Avoid full table rewrites where incremental loads are possible"),
+    }
+
+
+class RuleEngine:
+    def __init__(self, rules=RULES):
+        self.rules = rules
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def evaluate(self, inputs, storage_cost_per_tb=23.0):
+        # Rules whose inputs and price are unchanged since their last run return the same result.
+        # Results are shared between callers; treat them as read-only.
+        fingerprints = {name: frame_fingerprint(data) for name, data in inputs.items()}
+        recommendations = []
+        for name, registered in self.rules.items():
+            key = (storage_cost_per_tb,) + tuple(fingerprints.get(input_name, 'none') for input_name in registered['inputs'])
+            with self.lock:
+                cached = self.results.get(name)
+            if cached is None or cached[0] != key:
+                data = [inputs.get(input_name) for input_name in registered['inputs']]
+                result = None if any(is_empty(frame) for frame in data) else registered['evaluate'](*data, storage_cost_per_tb)
+                cached = (key, result)
+                with self.lock:
+                    self.results[name] = cached
+            if cached[1] is not None:
+                recommendations.append(cached[1])
+        return sorted(recommendations, key=lambda rec: rec.get('impact') or 0, reverse=True)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+
+recommendation_engine = RuleEngine()
+
 
-    return recommendations
+def generate_recommendations(forecast_data, unused_tables, breakdown_data, table_details=None, storage_cost_per_tb=23.0):
+    # Ranked by estimated annual impact, general tips last
+    recommendations = recommendation_engine.evaluate({
+        'forecast_data': forecast_data,
+        'unused_tables': unused_tables,
+        'breakdown_data': breakdown_data,
+        'table_details': table_details,
+    }, storage_cost_per_tb)
+    return recommendations + [GENERAL_RECOMMENDATION]
 
 def display_recommendations(recommendations):
     for rec in recommendations:
@@ -58,4 +266,6 @@ def display_recommendations(recommendations):
             st.warning(rec["title"])
         else:
             st.info(rec["title"])
+        if rec.get("impact"):
+            st.caption(f"Estimated annual impact: ${rec['impact']:,.2f}")
         st.markdown(rec["content"])
@@ -0,0 +1,119 @@
+import os
+import json
+import html
+import logging
+
+from storage.forecast import generate_storage_forecast
+from storage.progress import resolve_progress
+from storage.queries import run_query
+from storage.recommendations import generate_recommendations, load_table_details
+from storage.rollup import dashboard_queries
+from storage.unused_tables import load_unused_tables
+from storage.visualization import (
+    build_monthly_storage_figure,
+    build_daily_storage_figure,
+    build_storage_breakdown_figure,
+    build_unused_tables_figure,
+    build_storage_forecast_figure
+)
+
+REPORT_FORMATS = ['json', 'parquet', 'html']
+REPORT_TOP_UNUSED_TABLES = 25
+
+
+def build_report(session=None, unused_days=90, storage_cost_per_tb=23.0, training_days=60, predicted_days=30,
+                 forecast_backend=None, progress=None):
+    # Everything the dashboard shows, as plain frames and dicts; no Streamlit calls
+    progress = resolve_progress(progress)
+    report = {}
+    progress("Loading storage usage...")
+    for name, query in dashboard_queries(session=session).items():
+        report[name] = run_query(query, session=session)
+    progress("Loading unused tables...")
+    report['unused_tables'] = load_unused_tables(unused_days, storage_cost_per_tb, session=session)
+    report['forecast_data'] = report['actual_data'] = None
+    try:
+        report['forecast_data'], report['actual_data'] = generate_storage_forecast(
+            training_days, predicted_days, backend=forecast_backend, progress=progress, session=session)
+    except Exception as e:
+        logging.info(f"Forecast failed, continuing without it: {e}")
+    progress("Checking table retention and clones...")
+    report['table_details'] = load_table_details(session=session)
+    report['recommendations'] = generate_recommendations(
+        report['forecast_data'], report['unused_tables'], report['breakdown_data'],
+        report['table_details'], storage_cost_per_tb)
+    report['parameters'] = {
+        'unused_days': unused_days,
+        'storage_cost_per_tb': storage_cost_per_tb,
+        'training_days': training_days,
+        'predicted_days': predicted_days,
+    }
+    return report
+
+
+def _datasets(report):
+    return {name: data for name, data in report.items()
+            if hasattr(data, 'to_dict')}
+
+
+def _figures(report):
+    builders = [
+        ('storage_data', build_monthly_storage_figure),
+        ('daily_storage_data', build_daily_storage_figure),
+        ('breakdown_data', build_storage_breakdown_figure),
+        ('unused_tables', build_unused_tables_figure),
+    ]
+    for name, build in builders:
+        data = report.get(name)
+        if data is not None and len(data):
+            yield build(data)
+    if report.get('forecast_data') is not None:
+        yield build_storage_forecast_figure(report['forecast_data'], report['actual_data'])
+
+
+def write_json(report, path):
+    payload = {
+        'parameters': report['parameters'],
+        'recommendations': report['recommendations'],
+        'data': {name: data.to_dict(orient='records') for name, data in _datasets(report).items()},
+    }
+    with open(path, 'w') as report_file:
+        json.dump(payload, report_file, indent=2, default=str)
+
+
+def write_parquet(report, directory):
+    for name, data in _datasets(report).items():
+        data.to_parquet(os.path.join(directory, f"{name}.parquet"), index=False)
+
+
+def write_html(report, path):
+    parts = ["<html><head><meta charset='utf-8'><title>Snowflake Storage Report</title></head><body>",
+             "<h1>Snowflake Storage Report</h1>"]
+    include_plotlyjs = 'cdn'
+    for fig in _figures(report):
+        parts.append(fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs))
+        include_plotlyjs = False
+    parts.append("<h2>Recommendations</h2>")
+    for rec in report['recommendations']:
+        parts.append(f"<h3>{html.escape(rec['title'])}</h3>")
+        if rec.get('impact'):
+            parts.append(f"<p>Estimated annual impact: ${rec['impact']:,.2f}</p>")
+        parts.append(f"<pre>{html.escape(rec['content'])}</pre>")
+    unused_tables = report.get('unused_tables')
+    if unused_tables is not None and len(unused_tables):
+        parts.append("<h2>Unused Tables</h2>")
+        parts.append(unused_tables.head(REPORT_TOP_UNUSED_TABLES).to_html(index=False))
+    parts.append("</body></html>")
+    with open(path, 'w', encoding='utf-8') as report_file:
+        report_file.write("\n".join(parts))
+
+
+def write_report(report, directory, formats=REPORT_FORMATS):
+    os.makedirs(directory, exist_ok=True)
+    if 'json' in formats:
+        write_json(report, os.path.join(directory, "report.json"))
+    if 'parquet' in formats:
+        write_parquet(report, directory)
+    if 'html' in formats:
+        write_html(report, os.path.join(directory, "report.html"))
+    return directory
@@ -0,0 +1,163 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+from storage.queries import quote_identifier
+from storage.recommendations import TRANSIENT_FAILSAFE_RATIO, annual_cost, load_table_details
+
+# What-if simulation of time travel and fail-safe spend. Time travel bytes are taken to
+# grow linearly with the retention period (the table's daily churn times its retention);
+# fail-safe holds a fixed 7 days of churn on permanent tables and nothing on transient
+# ones, which also cap retention at 1 day. Every configuration is evaluated for every
+# table at once with NumPy broadcasting, a chunk of tables at a time.
+
+RETENTION_CAPS = np.array([0, 1, 2, 3, 5, 7, 14, 30, 60, 90])
+# Convert permanent tables to transient when fail-safe bytes reach this multiple of active bytes
+TRANSIENT_RATIOS = np.array([np.inf, 0.25, 0.5, 1, 2, 3, 5])
+# Table x (caps + ratios) cells per chunk; bounds the size of every intermediate array
+RETENTION_CHUNK_CELLS = int(os.getenv('STORAGE_RETENTION_CHUNK_CELLS', 4_000_000))
+RETENTION_TOP_ACTIONS = 100
+
+
+def table_arrays(details):
+    # Only tables with time travel or fail-safe bytes can save anything
+    arrays = {
+        'retention': details['RETENTION_TIME'].to_numpy(dtype=float, na_value=1),
+        'time_travel': details['TIME_TRAVEL_BYTES'].to_numpy(dtype=float, na_value=0),
+        'failsafe': details['FAILSAFE_BYTES'].to_numpy(dtype=float, na_value=0),
+        'active': details['ACTIVE_BYTES'].to_numpy(dtype=float, na_value=0),
+        'permanent': (details['IS_TRANSIENT'] != 'YES').to_numpy(dtype=bool, na_value=True),
+    }
+    rows = np.flatnonzero((arrays['time_travel'] > 0) | (arrays['failsafe'] > 0))
+    return rows, {name: values[rows] for name, values in arrays.items()}
+
+
+def _savings(tables, caps, ratios):
+    # Bytes saved per table (rows) and configuration (columns)
+    retention = tables['retention'][:, None]
+    transient = tables['permanent'][:, None] & (tables['failsafe'][:, None] >= ratios * tables['active'][:, None])
+    new_retention = np.minimum(retention, np.where(transient, np.minimum(caps, 1), caps))
+    time_travel_saved = np.where(retention > 0, tables['time_travel'][:, None] * (1 - new_retention / np.maximum(retention, 1)), 0)
+    failsafe_saved = np.where(transient, tables['failsafe'][:, None], 0)
+    return time_travel_saved, failsafe_saved, transient, new_retention
+
+
+def simulate_retention(details, caps=RETENTION_CAPS, ratios=TRANSIENT_RATIOS, storage_cost_per_tb=23.0,
+                       chunk_cells=RETENTION_CHUNK_CELLS):
+    # One row per (retention cap, transient ratio) configuration, best first. A table's saving
+    # is its cap-only saving plus, when converted, the extra from capping at 1 day and
+    # dropping fail-safe, so tables x caps and tables x ratios are broadcast separately and
+    # combined per chunk by one matrix product over the tables.
+    caps, ratios = np.asarray(caps, dtype=float), np.asarray(ratios, dtype=float)
+    _, tables = table_arrays(details)
+    time_travel_saved = np.zeros((len(ratios), len(caps)))
+    tables_changed = np.zeros((len(ratios), len(caps)))
+    failsafe_saved = np.zeros(len(ratios))
+    converted_tables = np.zeros(len(ratios))
+    chunk = max(1, chunk_cells // (len(caps) + len(ratios)))
+    for start in range(0, len(tables['retention']), chunk):
+        part = {name: values[start:start + chunk] for name, values in tables.items()}
+        retention = part['retention'][:, None]
+        per_day = np.where(retention > 0, part['time_travel'][:, None] / np.maximum(retention, 1), 0)
+        kept = np.minimum(retention, caps)
+        saved = per_day * (retention - kept)
+        saved_transient = per_day * (retention - np.minimum(retention, np.minimum(caps, 1)))
+        changed = kept < retention
+        converted = (part['permanent'][:, None]
+                     & (part['failsafe'][:, None] >= ratios * part['active'][:, None])).astype(float)
+        time_travel_saved += saved.sum(axis=0) + converted.T @ (saved_transient - saved)
+        tables_changed += changed.sum(axis=0) + converted.T @ (~changed)
+        failsafe_saved += converted.T @ part['failsafe']
+        converted_tables += converted.sum(axis=0)
+
+    # Rows are caps x ratios, ratios varying fastest
+    time_travel_saved = time_travel_saved.T.ravel()
+    failsafe_saved = np.tile(failsafe_saved, len(caps))
+    simulation = pd.DataFrame({
+        'RETENTION_CAP': np.repeat(caps, len(ratios)).astype(int),
+        'TRANSIENT_RATIO': np.tile(ratios, len(caps)),
+        'TRANSIENT_POLICY': [f"fail-safe >= {ratio:g}x active" if np.isfinite(ratio) else "none" for ratio in ratios] * len(caps),
+        'TABLES_CHANGED': np.rint(tables_changed.T.ravel()).astype(np.int64),
+        'TABLES_CONVERTED': np.tile(np.rint(converted_tables).astype(np.int64), len(caps)),
+        'TIME_TRAVEL_SAVED_GB': time_travel_saved / 1024 ** 3,
+        'FAILSAFE_SAVED_GB': failsafe_saved / 1024 ** 3,
+        'ANNUAL_SAVINGS': annual_cost(time_travel_saved + failsafe_saved, storage_cost_per_tb),
+    })
+    return simulation.sort_values('ANNUAL_SAVINGS', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def retention_statement(catalog, schema, table, retention_days, to_transient):
+    # Tables cannot be altered to TRANSIENT: the data is copied into a transient table created
+    # LIKE the original with COPY GRANTS, swapped in, and the swapped-out permanent copy dropped.
+    # Its bytes still pass through time travel and fail-safe once.
+    name = '.'.join(map(quote_identifier, (catalog, schema, table)))
+    if not to_transient:
+        return f"ALTER TABLE {name} SET DATA_RETENTION_TIME_IN_DAYS = {retention_days}"
+    swap = '.'.join(map(quote_identifier, (catalog, schema, f"{table}_RETENTION_SWAP")))
+    return "; ".join([
+        f"CREATE TRANSIENT TABLE {swap} LIKE {name} COPY GRANTS",
+        f"ALTER TABLE {swap} SET DATA_RETENTION_TIME_IN_DAYS = {retention_days}",
+        f"INSERT INTO {swap} SELECT * FROM {name}",
+        f"ALTER TABLE {name} SWAP WITH {swap}",
+        f"DROP TABLE {swap}",
+    ])
+
+
+def retention_actions(details, retention_cap=1, transient_ratio=TRANSIENT_FAILSAFE_RATIO, storage_cost_per_tb=23.0,
+                      n=RETENTION_TOP_ACTIONS):
+    # The tables that save the most under one configuration, with the statement to apply it
+    rows, tables = table_arrays(details)
+    time_travel, failsafe, transient, new_retention = _savings(
+        tables, np.array([float(retention_cap)]), np.array([float(transient_ratio)]))
+    savings = annual_cost(time_travel[:, 0] + failsafe[:, 0], storage_cost_per_tb)
+    ranked = np.flatnonzero(savings > 0)
+    if n is not None and len(ranked) > n:
+        ranked = ranked[np.argpartition(-savings[ranked], n)[:n]]
+    ranked = ranked[np.argsort(-savings[ranked])]
+    table_rows = rows[ranked]
+    names = details['FULLY_QUALIFIED_TABLE_NAME'].iloc[table_rows].to_numpy(dtype=object)
+    catalogs, schemas, table_names = (details[column].iloc[table_rows].tolist()
+                                      for column in ['TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME'])
+    convert = transient[ranked, 0]
+    retention = new_retention[ranked, 0].astype(int)
+    return pd.DataFrame({
+        'FULLY_QUALIFIED_TABLE_NAME': names,
+        'RETENTION_TIME': tables['retention'][ranked].astype(int),
+        'NEW_RETENTION_TIME': retention,
+        'CONVERT_TO_TRANSIENT': convert,
+        'TIME_TRAVEL_SAVED_GB': time_travel[ranked, 0] / 1024 ** 3,
+        'FAILSAFE_SAVED_GB': failsafe[ranked, 0] / 1024 ** 3,
+        'ANNUAL_SAVINGS': savings[ranked],
+        'ACTION': [retention_statement(catalog, schema, table, days, to_transient) for catalog, schema, table, to_transient, days
+                   in zip(catalogs, schemas, table_names, convert, retention)],
+    })
+
+
+def add_retention_arguments(parser):
+    parser.add_argument("--cap", type=int, default=1, help="Retention cap in days for the action list")
+    parser.add_argument("--transient-ratio", type=float, default=TRANSIENT_FAILSAFE_RATIO,
+                        help="Fail-safe to active bytes ratio above which tables become transient")
+    parser.add_argument("--storage-cost", type=float, default=23.0, help="Storage cost per TB per month ($)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--simulation", help="Write every simulated configuration to this CSV file")
+    return parser
+
+
+def run_retention(args, session=None):
+    details = load_table_details(session=session, use_cache=False)
+    if args.simulation:
+        caps = np.arange(0, 91)
+        ratios = np.concatenate([[np.inf], np.linspace(0.25, 5, 20)])
+        simulate_retention(details, caps, ratios, args.storage_cost).to_csv(args.simulation, index=False)
+    actions = retention_actions(details, args.cap, args.transient_ratio, args.storage_cost, args.top)
+    print(actions.to_string(index=False))
+
+
+def main(argv=None):
+    parser = add_retention_arguments(argparse.ArgumentParser(description="Simulate time travel and fail-safe savings."))
+    run_retention(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import time
+import logging
+import argparse
+import threading
+
+from storage.queries import (
+    cache_scope,
+    run_command,
+    MONTHLY_STORAGE_QUERY,
+    DAILY_STORAGE_QUERY,
+    STORAGE_BREAKDOWN_QUERY
+)
+
+ROLLUP_TABLE = "storage_usage_rollup"
+ROLLUP_TASK = "storage_usage_rollup_refresh"
+ROLLUP_TASK_SCHEDULE = "USING CRON 0 */6 * * * UTC"
+# STORAGE_USAGE can still revise the most recent days while the view catches up
+ROLLUP_LOOKBACK_DAYS = 2
+ROLLUP_REFRESH_INTERVAL = 2 * 60 * 60
+
+_last_refresh = {}
+_refresh_lock = threading.Lock()
+
+
+def rollup_refresh_script(table=ROLLUP_TABLE):
+    # One scripting block: create, merge new days, then rebuild only the months they touch
+    return f"""
+EXECUTE IMMEDIATE $$
+DECLARE
+    since DATE;
+BEGIN
+    CREATE TABLE IF NOT EXISTS {table} (
+        grain TEXT,
+        period_start DATE,
+        storage_bytes FLOAT,
+        stage_bytes FLOAT,
+        failsafe_bytes FLOAT,
+        storage_gb FLOAT,
+        stage_gb FLOAT,
+        failsafe_gb FLOAT,
+        refreshed_at TIMESTAMP_LTZ
+    );
+
+    SELECT COALESCE(DATEADD(day, -{ROLLUP_LOOKBACK_DAYS}, MAX(period_start)), '1970-01-01'::DATE)
+    INTO :since
+    FROM {table}
+    WHERE grain = 'day';
+
+    MERGE INTO {table} AS rollup
+    USING (
+        SELECT
+            usage_date AS period_start,
+            storage_bytes,
+            stage_bytes,
+            failsafe_bytes
+        FROM snowflake.account_usage.storage_usage
+        WHERE usage_date > :since
+    ) AS usage
+    ON rollup.grain = 'day' AND rollup.period_start = usage.period_start
+    WHEN MATCHED THEN UPDATE SET
+        storage_bytes = usage.storage_bytes,
+        stage_bytes = usage.stage_bytes,
+        failsafe_bytes = usage.failsafe_bytes,
+        storage_gb = usage.storage_bytes / POWER(1024, 3),
+        stage_gb = usage.stage_bytes / POWER(1024, 3),
+        failsafe_gb = usage.failsafe_bytes / POWER(1024, 3),
+        refreshed_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (grain, period_start, storage_bytes, stage_bytes, failsafe_bytes,
+                                  storage_gb, stage_gb, failsafe_gb, refreshed_at)
+        VALUES ('day', usage.period_start, usage.storage_bytes, usage.stage_bytes, usage.failsafe_bytes,
+                usage.storage_bytes / POWER(1024, 3), usage.stage_bytes / POWER(1024, 3),
+                usage.failsafe_bytes / POWER(1024, 3), CURRENT_TIMESTAMP());
+
+    MERGE INTO {table} AS rollup
+    USING (
+        SELECT
+            DATE_TRUNC('month', period_start) AS period_start,
+            AVG(storage_bytes) AS storage_bytes,
+            AVG(stage_bytes) AS stage_bytes,
+            AVG(failsafe_bytes) AS failsafe_bytes
+        FROM {table}
+        WHERE grain = 'day' AND period_start >= DATE_TRUNC('month', :since)
+        GROUP BY 1
+    ) AS usage
+    ON rollup.grain = 'month' AND rollup.period_start = usage.period_start
+    WHEN MATCHED THEN UPDATE SET
+        storage_bytes = usage.storage_bytes,
+        stage_bytes = usage.stage_bytes,
+        failsafe_bytes = usage.failsafe_bytes,
+        storage_gb = usage.storage_bytes / POWER(1024, 3),
+        stage_gb = usage.stage_bytes / POWER(1024, 3),
+        failsafe_gb = usage.failsafe_bytes / POWER(1024, 3),
+        refreshed_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (grain, period_start, storage_bytes, stage_bytes, failsafe_bytes,
+                                  storage_gb, stage_gb, failsafe_gb, refreshed_at)
+        VALUES ('month', usage.period_start, usage.storage_bytes, usage.stage_bytes, usage.failsafe_bytes,
+                usage.storage_bytes / POWER(1024, 3), usage.stage_bytes / POWER(1024, 3),
+                usage.failsafe_bytes / POWER(1024, 3), CURRENT_TIMESTAMP());
+END;
+$$
+"""
+
+
+def refresh_rollup(table=ROLLUP_TABLE, session=None):
+    run_command(rollup_refresh_script(table), session=session)
+
+
+def create_rollup_task(warehouse, schedule=ROLLUP_TASK_SCHEDULE, table=ROLLUP_TABLE, task=ROLLUP_TASK, session=None):
+    run_command(f"""
+    CREATE OR REPLACE TASK {task}
+        WAREHOUSE = {warehouse}
+        SCHEDULE = '{schedule}'
+    AS
+    {rollup_refresh_script(table)}
+    """, session=session)
+    run_command(f"ALTER TASK {task} RESUME", session=session)
+
+
+def rollup_queries(table=ROLLUP_TABLE):
+    # Same columns as the ACCOUNT_USAGE dashboard queries they replace
+    return {
+        'storage_data': f"""
+        SELECT
+            TO_CHAR(period_start, 'YYYYMM') AS sort_month,
+            TO_CHAR(period_start, 'Mon-YYYY') AS month,
+            storage_gb AS storage,
+            stage_gb AS stage,
+            failsafe_gb AS failsafe
+        FROM {table}
+        WHERE grain = 'month'
+        ORDER BY sort_month
+        """,
+        'daily_storage_data': f"""
+        SELECT
+            period_start AS usage_date,
+            storage_gb,
+            stage_gb,
+            failsafe_gb
+        FROM {table}
+        WHERE grain = 'day' AND period_start >= DATEADD(day, -30, CURRENT_DATE())
+        ORDER BY usage_date
+        """,
+        'breakdown_data': f"""
+        WITH storage_stats AS (
+            SELECT
+                storage_bytes AS total_active_bytes,
+                stage_bytes AS total_stage_bytes,
+                failsafe_bytes AS total_failsafe_bytes
+            FROM {table}
+            WHERE grain = 'day'
+              AND period_start = DATEADD(day, -1, (SELECT MAX(period_start) FROM {table} WHERE grain = 'day'))
+        )
+        SELECT
+            ROUND(total_active_bytes / POWER(1024, 3), 1) AS "Active Storage (GB)",
+            ROUND(total_stage_bytes / POWER(1024, 3), 1) AS "Stage Storage (GB)",
+            ROUND(total_failsafe_bytes / POWER(1024, 3), 1) AS "Failsafe Storage (GB)",
+            ROUND((total_stage_bytes / (total_active_bytes + total_stage_bytes + total_failsafe_bytes)) * 100, 1) AS "Stage %",
+            ROUND((total_failsafe_bytes / (total_active_bytes + total_stage_bytes + total_failsafe_bytes)) * 100, 1) AS "Fail-Safe %"
+        FROM storage_stats
+        """,
+    }
+
+
+ACCOUNT_USAGE_QUERIES = {
+    'storage_data': MONTHLY_STORAGE_QUERY,
+    'daily_storage_data': DAILY_STORAGE_QUERY,
+    'breakdown_data': STORAGE_BREAKDOWN_QUERY,
+}
+
+
+def dashboard_queries(table=ROLLUP_TABLE, session=None):
+    # Refreshes the rollup at most once per interval and serves the storage sections from it.
+    # Without CREATE privileges in the current schema the ACCOUNT_USAGE queries are used as before.
+    key = (table, cache_scope(session))
+    try:
+        with _refresh_lock:
+            if time.time() - _last_refresh.get(key, 0) >= ROLLUP_REFRESH_INTERVAL:
+                refresh_rollup(table, session=session)
+                _last_refresh[key] = time.time()
+    except Exception as e:
+        logging.info(f"Could not refresh {table}, querying ACCOUNT_USAGE directly: {e}")
+        return dict(ACCOUNT_USAGE_QUERIES)
+    return rollup_queries(table)
+
+
+def reset_rollup_refresh():
+    # The next dashboard_queries call refreshes the rollup regardless of the interval
+    with _refresh_lock:
+        _last_refresh.clear()
+
+
+def add_rollup_arguments(parser):
+    parser.add_argument("--table", default=ROLLUP_TABLE)
+    parser.add_argument("--create-task", action="store_true", help="Schedule the refresh as a Snowflake TASK")
+    parser.add_argument("--warehouse", help="Warehouse for the TASK")
+    parser.add_argument("--schedule", default=ROLLUP_TASK_SCHEDULE)
+    return parser
+
+
+def run_rollup(args, parser, session=None):
+    if args.create_task:
+        if not args.warehouse:
+            parser.error("--warehouse is required with --create-task")
+        create_rollup_task(args.warehouse, args.schedule, args.table, session=session)
+    else:
+        refresh_rollup(args.table, session=session)
+
+
+def main(argv=None):
+    parser = add_rollup_arguments(argparse.ArgumentParser(description="Refresh the storage usage rollup table."))
+    run_rollup(parser.parse_args(argv), parser)
+
+
+if __name__ == "__main__":
+    main()
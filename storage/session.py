@@ -1,10 +1,53 @@
 import os
+import json
 import logging
+import threading
 import warnings
 
+from contextlib import contextmanager
 from snowflake.snowpark import Session
 from snowflake.snowpark.context import get_active_session
 
+TOKEN_PATH = "/snowflake/session/token"
+SESSION_POOL_SIZE = int(os.getenv('STORAGE_SESSION_POOL_SIZE', 4))
+# 'snowflake', or 'local' for a seeded DuckDB stand-in (see storage.local)
+QUERY_BACKEND = os.getenv('STORAGE_QUERY_BACKEND', 'snowflake')
+
+
+def _session_config(creds: dict = None, **kwargs) -> dict:
+    if os.path.isfile(TOKEN_PATH):
+        with open(TOKEN_PATH, 'r') as token_file:
+            token = token_file.read()
+        session_config = {
+            'host': os.getenv('SNOWFLAKE_HOST'),
+            'port': os.getenv('SNOWFLAKE_PORT'),
+            'protocol': "https",
+            'account': os.getenv('SNOWFLAKE_ACCOUNT'),
+            'authenticator': "oauth",
+            'token': token,
+            'warehouse': kwargs.get("warehouse") or os.getenv('SNOWFLAKE_WAREHOUSE'),
+            'database': kwargs.get("database") or os.getenv('SNOWFLAKE_DATABASE'),
+            'schema': kwargs.get("schema") or os.getenv('SNOWFLAKE_SCHEMA'),
+            'client_session_keep_alive': True
+        }
+    else:
+        creds = creds or {}
+        session_config = {
+            'account': creds.get("account") or os.getenv('SNOWFLAKE_ACCOUNT'),
+            'user': creds.get("username") or os.getenv('SNOWFLAKE_USER'),
+            'password': creds.get("password") or os.getenv('SNOWFLAKE_PASSWORD'),
+            'role': kwargs.get("role") or os.getenv('SNOWFLAKE_ROLE', 'ACCOUNTADMIN'),
+            'warehouse': kwargs.get("warehouse") or os.getenv('SNOWFLAKE_WAREHOUSE'),
+            'database': kwargs.get("database") or os.getenv('SNOWFLAKE_DATABASE'),
+            'schema': kwargs.get("schema") or os.getenv('SNOWFLAKE_SCHEMA'),
+            'client_session_keep_alive': True
+        }
+        for key in ['account', 'user', 'password', 'role', 'warehouse', 'database', 'schema']:
+            if key not in session_config or not session_config[key]:
+                warnings.warn(f"Missing or empty session configuration for '{key}'.")
+        session_config.update(kwargs)
+    return session_config
+
 
 def create_snowflake_session(creds: dict = None, **kwargs) -> Session:
     try:
@@ -13,35 +56,7 @@ def create_snowflake_session(creds: dict = None, **kwargs) -> Session:
         return active_session
     except Exception as e:
         logging.info(f"No active session found or error retrieving it: {e}")
-        if os.path.isfile("/snowflake/session/token"):
-            session_config = {
-                'host': os.getenv('SNOWFLAKE_HOST'),
-                'port': os.getenv('SNOWFLAKE_PORT'),
-                'protocol': "https",
-                'account': os.getenv('SNOWFLAKE_ACCOUNT'),
-                'authenticator': "oauth",
-                'token': open('/snowflake/session/token', 'r').read(),
-                'warehouse': kwargs.get("warehouse") or os.getenv('SNOWFLAKE_WAREHOUSE'),
-                'database': kwargs.get("database") or os.getenv('SNOWFLAKE_DATABASE'),
-                'schema': kwargs.get("schema") or os.getenv('SNOWFLAKE_SCHEMA'),
-                'client_session_keep_alive': True
-            }
-        else:
-            creds = creds or {}
-            session_config = {
-                'account': creds.get("account") or os.getenv('SNOWFLAKE_ACCOUNT'),
-                'user': creds.get("username") or os.getenv('SNOWFLAKE_USER'),
-                'password': creds.get("password") or os.getenv('SNOWFLAKE_PASSWORD'),
-                'role': kwargs.get("role") or os.getenv('SNOWFLAKE_ROLE', 'ACCOUNTADMIN'),
-                'warehouse': kwargs.get("warehouse") or os.getenv('SNOWFLAKE_WAREHOUSE'),
-                'database': kwargs.get("database") or os.getenv('SNOWFLAKE_DATABASE'),
-                'schema': kwargs.get("schema") or os.getenv('SNOWFLAKE_SCHEMA'),
-                'client_session_keep_alive': True
-            }
-            for key in ['account', 'user', 'password', 'role', 'warehouse', 'database', 'schema']:
-                if key not in session_config or not session_config[key]:
-                    warnings.warn(f"Missing or empty session configuration for '{key}'.")
-            session_config.update(kwargs)
+        session_config = _session_config(creds, **kwargs)
 
         try:
             session = Session.builder.configs(session_config).create()
@@ -50,3 +65,205 @@ def create_snowflake_session(creds: dict = None, **kwargs) -> Session:
         except Exception as e:
             logging.info(f"Error creating Snowpark session: {e}")
             return None
+
+
+def session_key(creds: dict = None, **kwargs) -> tuple:
+    # Mirrors the lookups in _session_config without reading the token file
+    creds = creds or {}
+    return (
+        kwargs.get("account") or creds.get("account") or os.getenv('SNOWFLAKE_ACCOUNT'),
+        kwargs.get("user") or creds.get("username") or os.getenv('SNOWFLAKE_USER'),
+        kwargs.get("role") or os.getenv('SNOWFLAKE_ROLE', 'ACCOUNTADMIN'),
+        kwargs.get("warehouse") or os.getenv('SNOWFLAKE_WAREHOUSE'),
+        kwargs.get("database") or os.getenv('SNOWFLAKE_DATABASE'),
+        kwargs.get("schema") or os.getenv('SNOWFLAKE_SCHEMA'),
+    )
+
+
+def load_profiles(path):
+    # Connection profiles as JSON ({"name": {...}} or a list with "name" keys) or as a
+    # Snowflake CLI style TOML file ([connections.name] tables)
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(path, 'rb') as profile_file:
+            profiles = tomllib.load(profile_file)
+        profiles = profiles.get('connections', profiles)
+    else:
+        with open(path, 'r') as profile_file:
+            profiles = json.load(profile_file)
+    if isinstance(profiles, list):
+        profiles = {profile.get('name') or profile['account']: profile for profile in profiles}
+    return {name: {key: value for key, value in profile.items() if key != 'name'}
+            for name, profile in profiles.items()}
+
+
+def profile_session_args(profile: dict):
+    # Splits a profile into the (creds, kwargs) pair that get_session/create_snowflake_session take
+    profile = dict(profile)
+    creds = {
+        'account': profile.pop('account', None),
+        'username': profile.pop('username', None) or profile.pop('user', None),
+        'password': profile.pop('password', None),
+    }
+    return creds, profile
+
+
+def _token_mtime():
+    try:
+        return os.path.getmtime(TOKEN_PATH)
+    except OSError:
+        return None
+
+
+def is_session_alive(session) -> bool:
+    try:
+        return not session.connection.is_closed()
+    except Exception:
+        return False
+
+
+def _close(session):
+    try:
+        session.close()
+    except Exception as e:
+        logging.info(f"Error closing Snowpark session: {e}")
+
+
+class _SessionPool:
+    def __init__(self, creds, kwargs, size):
+        self.creds = creds
+        self.kwargs = kwargs
+        self.shared = None
+        self.idle = []
+        self.generation = 0
+        self.slots = threading.BoundedSemaphore(size)
+
+    def create(self):
+        return new_session(self.creds, **self.kwargs)
+
+
+def new_session(creds: dict = None, **kwargs) -> Session:
+    # A session outside the pools, owned and closed by the caller
+    if QUERY_BACKEND == 'local':
+        from storage.local import LocalSession
+        return LocalSession()
+    session = Session.builder.configs(_session_config(creds, **kwargs)).create()
+    logging.info("Snowpark session successfully created.")
+    return session
+
+
+class SessionManager:
+    def __init__(self, pool_size: int = SESSION_POOL_SIZE):
+        self.pool_size = pool_size
+        self._lock = threading.RLock()
+        self._pools = {}
+        self._token_mtime = _token_mtime()
+        self._active = None
+        self._checked_active = False
+
+    def _active_session(self):
+        # Inside Snowsight/SiS there is exactly one session owned by the platform
+        if not self._checked_active and QUERY_BACKEND != 'local':
+            self._checked_active = True
+            try:
+                self._active = get_active_session()
+                logging.info("Retrieved active Snowpark session.")
+            except Exception as e:
+                logging.info(f"No active session found or error retrieving it: {e}")
+        return self._active
+
+    def _pool(self, creds, kwargs):
+        key = session_key(creds, **kwargs)
+        mtime = _token_mtime()
+        if mtime != self._token_mtime:
+            logging.info("Session token changed; rebuilding pooled sessions.")
+            self._token_mtime = mtime
+            for pool in self._pools.values():
+                pool.generation += 1
+                if pool.shared is not None:
+                    _close(pool.shared)
+                    pool.shared = None
+                for session in pool.idle:
+                    _close(session)
+                pool.idle = []
+        if key not in self._pools:
+            self._pools[key] = _SessionPool(creds, kwargs, self.pool_size)
+        return self._pools[key]
+
+    def get_session(self, creds: dict = None, **kwargs) -> Session:
+        with self._lock:
+            active = self._active_session()
+            if active is not None:
+                return active
+            pool = self._pool(creds, kwargs)
+            if pool.shared is not None and not is_session_alive(pool.shared):
+                logging.info("Cached Snowpark session is closed; reconnecting.")
+                pool.shared = None
+            if pool.shared is None:
+                try:
+                    pool.shared = pool.create()
+                except Exception as e:
+                    logging.info(f"Error creating Snowpark session: {e}")
+                    return None
+            return pool.shared
+
+    @contextmanager
+    def pooled_session(self, creds: dict = None, timeout: float = None, **kwargs):
+        # Exclusive session for callers that run statements concurrently or rely on session state
+        with self._lock:
+            active = self._active_session()
+            if active is None:
+                pool = self._pool(creds, kwargs)
+        if active is not None:
+            yield active
+            return
+
+        if not pool.slots.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a pooled Snowpark session.")
+        session = None
+        try:
+            with self._lock:
+                generation = pool.generation
+                while pool.idle and session is None:
+                    candidate = pool.idle.pop()
+                    if is_session_alive(candidate):
+                        session = candidate
+            if session is None:
+                session = pool.create()
+            yield session
+        finally:
+            if session is not None:
+                with self._lock:
+                    if generation == pool.generation and is_session_alive(session):
+                        pool.idle.append(session)
+                    else:
+                        _close(session)
+            pool.slots.release()
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                if pool.shared is not None:
+                    _close(pool.shared)
+                for session in pool.idle:
+                    _close(session)
+            self._pools = {}
+
+
+session_manager = SessionManager()
+
+
+def get_session(creds: dict = None, **kwargs) -> Session:
+    return session_manager.get_session(creds, **kwargs)
+
+
+def pooled_session(creds: dict = None, timeout: float = None, **kwargs):
+    return session_manager.pooled_session(creds, timeout=timeout, **kwargs)
+
+
+def has_active_session() -> bool:
+    with session_manager._lock:
+        return session_manager._active_session() is not None
@@ -0,0 +1,223 @@
+import os
+import re
+import logging
+import argparse
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from storage.queries import quote_identifier, run_query
+from storage.session import SESSION_POOL_SIZE, pooled_session
+
+# Files on internal named stages, summarized per stage and per top-level prefix. Stages are
+# found with SHOW STAGES one database at a time and listed with LIST, each on its own worker.
+# Both are piped (->>) into a SELECT, so the warehouse aggregates the listing and only one
+# row per prefix comes back, however many millions of files a stage holds.
+
+# Files not modified for this many days count as stale
+STAGE_STALE_DAYS = int(os.getenv('STORAGE_STAGE_STALE_DAYS', 90))
+STAGE_WORKERS = int(os.getenv('STORAGE_STAGE_WORKERS', SESSION_POOL_SIZE))
+STAGE_TOP_FILES = 100
+# LIST reports last_modified as text, e.g. 'Tue, 14 Jan 2025 10:00:00 GMT'
+LIST_TIMESTAMP_FORMAT = 'DY, DD MON YYYY HH24:MI:SS GMT'
+STAGE_COLUMNS = ['DATABASE_NAME', 'SCHEMA_NAME', 'STAGE_NAME', 'STAGE']
+_IDENTIFIER = r'(?:"(?:[^"]|"")+"|[A-Za-z_][A-Za-z0-9_$]*)'
+_STAGE_NAME = re.compile(rf'@?({_IDENTIFIER}(?:\.{_IDENTIFIER}){{0,2}})')
+_STAGE_PATH = re.compile(r'[A-Za-z0-9_.=/-]*')
+
+DATABASES_QUERY = """
+SHOW DATABASES
+->> SELECT "name" AS database_name FROM $1
+"""
+
+
+def stage_identifier(name):
+    # A user-supplied [database.[schema.]]stage, quoted part by part; unquoted parts are
+    # upper-cased like Snowflake does. Anything else is rejected rather than put into SQL.
+    match = _STAGE_NAME.fullmatch(str(name).strip())
+    if match is None:
+        raise ValueError(f"Invalid stage name: {name!r}")
+    parts = re.findall(_IDENTIFIER, match.group(1))
+    return '.'.join(quote_identifier(part[1:-1].replace('""', '"') if part.startswith('"') else part.upper())
+                    for part in parts)
+
+
+def stage_path(path):
+    if not _STAGE_PATH.fullmatch(path) or '..' in path:
+        raise ValueError(f"Invalid stage path: {path!r}")
+    return path
+
+
+def stage_location(database, schema, stage, prefix=''):
+    return '@' + '.'.join(map(quote_identifier, (database, schema, stage))) + (f"/{prefix}" if prefix else '')
+
+
+def stages_query(database):
+    # Internal stages only; external stages are billed by their cloud provider
+    return f"""
+    SHOW STAGES IN DATABASE {quote_identifier(database)}
+    ->> SELECT "database_name" AS database_name, "schema_name" AS schema_name, "name" AS stage_name
+        FROM $1
+        WHERE "type" LIKE 'INTERNAL%'
+    """
+
+
+def _listing(location, stale_days):
+    # One row per file with its top-level prefix ('/' for files at the stage root) and age
+    return f"""
+    LIST {location}
+    ->> SELECT
+            "name" AS file_name,
+            "size" AS size,
+            CASE WHEN SPLIT_PART("name", '/', 3) = '' THEN '/' ELSE SPLIT_PART("name", '/', 2) || '/' END AS prefix,
+            TO_TIMESTAMP_TZ("last_modified", '{LIST_TIMESTAMP_FORMAT}') AS last_modified,
+            DATEDIFF(day, TO_TIMESTAMP_TZ("last_modified", '{LIST_TIMESTAMP_FORMAT}'), CURRENT_TIMESTAMP()) >= {stale_days} AS stale
+        FROM $1
+    """
+
+
+def prefix_summary_query(location, stale_days=STAGE_STALE_DAYS):
+    return f"""
+    {_listing(location, stale_days)}
+    ->> SELECT
+            prefix,
+            COUNT(*) AS files,
+            SUM(size)::DOUBLE AS bytes,
+            COUNT_IF(stale) AS stale_files,
+            SUM(CASE WHEN stale THEN size ELSE 0 END)::DOUBLE AS stale_bytes,
+            MIN(last_modified) AS oldest,
+            MAX(last_modified) AS newest
+        FROM $2
+        GROUP BY prefix
+    """
+
+
+def stale_files_query(location, stale_days=STAGE_STALE_DAYS, n=None):
+    # Largest stale files first; without n every stale file is returned, so fetch it in batches
+    return f"""
+    {_listing(location, stale_days)}
+    ->> SELECT file_name, prefix, size, last_modified
+        FROM $2
+        WHERE stale
+        ORDER BY size DESC
+        {f'LIMIT {n}' if n else ''}
+    """
+
+
+def _run_each(queries, session=None, use_cache=True, max_workers=STAGE_WORKERS):
+    # Runs {key: query} concurrently and yields (key, frame). A database or stage that cannot
+    # be read, e.g. for lack of privileges, is logged and skipped instead of failing the scan.
+    def run(query):
+        if session is not None:
+            return run_query(query, use_cache=use_cache, session=session, result_format='arrow_pandas')
+        with pooled_session() as pooled:
+            return run_query(query, use_cache=use_cache, session=pooled, result_format='arrow_pandas')
+
+    if not queries:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+        futures = {executor.submit(run, query): key for key, query in queries.items()}
+        for future in as_completed(futures):
+            try:
+                frame = future.result()
+            except Exception as e:
+                logging.info(f"Could not read {futures[future]}: {e}")
+                continue
+            if frame is not None:
+                yield futures[future], frame
+
+
+def list_stages(databases=None, session=None, use_cache=True, max_workers=STAGE_WORKERS):
+    if databases is None:
+        found = run_query(DATABASES_QUERY, use_cache=use_cache, session=session, result_format='arrow_pandas')
+        databases = [] if found is None else found['DATABASE_NAME'].tolist()
+    frames = [frame for _, frame in _run_each({database: stages_query(database) for database in databases},
+                                               session, use_cache, max_workers)]
+    if not frames:
+        return pd.DataFrame(columns=STAGE_COLUMNS)
+    stages = pd.concat(frames, ignore_index=True)
+    stages['STAGE'] = [stage_location(*names)[1:] for names in
+                       zip(stages['DATABASE_NAME'], stages['SCHEMA_NAME'], stages['STAGE_NAME'])]
+    return stages.sort_values('STAGE', ignore_index=True)
+
+
+def prefix_summary(stages, stale_days=STAGE_STALE_DAYS, session=None, use_cache=True, max_workers=STAGE_WORKERS):
+    # One row per stage and prefix, with a REMOVE statement for prefixes that are entirely stale
+    queries = {stage: prefix_summary_query('@' + stage, stale_days) for stage in stages['STAGE']}
+    frames = [frame.assign(STAGE=stage) for stage, frame in _run_each(queries, session, use_cache, max_workers)]
+    if not frames:
+        return pd.DataFrame(columns=STAGE_COLUMNS + ['PREFIX', 'FILES', 'BYTES', 'STALE_FILES', 'STALE_BYTES',
+                                                     'OLDEST', 'NEWEST', 'ACTION'])
+    prefixes = stages.merge(pd.concat(frames, ignore_index=True), on='STAGE')
+    removable = (prefixes['STALE_FILES'] == prefixes['FILES']) & (prefixes['PREFIX'] != '/')
+    prefixes['ACTION'] = [f"REMOVE @{stage}/{prefix}" if remove else None
+                          for stage, prefix, remove in zip(prefixes['STAGE'], prefixes['PREFIX'], removable)]
+    return prefixes.sort_values('STALE_BYTES', ascending=False, ignore_index=True)
+
+
+def stage_summary(prefixes):
+    # Per stage totals, most stale bytes first
+    summary = prefixes.groupby(STAGE_COLUMNS, sort=False, observed=True).agg(
+        PREFIXES=('PREFIX', 'size'),
+        FILES=('FILES', 'sum'),
+        BYTES=('BYTES', 'sum'),
+        STALE_FILES=('STALE_FILES', 'sum'),
+        STALE_BYTES=('STALE_BYTES', 'sum'),
+        OLDEST=('OLDEST', 'min'),
+        NEWEST=('NEWEST', 'max'),
+    ).reset_index()
+    summary['GB'] = summary['BYTES'] / 1024 ** 3
+    summary['STALE_GB'] = summary['STALE_BYTES'] / 1024 ** 3
+    summary['STALE_SHARE'] = summary['STALE_BYTES'] / summary['BYTES'].where(summary['BYTES'] > 0)
+    return summary.sort_values('STALE_BYTES', ascending=False, ignore_index=True)
+
+
+def largest_stale_files(stage, prefix='', stale_days=STAGE_STALE_DAYS, n=STAGE_TOP_FILES, session=None, use_cache=True):
+    return run_query(stale_files_query(f"@{stage}/{prefix}" if prefix else f"@{stage}", stale_days, n),
+                     use_cache=use_cache, session=session, result_format='arrow_pandas')
+
+
+def write_stale_files(stages, path, stale_days=STAGE_STALE_DAYS, session=None):
+    # Every stale file of the given stages, written batch by batch so no listing is held in memory
+    header = True
+    with open(path, 'w', newline='') as output:
+        for stage in stages:
+            batches = run_query(stale_files_query('@' + stage, stale_days), use_cache=False, session=session,
+                                result_format='batches')
+            for batch in batches or []:
+                batch.insert(0, 'STAGE', stage)
+                batch.to_csv(output, header=header, index=False)
+                header = False
+
+
+def load_stage_summary(databases=None, stale_days=STAGE_STALE_DAYS, session=None, use_cache=True):
+    return prefix_summary(list_stages(databases, session=session, use_cache=use_cache), stale_days,
+                          session=session, use_cache=use_cache)
+
+
+def add_stages_arguments(parser):
+    parser.add_argument("--database", action="append", help="Database to scan (repeatable, default: all)")
+    parser.add_argument("--stale-days", type=int, default=STAGE_STALE_DAYS, help="Age in days after which a file is stale")
+    parser.add_argument("--workers", type=int, default=STAGE_WORKERS)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--stale-files", help="Write every stale file to this CSV file")
+    return parser
+
+
+def run_stages(args, session=None):
+    stages = list_stages(args.database, session=session, use_cache=False, max_workers=args.workers)
+    prefixes = prefix_summary(stages, args.stale_days, session=session, use_cache=False, max_workers=args.workers)
+    summary = stage_summary(prefixes)
+    print(summary.head(args.top).to_string(index=False))
+    print()
+    print(prefixes.head(args.top).to_string(index=False))
+    if args.stale_files:
+        write_stale_files(summary.loc[summary['STALE_FILES'] > 0, 'STAGE'], args.stale_files, args.stale_days, session)
+
+
+def main(argv=None):
+    parser = add_stages_arguments(argparse.ArgumentParser(description="Summarize internal stage files and flag stale ones."))
+    run_stages(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
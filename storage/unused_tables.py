@@ -0,0 +1,196 @@
+import time
+import logging
+import threading
+
+from storage.queries import cache_scope, run_command, run_query
+
+ACCESS_SUMMARY_TABLE = "storage_table_access_summary"
+# ACCESS_HISTORY rows can land up to three hours after their query started,
+# so every refresh re-reads that overlap; the MERGE only keeps newer accesses.
+ACCESS_HISTORY_LOOKBACK_HOURS = 3
+ACCESS_SUMMARY_REFRESH_INTERVAL = 15 * 60
+# Smallest "days since last access" the app allows; the per-table frame is fetched
+# at this widest window and every larger threshold is a local filter.
+MIN_UNUSED_DAYS = 1
+UNUSED_TABLE_COLUMNS = [
+    'TABLE_ID', 'FULLY_QUALIFIED_TABLE_NAME', 'TOTAL_STORAGE_TB', 'ANNUALIZED_STORAGE_COST',
+    'LAST_ACCESSED_AT', 'LAST_ACCESSED_BY', 'LAST_QUERY_ID', 'DAYS_SINCE_LAST_ACCESS'
+]
+
+FULL_HISTORY_ACCESS_SUMMARY = """
+    SELECT
+        objects_accessed.value:objectId::integer AS table_id,
+        MAX(access_history.query_start_time) AS last_accessed_at,
+        MAX_BY(access_history.user_name, access_history.query_start_time) AS last_accessed_by,
+        MAX_BY(access_history.query_id, access_history.query_start_time) AS last_query_id
+    FROM snowflake.account_usage.access_history, LATERAL FLATTEN(access_history.base_objects_accessed) AS objects_accessed
+    WHERE
+        objects_accessed.value:objectDomain::text = 'Table'
+        AND objects_accessed.value:objectId IS NOT NULL
+    GROUP BY 1
+"""
+
+_last_refresh = {}
+_refresh_lock = threading.Lock()
+
+
+def create_access_summary_table(table=ACCESS_SUMMARY_TABLE, session=None):
+    run_command(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        table_id INTEGER,
+        last_accessed_at TIMESTAMP_LTZ,
+        last_accessed_by TEXT,
+        last_query_id TEXT
+    )
+    """, session=session)
+
+
+def access_summary_watermark(table=ACCESS_SUMMARY_TABLE, session=None):
+    result = run_query(f"SELECT MAX(last_accessed_at) AS high_water_mark FROM {table}",
+                       use_cache=False, session=session)
+    if result is None or result.empty:
+        return None
+    high_water_mark = result['HIGH_WATER_MARK'].iloc[0]
+    return None if high_water_mark is None or high_water_mark != high_water_mark else high_water_mark
+
+
+def refresh_access_summary(table=ACCESS_SUMMARY_TABLE, session=None):
+    create_access_summary_table(table, session=session)
+    high_water_mark = access_summary_watermark(table, session=session)
+    if high_water_mark is None:
+        logging.info(f"Building {table} from the full access history.")
+        since = "'1970-01-01'::TIMESTAMP_LTZ"
+    else:
+        since = f"DATEADD(hour, -{ACCESS_HISTORY_LOOKBACK_HOURS}, '{high_water_mark.isoformat()}'::TIMESTAMP_LTZ)"
+
+    run_command(f"""
+    MERGE INTO {table} AS summary
+    USING (
+        WITH
+        access_history AS (
+            SELECT query_id, query_start_time, user_name, base_objects_accessed
+            FROM snowflake.account_usage.access_history
+            WHERE query_start_time > {since}
+        ),
+        table_access_history AS (
+            SELECT
+                access_history.query_id,
+                access_history.query_start_time,
+                access_history.user_name,
+                objects_accessed.value:objectId::integer AS table_id
+            FROM access_history, LATERAL FLATTEN(access_history.base_objects_accessed) AS objects_accessed
+            WHERE
+                objects_accessed.value:objectDomain::text = 'Table'
+                AND objects_accessed.value:objectId IS NOT NULL
+        )
+        SELECT
+            table_id,
+            MAX(query_start_time) AS last_accessed_at,
+            MAX_BY(user_name, query_start_time) AS last_accessed_by,
+            MAX_BY(query_id, query_start_time) AS last_query_id
+        FROM table_access_history
+        GROUP BY 1
+    ) AS changes
+    ON summary.table_id = changes.table_id
+    WHEN MATCHED AND changes.last_accessed_at > summary.last_accessed_at THEN UPDATE SET
+        last_accessed_at = changes.last_accessed_at,
+        last_accessed_by = changes.last_accessed_by,
+        last_query_id = changes.last_query_id
+    WHEN NOT MATCHED THEN INSERT (table_id, last_accessed_at, last_accessed_by, last_query_id)
+        VALUES (changes.table_id, changes.last_accessed_at, changes.last_accessed_by, changes.last_query_id)
+    """, session=session)
+
+
+def table_access_query(access_summary):
+    # Per-table storage and last access, independent of the cost and day-threshold inputs
+    return f"""
+    WITH
+    table_access_summary AS (
+        {access_summary}
+    ),
+    table_storage_metrics AS (
+        SELECT
+            id AS table_id,
+            table_catalog || '.' ||table_schema ||'.' || table_name AS fully_qualified_table_name,
+            (active_bytes + time_travel_bytes + failsafe_bytes + retained_for_clone_bytes)/POWER(1024,4) AS total_storage_tb
+        FROM snowflake.account_usage.table_storage_metrics
+        WHERE
+            NOT deleted
+    )
+    SELECT
+        table_storage_metrics.*,
+        table_access_summary.* EXCLUDE (table_id),
+        DATEDIFF(day, last_accessed_at, CURRENT_DATE()) AS days_since_last_access
+    FROM table_storage_metrics
+    INNER JOIN table_access_summary
+        ON table_storage_metrics.table_id=table_access_summary.table_id
+    WHERE
+        last_accessed_at < DATEADD(day, -{MIN_UNUSED_DAYS}, CURRENT_DATE())
+    ORDER BY table_storage_metrics.total_storage_tb DESC
+    """
+
+
+def unused_tables_query(unused_days, storage_cost_per_tb, table=ACCESS_SUMMARY_TABLE, access_summary=None):
+    # Server-side equivalent of filter_unused_tables, for unloading without a client round trip
+    access_summary = access_summary or f"SELECT * FROM {table}"
+    return f"""
+    SELECT
+        table_id,
+        fully_qualified_table_name,
+        total_storage_tb,
+        total_storage_tb*12*{storage_cost_per_tb} AS annualized_storage_cost,
+        last_accessed_at,
+        last_accessed_by,
+        last_query_id,
+        days_since_last_access
+    FROM ({table_access_query(access_summary)})
+    WHERE days_since_last_access > {unused_days}
+    ORDER BY total_storage_tb DESC
+    """
+
+
+def _refresh_if_due(table, session):
+    key = (table, cache_scope(session))
+    with _refresh_lock:
+        if time.time() - _last_refresh.get(key, 0) < ACCESS_SUMMARY_REFRESH_INTERVAL:
+            return
+        refresh_access_summary(table, session=session)
+        _last_refresh[key] = time.time()
+
+
+def reset_access_summary_refresh():
+    with _refresh_lock:
+        _last_refresh.clear()
+
+
+def access_summary_source(table=ACCESS_SUMMARY_TABLE, session=None):
+    # The incremental summary when it can be refreshed, otherwise the full ACCESS_HISTORY scan
+    try:
+        _refresh_if_due(table, session)
+    except Exception as e:
+        # No CREATE TABLE privilege in the current schema: fall back to the full history scan
+        logging.info(f"Could not refresh {table}, scanning full access history instead: {e}")
+        return FULL_HISTORY_ACCESS_SUMMARY
+    return f"SELECT * FROM {table}"
+
+
+def load_table_access(table=ACCESS_SUMMARY_TABLE, session=None, result_format='arrow_pandas', use_cache=True):
+    # Arrow-backed strings keep tens of thousands of names, users and query IDs out of Python objects
+    access_summary = access_summary_source(table, session=session)
+    ttl = None if access_summary == FULL_HISTORY_ACCESS_SUMMARY else ACCESS_SUMMARY_REFRESH_INTERVAL
+    return run_query(table_access_query(access_summary), ttl=ttl, use_cache=use_cache, session=session,
+                     result_format=result_format)
+
+
+def filter_unused_tables(table_access, unused_days, storage_cost_per_tb):
+    # The frame is sorted by storage, and cost is proportional to storage, so the
+    # boolean mask keeps the cost ordering without a re-sort.
+    # DATEDIFF(day, ts, CURRENT_DATE()) > n  <=>  ts < DATEADD(day, -n, CURRENT_DATE())
+    unused = table_access.loc[(table_access['DAYS_SINCE_LAST_ACCESS'] > unused_days).to_numpy(dtype=bool, na_value=False)]
+    unused = unused.assign(ANNUALIZED_STORAGE_COST=unused['TOTAL_STORAGE_TB'] * (12 * storage_cost_per_tb))
+    return unused[UNUSED_TABLE_COLUMNS].reset_index(drop=True)
+
+
+def load_unused_tables(unused_days, storage_cost_per_tb, table=ACCESS_SUMMARY_TABLE, session=None):
+    table_access = load_table_access(table, session=session)
+    return None if table_access is None else filter_unused_tables(table_access, unused_days, storage_cost_per_tb)
@@ -1,21 +1,70 @@
+import os
+import functools
+import threading
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 
-def plot_monthly_storage(data):
-    fig = px.line(data, x='MONTH', y=['STORAGE', 'STAGE', 'FAILSAFE'],
-                  title="Monthly Data Storage over Time")
-    fig.update_layout(yaxis_title="Storage (GB)")
-    st.plotly_chart(fig)
+from collections import OrderedDict
+from storage.decimation import decimate
+from storage.frames import frame_fingerprint, top_n
 
-def plot_daily_storage(data):
-    fig = px.line(data, x='USAGE_DATE', y=['STORAGE_GB', 'STAGE_GB', 'FAILSAFE_GB'],
-                  title="Daily Data Storage (Last 30 Days)")
-    fig.update_layout(yaxis_title="Storage (GB)")
-    st.plotly_chart(fig)
+# Line charts keep at most this many points per series; longer series are decimated
+CHART_POINT_BUDGET = int(os.getenv('STORAGE_CHART_POINT_BUDGET', 2000))
+CHART_DECIMATION = os.getenv('STORAGE_CHART_DECIMATION', 'lttb')
+# Above this many plotted points a chart uses WebGL traces instead of SVG
+WEBGL_POINTS = 1000
+# Built figures kept for reuse; a rerun with unchanged data skips building them again
+FIGURE_CACHE_SIZE = int(os.getenv('STORAGE_FIGURE_CACHE_SIZE', 64))
 
-def plot_storage_breakdown(data):
-    breakdown_pie = px.pie(
+_figures = OrderedDict()
+_figures_lock = threading.Lock()
+
+def memoize_figure(build):
+    # Keyed by the builder, a content hash of each input frame and the chart parameters.
+    # Cached figures are shared by every viewer, so callers must not modify them.
+    @functools.wraps(build)
+    def cached(*data, **params):
+        key = (build.__name__, tuple(frame_fingerprint(frame) for frame in data), tuple(sorted(params.items())))
+        with _figures_lock:
+            if key in _figures:
+                _figures.move_to_end(key)
+                return _figures[key]
+        fig = build(*data, **params)
+        with _figures_lock:
+            _figures[key] = fig
+            while len(_figures) > FIGURE_CACHE_SIZE:
+                _figures.popitem(last=False)
+        return fig
+    return cached
+
+def clear_figure_cache():
+    with _figures_lock:
+        _figures.clear()
+
+def build_line_figure(data, x, y, title, yaxis_title=None, color=None,
+                      budget=CHART_POINT_BUDGET, method=CHART_DECIMATION):
+    data = decimate(data, x, y, budget, method, group=color)
+    points = len(data) * (1 if isinstance(y, str) else len(y))
+    fig = px.line(data, x=x, y=y, color=color, title=title,
+                  render_mode='webgl' if points > WEBGL_POINTS else 'svg')
+    if yaxis_title:
+        fig.update_layout(yaxis_title=yaxis_title)
+    return fig
+
+@memoize_figure
+def build_monthly_storage_figure(data):
+    return build_line_figure(data, 'MONTH', ['STORAGE', 'STAGE', 'FAILSAFE'],
+                             "Monthly Data Storage over Time", "Storage (GB)")
+
+@memoize_figure
+def build_daily_storage_figure(data):
+    return build_line_figure(data, 'USAGE_DATE', ['STORAGE_GB', 'STAGE_GB', 'FAILSAFE_GB'],
+                             "Daily Data Storage (Last 30 Days)", "Storage (GB)")
+
+@memoize_figure
+def build_storage_breakdown_figure(data):
+    return px.pie(
         names=["Active", "Stage", "Fail-Safe"],
         values=[
             data["Active Storage (GB)"].iloc[0],
@@ -24,19 +73,86 @@ def plot_storage_breakdown(data):
         ],
         title="Storage Distribution"
     )
-    st.plotly_chart(breakdown_pie)
 
-def plot_unused_tables(data):
-    top_10_unused = data.nlargest(10, 'ANNUALIZED_STORAGE_COST')
+@memoize_figure
+def build_unused_tables_figure(data):
+    top_10_unused = top_n(data, 10, 'ANNUALIZED_STORAGE_COST')
     fig = px.bar(top_10_unused, x='FULLY_QUALIFIED_TABLE_NAME', y='ANNUALIZED_STORAGE_COST',
                  title="Top 10 Unused Tables by Annualized Storage Cost")
     fig.update_layout(xaxis_title="Table Name", yaxis_title="Annualized Storage Cost ($)")
-    st.plotly_chart(fig)
+    return fig
 
-def plot_storage_forecast(forecast_data, actual_data):
+@memoize_figure
+def build_growth_figure(data, title="Top Storage Growth Contributors"):
+    fig = px.bar(data, x='CONTRIBUTOR', y='TOTAL_GB_DELTA', title=title,
+                 hover_data=['TABLES', 'SHARE_OF_GROWTH'])
+    fig.update_layout(xaxis_title=None, yaxis_title="Growth (GB)")
+    return fig
+
+@memoize_figure
+def build_drilldown_figure(data, kind='treemap', title="Storage by Database, Schema and Table"):
+    trace = go.Sunburst if kind == 'sunburst' else go.Treemap
+    details = data[['TABLES', 'TIME_TRAVEL_BYTES', 'FAILSAFE_BYTES', 'RETAINED_FOR_CLONE_BYTES']].to_numpy(dtype=float)
+    details[:, 1:] /= 1024 ** 3
+    fig = go.Figure(trace(
+        ids=data['ID'], labels=data['LABEL'], parents=data['PARENT'], values=data['TOTAL_GB'],
+        branchvalues='total', customdata=details,
+        hovertemplate="%{label}<br>%{value:,.1f} GB in %{customdata[0]:,} tables"
+                      "<br>Time travel %{customdata[1]:,.1f} GB, fail-safe %{customdata[2]:,.1f} GB,"
+                      " clones %{customdata[3]:,.1f} GB<extra></extra>",
+    ))
+    fig.update_layout(title=title, margin=dict(t=50, l=0, r=0, b=0))
+    return fig
+
+@memoize_figure
+def build_retention_figure(data):
+    fig = px.line(data.sort_values('RETENTION_CAP'), x='RETENTION_CAP', y='ANNUAL_SAVINGS', color='TRANSIENT_POLICY',
+                  markers=True, title="Annual Savings by Retention Cap and Transient Policy")
+    fig.update_layout(xaxis_title="Retention cap (days)", yaxis_title="Annual savings ($)", legend_title="Convert to transient")
+    return fig
+
+@memoize_figure
+def build_stage_figure(data, title="Largest Stages by Stale Storage"):
+    data = data.assign(FRESH_GB=data['GB'] - data['STALE_GB'])
+    fig = px.bar(data, x='STAGE', y=['STALE_GB', 'FRESH_GB'], title=title, hover_data=['FILES', 'STALE_FILES'])
+    fig.update_layout(xaxis_title=None, yaxis_title="Storage (GB)", legend_title=None)
+    return fig
+
+@memoize_figure
+def build_storage_forecast_figure(forecast_data, actual_data):
+    forecast_data = decimate(forecast_data, 'USAGE_DATE', ['FORECAST_GB', 'UPPER_BOUND_GB', 'LOWER_BOUND_GB'],
+                             CHART_POINT_BUDGET, CHART_DECIMATION)
+    scatter = go.Scattergl if len(forecast_data) * 3 > WEBGL_POINTS else go.Scatter
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=forecast_data['USAGE_DATE'], y=forecast_data['FORECAST_GB'], mode='lines', name='Forecast'))
-    fig.add_trace(go.Scatter(x=forecast_data['USAGE_DATE'], y=forecast_data['UPPER_BOUND_GB'], mode='lines', name='Upper Bound', line=dict(dash='dash')))
-    fig.add_trace(go.Scatter(x=forecast_data['USAGE_DATE'], y=forecast_data['LOWER_BOUND_GB'], mode='lines', name='Lower Bound', line=dict(dash='dash')))
+    fig.add_trace(scatter(x=forecast_data['USAGE_DATE'], y=forecast_data['FORECAST_GB'], mode='lines', name='Forecast'))
+    fig.add_trace(scatter(x=forecast_data['USAGE_DATE'], y=forecast_data['UPPER_BOUND_GB'], mode='lines', name='Upper Bound', line=dict(dash='dash')))
+    fig.add_trace(scatter(x=forecast_data['USAGE_DATE'], y=forecast_data['LOWER_BOUND_GB'], mode='lines', name='Lower Bound', line=dict(dash='dash')))
     fig.update_layout(title='Storage Usage Prediction', xaxis_title='Date', yaxis_title='Storage (GB)')
-    st.plotly_chart(fig)
+    return fig
+
+def plot_monthly_storage(data):
+    st.plotly_chart(build_monthly_storage_figure(data))
+
+def plot_daily_storage(data):
+    st.plotly_chart(build_daily_storage_figure(data))
+
+def plot_storage_breakdown(data):
+    st.plotly_chart(build_storage_breakdown_figure(data))
+
+def plot_unused_tables(data):
+    st.plotly_chart(build_unused_tables_figure(data))
+
+def plot_growth(data, title="Top Storage Growth Contributors"):
+    st.plotly_chart(build_growth_figure(data, title=title))
+
+def plot_drilldown(data, kind='treemap'):
+    st.plotly_chart(build_drilldown_figure(data, kind=kind))
+
+def plot_retention_simulation(data):
+    st.plotly_chart(build_retention_figure(data))
+
+def plot_stages(data, title="Largest Stages by Stale Storage"):
+    st.plotly_chart(build_stage_figure(data, title=title))
+
+def plot_storage_forecast(forecast_data, actual_data):
+    st.plotly_chart(build_storage_forecast_figure(forecast_data, actual_data))
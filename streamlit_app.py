@@ -1,22 +1,30 @@
 import streamlit as st
-from storage.queries import run_query
 from storage.visualization import (
     plot_monthly_storage,
     plot_daily_storage,
     plot_storage_breakdown,
     plot_unused_tables,
+    plot_growth,
+    plot_drilldown,
+    plot_retention_simulation,
+    plot_stages,
     plot_storage_forecast
 )
-from storage.forecast import generate_storage_forecast
-from storage.recommendations import generate_recommendations, display_recommendations
+from storage.providers import invalidate, load_section, shared_session, storage_forecast
+from storage.metrics import dashboard_cost, hot_queries, query_metrics
+from storage.unused_tables import access_summary_source, filter_unused_tables, unused_tables_query
+from storage.export import EXPORT_MIME_TYPES, export_bytes, unload_to_stage
+from storage.recommendations import TRANSIENT_FAILSAFE_RATIO, generate_recommendations, display_recommendations
+from storage.retention import RETENTION_CAPS, TRANSIENT_RATIOS, retention_actions, simulate_retention
+from storage.drilldown import DRILLDOWN_TOP_CHILDREN
+from storage.forecast import FORECAST_BACKEND
+from storage.growth import GROWTH_LEVELS, GROWTH_WINDOW_DAYS, top_contributors
+from storage.stages import STAGE_STALE_DAYS, STAGE_TOP_FILES, largest_stale_files, stage_identifier, stage_summary
+
+# Widgets inside a fragment rerun only that fragment, not the whole page
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', lambda func: func)
 
 # Initialize session state
-if 'storage_data' not in st.session_state:
-    st.session_state.storage_data = None
-if 'daily_storage_data' not in st.session_state:
-    st.session_state.daily_storage_data = None
-if 'breakdown_data' not in st.session_state:
-    st.session_state.breakdown_data = None
 if 'forecast_generated' not in st.session_state:
     st.session_state.forecast_generated = False
 if 'forecast_data' not in st.session_state:
@@ -25,199 +33,290 @@ if 'actual_data' not in st.session_state:
     st.session_state.actual_data = None
 if 'unused_tables' not in st.session_state:
     st.session_state.unused_tables = None
-
-# Streamlit app
-st.title("Snowflake Storage Analysis")
-
-# Fetch data only if it's not already in the session state
-if st.session_state.storage_data is None:
-    storage_query = """
-    select to_char(usage_date,'YYYYMM') as sort_month,
-           to_char(usage_date,'Mon-YYYY') as month,
-           avg(storage_bytes) / power(1024, 3) as storage,
-           avg(stage_bytes) / power(1024, 3) as stage,
-           avg(failsafe_bytes) / power(1024, 3) as failsafe
-    from snowflake.account_usage.storage_usage
-    group by month, sort_month
-    order by sort_month;
-    """
-    st.session_state.storage_data = run_query(storage_query)
-
-# Visualize monthly storage usage over time
-st.subheader("Monthly Storage Usage Over Time")
-plot_monthly_storage(st.session_state.storage_data)
-
-# Fetch daily storage usage data if not in session state
-if st.session_state.daily_storage_data is None:
-    daily_storage_query = """
-    SELECT 
-        USAGE_DATE,
-        STORAGE_BYTES / POWER(1024, 3) AS STORAGE_GB,
-        STAGE_BYTES / POWER(1024, 3) AS STAGE_GB,
-        FAILSAFE_BYTES / POWER(1024, 3) AS FAILSAFE_GB
-    FROM snowflake.account_usage.storage_usage
-    WHERE USAGE_DATE >= DATEADD(day, -30, CURRENT_DATE())
-    ORDER BY USAGE_DATE;
-    """
-    st.session_state.daily_storage_data = run_query(daily_storage_query)
-
-# Visualize daily storage usage
-st.subheader("Daily Storage Usage (Last 30 Days)")
-plot_daily_storage(st.session_state.daily_storage_data)
-
-# Fetch current storage breakdown if not in session state
-if st.session_state.breakdown_data is None:
-    breakdown_query = """
-    WITH storage_stats AS (
-        SELECT 
-            STORAGE_BYTES as total_active_bytes,
-            STAGE_BYTES as total_stage_bytes,
-            FAILSAFE_BYTES as total_failsafe_bytes
-        FROM snowflake.account_usage.storage_usage
-        WHERE USAGE_DATE = DATEADD(day, -1, (SELECT MAX(USAGE_DATE) FROM snowflake.account_usage.storage_usage))
-    )
-    SELECT 
-        ROUND(total_active_bytes / POWER(1024, 3), 1) AS "Active Storage (GB)",
-        ROUND(total_stage_bytes / POWER(1024, 3), 1) AS "Stage Storage (GB)",
-        ROUND(total_failsafe_bytes / POWER(1024, 3), 1) AS "Failsafe Storage (GB)",
-        ROUND((total_stage_bytes / (total_active_bytes + total_stage_bytes + total_failsafe_bytes)) * 100, 1) AS "Stage %",
-        ROUND((total_failsafe_bytes / (total_active_bytes + total_stage_bytes + total_failsafe_bytes)) * 100, 1) AS "Fail-Safe %"
-    FROM storage_stats;
-    """
-    st.session_state.breakdown_data = run_query(breakdown_query)
-
-# Display current storage breakdown
-st.subheader("Current Storage Breakdown")
-st.table(st.session_state.breakdown_data)
-plot_storage_breakdown(st.session_state.breakdown_data)
-
-# Unused Tables Analysis
-st.subheader("Unused Tables Analysis")
 if 'unused_days' not in st.session_state or 'storage_cost_per_tb' not in st.session_state:
     st.session_state.unused_days = 90
     st.session_state.storage_cost_per_tb = 23.0
 
-col1, col2 = st.columns(2)
-with col1:
-    unused_days = st.number_input("Days since last access", min_value=1, value=st.session_state.unused_days)
-with col2:
-    storage_cost_per_tb = st.number_input("Storage cost per TB per month ($)", min_value=0.0, value=st.session_state.storage_cost_per_tb)
 
-if st.session_state.unused_tables is None or unused_days != st.session_state.unused_days or storage_cost_per_tb != st.session_state.storage_cost_per_tb:
+def section_data(name, message="Loading storage data..."):
+    # Served from the cache shared by all viewers; only a miss runs the section's queries
+    with st.spinner(message):
+        data, fetched_at = load_section(name)
+    st.caption(f"Data as of {fetched_at:%Y-%m-%d %H:%M} UTC")
+    return data
+
+
+@fragment
+def monthly_storage_section():
+    st.subheader("Monthly Storage Usage Over Time")
+    plot_monthly_storage(section_data('storage_data'))
+
+
+@fragment
+def daily_storage_section():
+    st.subheader("Daily Storage Usage (Last 30 Days)")
+    plot_daily_storage(section_data('daily_storage_data'))
+
+
+@fragment
+def storage_breakdown_section():
+    st.subheader("Current Storage Breakdown")
+    breakdown_data = section_data('breakdown_data')
+    st.table(breakdown_data)
+    plot_storage_breakdown(breakdown_data)
+
+
+@fragment
+def drilldown_section():
+    # The cube holds every level, so changing the database or schema is a local lookup
+    st.subheader("Storage Drill-down")
+    cube = section_data('storage_cube', "Aggregating table storage...")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        database = st.selectbox("Database", ["All"] + cube.children(())['TABLE_CATALOG'].tolist())
+    path = () if database == "All" else (database,)
+    with col2:
+        schemas = cube.children(path)['TABLE_SCHEMA'].tolist() if path else []
+        schema = st.selectbox("Schema", ["All"] + schemas, disabled=not path)
+    if path and schema != "All":
+        path += (schema,)
+    with col3:
+        kind = st.radio("Chart", ["treemap", "sunburst"], horizontal=True)
+    plot_drilldown(cube.hierarchy(path), kind)
+    st.write(f"Largest {DRILLDOWN_TOP_CHILDREN} {'tables' if len(path) == 2 else 'schemas' if path else 'databases'}")
+    st.dataframe(cube.summary(path), hide_index=True)
+
+
+@fragment
+def unused_tables_section():
+    st.subheader("Unused Tables Analysis")
+    col1, col2 = st.columns(2)
+    with col1:
+        unused_days = st.number_input("Days since last access", min_value=1, value=st.session_state.unused_days)
+    with col2:
+        storage_cost_per_tb = st.number_input("Storage cost per TB per month ($)", min_value=0.0, value=st.session_state.storage_cost_per_tb)
+
+    # Cost and day threshold only re-filter the per-table frame locally
+    table_access = section_data('table_access', "Analyzing table access history...")
     st.session_state.unused_days = unused_days
     st.session_state.storage_cost_per_tb = storage_cost_per_tb
+    st.session_state.unused_tables = filter_unused_tables(table_access, unused_days, storage_cost_per_tb)
+    if st.session_state.unused_tables.empty:
+        st.info("No unused tables found based on the specified criteria.")
+    else:
+        st.success(f"Found {len(st.session_state.unused_tables)} unused tables.")
+        plot_unused_tables(st.session_state.unused_tables)
+        render_unused_tables_export(unused_days, storage_cost_per_tb)
 
-    unused_tables_query = f"""
-    WITH
-    access_history AS (
-        SELECT *
-        FROM snowflake.account_usage.access_history
-    ),
-    access_history_flattened AS (
-        SELECT
-            access_history.query_id,
-            access_history.query_start_time,
-            access_history.user_name,
-            objects_accessed.value:objectId::integer AS table_id,
-            objects_accessed.value:objectName::text AS object_name,
-            objects_accessed.value:objectDomain::text AS object_domain,
-            objects_accessed.value:columns AS columns_array
-        FROM access_history, LATERAL FLATTEN(access_history.base_objects_accessed) AS objects_accessed
-    ),
-    table_access_history AS (
-        SELECT
-            query_id,
-            query_start_time,
-            user_name,
-            object_name AS fully_qualified_table_name,
-            table_id
-        FROM access_history_flattened
-        WHERE
-            object_domain = 'Table'
-            AND table_id IS NOT NULL
-    ),
-    table_access_summary AS (
-        SELECT
-            table_id,
-            MAX(query_start_time) AS last_accessed_at,
-            MAX_BY(user_name, query_start_time) AS last_accessed_by,
-            MAX_BY(query_id, query_start_time) AS last_query_id
-        FROM table_access_history
-        GROUP BY 1
-    ),
-    table_storage_metrics AS (
-        SELECT
-            id AS table_id,
-            table_catalog || '.' ||table_schema ||'.' || table_name AS fully_qualified_table_name,
-            (active_bytes + time_travel_bytes + failsafe_bytes + retained_for_clone_bytes)/POWER(1024,4) AS total_storage_tb,
-            total_storage_tb*12*{storage_cost_per_tb} AS annualized_storage_cost
-        FROM snowflake.account_usage.table_storage_metrics
-        WHERE
-            NOT deleted
-    )
-    SELECT
-        table_storage_metrics.*,
-        table_access_summary.* EXCLUDE (table_id),
-        DATEDIFF(day, last_accessed_at, CURRENT_DATE()) AS days_since_last_access
-    FROM table_storage_metrics
-    INNER JOIN table_access_summary
-        ON table_storage_metrics.table_id=table_access_summary.table_id
-    WHERE
-        last_accessed_at < DATEADD(day, -{unused_days}, CURRENT_DATE())
-    ORDER BY table_storage_metrics.annualized_storage_cost DESC
-    """
-
-    with st.spinner("Analyzing unused tables..."):
-        st.session_state.unused_tables = run_query(unused_tables_query)
-
-if st.session_state.unused_tables.empty:
-    st.info("No unused tables found based on the specified criteria.")
-else:
-    st.success(f"Found {len(st.session_state.unused_tables)} unused tables.")
-    plot_unused_tables(st.session_state.unused_tables)
-
-# Storage Forecast
-st.subheader("Storage Prediction")
-if st.button("Generate Storage Forecast"):
-    st.session_state.forecast_generated = True
-
-if st.session_state.forecast_generated:
+
+def render_unused_tables_export(unused_days, storage_cost_per_tb):
+    # The export is only built when asked for, and reused until the inputs change
     col1, col2 = st.columns(2)
     with col1:
-        training_days = st.number_input("Training Days", min_value=30, value=60)
+        export_format = st.selectbox("Export format", ["csv", "parquet"])
+    export_key = (unused_days, storage_cost_per_tb, export_format)
     with col2:
-        predicted_days = st.number_input("Prediction Days", min_value=5, value=30)
-    
-    if st.button("Run Forecast"):
-        st.session_state.forecast_data, st.session_state.actual_data = generate_storage_forecast(training_days, predicted_days)
-        st.success("Forecast generated successfully!")
-        plot_storage_forecast(st.session_state.forecast_data, st.session_state.actual_data)
-
-        # Storage Cost Estimation
-        st.subheader("Storage Cost Estimation")
-        cost_per_tb_per_month = st.number_input("Cost per TB per month ($)", value=23.0)
-        
-        last_actual_storage = st.session_state.actual_data['STORAGE_GB'].iloc[-1]
-        last_predicted_storage = st.session_state.forecast_data['FORECAST_GB'].iloc[-1]
-        last_upper_bound = st.session_state.forecast_data['UPPER_BOUND_GB'].iloc[-1]
-        last_lower_bound = st.session_state.forecast_data['LOWER_BOUND_GB'].iloc[-1]
-
-        current_monthly_cost = (last_actual_storage / 1024) * cost_per_tb_per_month
-        predicted_monthly_cost = (last_predicted_storage / 1024) * cost_per_tb_per_month
-        upper_bound_monthly_cost = (last_upper_bound / 1024) * cost_per_tb_per_month
-        lower_bound_monthly_cost = (last_lower_bound / 1024) * cost_per_tb_per_month
-
-        st.write(f"Estimated current monthly storage cost: ${current_monthly_cost:.2f}")
-        st.write(f"Estimated monthly storage cost in {predicted_days} days:")
-        st.write(f"- Forecast: ${predicted_monthly_cost:.2f}")
-        st.write(f"- Upper Bound: ${upper_bound_monthly_cost:.2f}")
-        st.write(f"- Lower Bound: ${lower_bound_monthly_cost:.2f}")
-
-# Recommendations
-st.subheader("Recommendations")
-recommendations = generate_recommendations(
-    st.session_state.forecast_data, 
-    st.session_state.unused_tables, 
-    st.session_state.breakdown_data
-)
-display_recommendations(recommendations)
+        if st.button("Prepare download"):
+            # Built once per input change; reruns hand the same bytes to download_button
+            st.session_state.unused_export = (export_key, export_bytes(st.session_state.unused_tables, export_format))
+    prepared = st.session_state.get('unused_export')
+    if prepared is not None and prepared[0] == export_key:
+        st.download_button(
+            label=f"Download full results as {export_format.upper()}",
+            data=prepared[1],
+            file_name=f"unused_tables_analysis.{export_format}",
+            mime=EXPORT_MIME_TYPES[export_format],
+        )
+    with st.expander("Unload to a stage (large results)"):
+        stage = st.text_input("Stage name", placeholder="my_db.my_schema.my_stage")
+        if stage and st.button("Unload"):
+            try:
+                stage = stage_identifier(stage)
+            except ValueError as e:
+                st.error(str(e))
+                return
+            with st.spinner("Unloading..."):
+                # Reads ACCESS_HISTORY directly when the access summary table is not available
+                query = unused_tables_query(unused_days, storage_cost_per_tb, access_summary=access_summary_source())
+                try:
+                    result = unload_to_stage(query, stage, "unused_tables_analysis/", export_format)
+                except Exception as e:
+                    st.error(f"Could not unload to @{stage}: {e}")
+                    return
+            st.success(f"Unloaded {sum(row['rows_unloaded'] for row in result)} rows to @{stage}/unused_tables_analysis/")
+
+
+@fragment
+def growth_section():
+    # Which databases, schemas and tables drove the growth between table storage snapshots
+    st.subheader(f"Storage Growth (Last {GROWTH_WINDOW_DAYS} Days)")
+    growth = section_data('table_growth', "Comparing table storage snapshots...")
+    if growth is None or growth.empty:
+        st.info("No table storage changes recorded yet; growth shows up once a later snapshot has been taken.")
+        return
+    col1, col2 = st.columns(2)
+    with col1:
+        level = st.selectbox("Group by", list(GROWTH_LEVELS), index=list(GROWTH_LEVELS).index('table'))
+    with col2:
+        top = st.number_input("Top contributors", min_value=5, max_value=100, value=10)
+    contributors = top_contributors(growth, level, top)
+    st.metric("Net growth", f"{growth['TOTAL_BYTES_DELTA'].sum() / 1024 ** 3:,.1f} GB",
+              help=f"{len(growth)} tables changed, {int(growth['CREATED'].sum())} created")
+    plot_growth(contributors, title=f"Top {top} Contributors by {level.title()}")
+    st.dataframe(contributors, hide_index=True)
+
+
+@fragment
+def retention_section():
+    # Every retention cap and transient policy is simulated locally from the per-table details
+    st.subheader("Time Travel and Fail-safe Optimizer")
+    details = section_data('table_details', "Checking table retention and clones...")
+    storage_cost_per_tb = st.session_state.storage_cost_per_tb
+    simulation = simulate_retention(details, storage_cost_per_tb=storage_cost_per_tb)
+    plot_retention_simulation(simulation)
+    col1, col2 = st.columns(2)
+    with col1:
+        retention_cap = st.select_slider("Retention cap (days)", options=RETENTION_CAPS.tolist(), value=1)
+    with col2:
+        ratios = [ratio for ratio in TRANSIENT_RATIOS.tolist() if ratio != float('inf')]
+        transient_ratio = st.select_slider("Convert to transient at fail-safe / active bytes", options=ratios + [float('inf')],
+                                           value=TRANSIENT_FAILSAFE_RATIO, format_func=lambda ratio: "never" if ratio == float('inf') else f"{ratio:g}x")
+    actions = retention_actions(details, retention_cap, transient_ratio, storage_cost_per_tb, n=None)
+    st.metric("Estimated annual savings", f"${actions['ANNUAL_SAVINGS'].sum():,.2f}", help=f"{len(actions)} tables changed")
+    st.dataframe(actions.head(100), hide_index=True)
+
+
+@fragment
+def stages_section():
+    # Listings are aggregated per prefix in Snowflake; single files are only fetched for one stage on request
+    st.subheader("Internal Stage Files")
+    prefixes = section_data('stage_summary', "Listing internal stages...")
+    if prefixes is None or prefixes.empty:
+        st.info("No internal stage files found.")
+        return
+    stages = stage_summary(prefixes)
+    col1, col2 = st.columns(2)
+    col1.metric("Stage storage", f"{stages['GB'].sum():,.1f} GB", help=f"{len(stages)} stages, {int(stages['FILES'].sum()):,} files")
+    col2.metric(f"Stale (over {STAGE_STALE_DAYS} days)", f"{stages['STALE_GB'].sum():,.1f} GB",
+                help=f"{int(stages['STALE_FILES'].sum()):,} files")
+    plot_stages(stages.head(20))
+    stage = st.selectbox("Stage", stages['STAGE'].tolist())
+    st.dataframe(prefixes[prefixes['STAGE'] == stage].drop(columns=['DATABASE_NAME', 'SCHEMA_NAME', 'STAGE_NAME']),
+                 hide_index=True)
+    if st.button(f"Show the {STAGE_TOP_FILES} largest stale files"):
+        with st.spinner(f"Listing {stage}..."):
+            st.dataframe(largest_stale_files(stage, session=shared_session()), hide_index=True)
+
+
+@fragment
+def storage_forecast_section():
+    st.subheader("Storage Prediction")
+    if st.button("Generate Storage Forecast"):
+        st.session_state.forecast_generated = True
+
+    if st.session_state.forecast_generated:
+        col1, col2 = st.columns(2)
+        with col1:
+            training_days = st.number_input("Training Days", min_value=30, value=60)
+        with col2:
+            predicted_days = st.number_input("Prediction Days", min_value=5, value=30)
+        forecast_engine = st.radio("Forecast engine", ["Snowflake ML", "Local"], horizontal=True,
+                                   index=1 if FORECAST_BACKEND == 'local' else 0)
+
+        if st.button("Run Forecast"):
+            backend = 'local' if forecast_engine == "Local" else 'snowflake'
+            with st.status("Generating forecast...", expanded=True) as forecast_status:
+                st.session_state.forecast_data, st.session_state.actual_data = storage_forecast(training_days, predicted_days, backend=backend)
+                forecast_status.update(label="Forecast generated successfully!", state="complete", expanded=False)
+
+        if st.session_state.forecast_data is not None:
+            plot_storage_forecast(st.session_state.forecast_data, st.session_state.actual_data)
+
+            # Storage Cost Estimation
+            st.subheader("Storage Cost Estimation")
+            cost_per_tb_per_month = st.number_input("Cost per TB per month ($)", value=23.0)
+
+            last_actual_storage = st.session_state.actual_data['STORAGE_GB'].iloc[-1]
+            last_predicted_storage = st.session_state.forecast_data['FORECAST_GB'].iloc[-1]
+            last_upper_bound = st.session_state.forecast_data['UPPER_BOUND_GB'].iloc[-1]
+            last_lower_bound = st.session_state.forecast_data['LOWER_BOUND_GB'].iloc[-1]
+
+            current_monthly_cost = (last_actual_storage / 1024) * cost_per_tb_per_month
+            predicted_monthly_cost = (last_predicted_storage / 1024) * cost_per_tb_per_month
+            upper_bound_monthly_cost = (last_upper_bound / 1024) * cost_per_tb_per_month
+            lower_bound_monthly_cost = (last_lower_bound / 1024) * cost_per_tb_per_month
+
+            st.write(f"Estimated current monthly storage cost: ${current_monthly_cost:.2f}")
+            st.write(f"Estimated monthly storage cost in {predicted_days} days:")
+            st.write(f"- Forecast: ${predicted_monthly_cost:.2f}")
+            st.write(f"- Upper Bound: ${upper_bound_monthly_cost:.2f}")
+            st.write(f"- Lower Bound: ${lower_bound_monthly_cost:.2f}")
+
+
+def recommendations_section():
+    # Uses whatever the other sections have loaded; the breakdown and per-table details are fetched here
+    st.subheader("Recommendations")
+    if st.session_state.unused_tables is None or st.session_state.forecast_data is None:
+        st.caption("Open the Unused Tables and Forecast sections for recommendations based on them.")
+    recommendations = generate_recommendations(
+        st.session_state.forecast_data,
+        st.session_state.unused_tables,
+        section_data('breakdown_data'),
+        section_data('table_details', "Checking table retention and clones..."),
+        st.session_state.storage_cost_per_tb
+    )
+    display_recommendations(recommendations)
+
+
+@fragment
+def query_metrics_section():
+    # Statements run by this server process since it started, across all viewers
+    st.subheader("Query Metrics")
+    if st.button("Fetch server stats", help="Look up execution time, bytes scanned and warehouse size in QUERY_HISTORY"):
+        with st.spinner("Fetching query stats..."):
+            try:
+                missing = query_metrics.fetch_stats(shared_session())
+            except Exception as e:
+                st.error(f"Could not fetch query stats: {e}")
+            else:
+                if missing:
+                    st.info(f"{missing} statements are not in QUERY_HISTORY yet; try again later.")
+    metrics = query_metrics.frame()
+    if metrics.empty:
+        st.info("No queries recorded yet.")
+        return
+    cost = dashboard_cost(metrics)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Queries run", cost['queries'], help=f"{cost['cache_hits']} more served from cache")
+    col2.metric("Execution time", f"{cost['execution_seconds']:.1f}s", help=f"{cost['wall_seconds']:.1f}s client wall time")
+    stats_help = f"Server stats for {cost['with_stats']} of {cost['queries']} statements"
+    col3.metric("Data scanned", f"{cost['bytes_scanned'] / 1024 ** 3:.2f} GB", help=stats_help)
+    col4.metric("Estimated credits", f"{cost['estimated_credits']:.4f}", help=stats_help)
+    st.write("Hottest queries")
+    st.dataframe(hot_queries(metrics), hide_index=True)
+    with st.expander("All statements"):
+        st.dataframe(metrics, hide_index=True)
+
+
+# Only the selected section runs its queries
+SECTIONS = {
+    "Monthly Storage": monthly_storage_section,
+    "Daily Storage": daily_storage_section,
+    "Storage Breakdown": storage_breakdown_section,
+    "Storage Drill-down": drilldown_section,
+    "Unused Tables": unused_tables_section,
+    "Growth": growth_section,
+    "Retention Optimizer": retention_section,
+    "Stages": stages_section,
+    "Forecast": storage_forecast_section,
+    "Recommendations": recommendations_section,
+    "Query Metrics": query_metrics_section,
+}
+
+# Streamlit app
+st.title("Snowflake Storage Analysis")
+section = st.sidebar.radio("Section", list(SECTIONS))
+if st.sidebar.button("Refresh now", help="Discard cached results and query Snowflake again"):
+    invalidate()
+    st.session_state.unused_export = None
+SECTIONS[section]()
@@ -0,0 +1,27 @@
+import os
+
+# The local DuckDB backend, selected before storage.session reads it at import
+os.environ['STORAGE_QUERY_BACKEND'] = 'local'
+os.environ.setdefault('STORAGE_FORECAST_BACKEND', 'local')
+
+import pytest
+
+from storage.local import LocalSession, reset_local_database
+from storage.queries import clear_query_cache
+
+TEST_TABLES = 1_000
+TEST_ACCESS_ROWS = 20_000
+
+
+@pytest.fixture(scope='session')
+def session():
+    reset_local_database(tables=TEST_TABLES, access_rows=TEST_ACCESS_ROWS)
+    session = LocalSession()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def empty_query_cache():
+    clear_query_cache()
+    yield
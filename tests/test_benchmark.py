@@ -0,0 +1,51 @@
+import json
+
+from storage.benchmark import build_page, compare_results, reset_caches, write_results
+
+STAGES = {
+    'dashboard_queries', 'run_query.table_access', 'filter_unused_tables', 'forecast',
+    'run_query.table_details', 'generate_recommendations', 'plot_monthly_storage', 'plot_daily_storage',
+    'plot_storage_breakdown', 'plot_unused_tables', 'plot_storage_forecast',
+}
+
+
+def _results(size, cold, warm):
+    return {'results': [{
+        'size': size,
+        'cold': {'total_seconds': sum(cold.values()), 'stages': cold},
+        'warm': {'total_seconds': sum(warm.values()), 'stages': warm},
+    }]}
+
+
+def test_build_page_times_every_stage(session):
+    reset_caches(session)
+    cold = build_page(session)
+    warm = build_page(session)
+    assert STAGES <= set(cold)
+    assert any(name.startswith('run_query.') and name not in STAGES for name in cold)
+    assert set(cold) == set(warm)
+    assert all(seconds >= 0 for seconds in cold.values())
+
+
+def test_compare_results_flags_slower_stages():
+    baseline = _results('1k', {'forecast': 1.0, 'plot': 0.5}, {'forecast': 0.1, 'plot': 0.1})
+    current = _results('1k', {'forecast': 1.1, 'plot': 0.9}, {'forecast': 0.1, 'plot': 0.1})
+    regressions = compare_results(baseline, current)
+    assert regressions == ['1k cold total: 1.500s -> 2.000s', '1k cold plot: 0.500s -> 0.900s']
+    assert compare_results(baseline, current, tolerance=1.0) == []
+
+
+def test_compare_results_skips_new_sizes_and_stages():
+    baseline = _results('1k', {'forecast': 1.0}, {'forecast': 1.0})
+    assert compare_results(baseline, _results('100k', {'forecast': 9.0}, {'forecast': 9.0})) == []
+    assert compare_results(baseline, _results('1k', {'forecast': 0.5, 'new': 0.5},
+                                              {'forecast': 0.5, 'new': 0.5})) == []
+
+
+def test_write_results(tmp_path, capsys):
+    results = _results('1k', {'forecast': 1.0}, {'forecast': 0.5})
+    path = tmp_path / 'benchmark.json'
+    write_results(results, str(path))
+    assert json.loads(path.read_text()) == results
+    write_results(results)
+    assert json.loads(capsys.readouterr().out) == results
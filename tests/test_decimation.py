@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage.decimation import decimate, lttb_indices, minmax_indices
+
+
+def _series(n=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=float), np.cumsum(rng.normal(0, 1, n))
+
+
+def test_small_series_unchanged():
+    x, y = _series(50)
+    assert minmax_indices(y, 100).tolist() == list(range(50))
+    assert lttb_indices(x, y, 100).tolist() == list(range(50))
+
+
+def test_minmax_keeps_extremes_and_ends():
+    x, y = _series()
+    selected = minmax_indices(y, 200)
+    assert len(selected) <= 200
+    assert {0, len(y) - 1, int(np.argmax(y)), int(np.argmin(y))} <= set(selected.tolist())
+    assert (np.diff(selected) > 0).all()
+
+
+def test_minmax_ignores_nan():
+    y = np.array([np.nan, 1.0, 5.0, np.nan, -3.0, 2.0] * 100)
+    selected = minmax_indices(y, 20)
+    assert {int(np.nanargmax(y)), int(np.nanargmin(y))} <= set(selected.tolist())
+
+
+@pytest.mark.parametrize('n', [1_000, 100_000])
+def test_lttb_size_and_ends(n):
+    x, y = _series(n)
+    selected = lttb_indices(x, y, 500)
+    assert len(selected) <= 500
+    assert selected[0] == 0 and selected[-1] == n - 1
+    assert (np.diff(selected) > 0).all()
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(5_000, dtype=float)
+    y = np.zeros(5_000)
+    y[2_345] = 100.0
+    assert 2_345 in lttb_indices(x, y, 100)
+
+
+def test_lttb_datetime_x():
+    dates = pd.date_range('2020-01-01', periods=3_000, freq='D').to_numpy()
+    _, y = _series(3_000)
+    assert len(lttb_indices(dates, y, 300)) <= 300
+
+
+def test_decimate_frame_per_column_and_group():
+    x, y = _series(4_000)
+    data = pd.DataFrame({'X': np.tile(x[:2_000], 2), 'A': y, 'B': -y, 'G': np.repeat(['p', 'q'], 2_000)})
+    reduced = decimate(data, 'X', ['A', 'B'], 200, group='G')
+    assert len(reduced) < len(data)
+    # The columns share the budget, so each series stays within it
+    for _, rows in reduced.groupby('G'):
+        assert len(rows) <= 200
+    assert reduced.index.is_monotonic_increasing
+    assert decimate(data, 'X', 'A', 10_000) is data
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_decimate_budget_over_columns(method):
+    x, y = _series(10_000)
+    data = pd.DataFrame({'X': x, 'A': y, 'B': -y, 'C': np.sin(x / 50)})
+    assert len(decimate(data, 'X', ['A', 'B', 'C'], 300, method)) <= 300
+
+
+@pytest.mark.parametrize('dtype', [None, 'US/Eastern', 'timestamp[us, tz=UTC][pyarrow]'])
+def test_decimate_datetime_x(dtype):
+    # Unevenly spaced times are decimated by time, the same as their epoch values, not by position
+    gaps = np.random.default_rng(1).integers(1, 60, 3_000)
+    dates = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(np.cumsum(gaps), unit='min'))
+    _, y = _series(len(dates))
+    by_time = decimate(pd.DataFrame({'X': dates.astype('int64').astype(float), 'Y': y}), 'X', 'Y', 1_000).index
+    by_position = decimate(pd.DataFrame({'X': np.arange(len(y), dtype=float), 'Y': y}), 'X', 'Y', 1_000).index
+    assert not by_time.equals(by_position)
+    if dtype == 'US/Eastern':
+        dates = dates.dt.tz_localize(dtype)
+    elif dtype:
+        dates = dates.dt.tz_localize('UTC').astype(dtype)
+    assert decimate(pd.DataFrame({'X': dates, 'Y': y}), 'X', 'Y', 1_000).index.equals(by_time)
+
+
+def test_decimate_unknown_method():
+    data = pd.DataFrame({'X': [1, 2, 3], 'Y': [1, 2, 3]})
+    with pytest.raises(ValueError):
+        decimate(data, 'X', 'Y', 2, method='random')
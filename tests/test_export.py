@@ -0,0 +1,98 @@
+import io
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import storage.export as export
+import storage.unused_tables as unused_tables
+
+from storage.export import export_bytes, export_file, unload_to_stage, write_csv, write_parquet
+from storage.unused_tables import (
+    FULL_HISTORY_ACCESS_SUMMARY,
+    access_summary_source,
+    reset_access_summary_refresh,
+    unused_tables_query
+)
+
+
+def _frame(rows=1_000):
+    return pd.DataFrame({
+        'TABLE_ID': np.arange(rows),
+        'FULLY_QUALIFIED_TABLE_NAME': [f'DB.S."T,{i}"' for i in range(rows)],
+        'TOTAL_STORAGE_TB': np.linspace(1, 0, rows),
+    })
+
+
+def _sources(frame):
+    return {
+        'frame': frame,
+        'arrow': pa.Table.from_pandas(frame, preserve_index=False),
+        'batches': (frame.iloc[start:start + 300] for start in range(0, len(frame), 300)),
+    }
+
+
+@pytest.mark.parametrize('kind', ['frame', 'arrow', 'batches'])
+def test_csv_round_trip(kind):
+    frame = _frame()
+    file = write_csv(_sources(frame)[kind], io.BytesIO(), chunk_rows=128)
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(file.getvalue())), frame)
+
+
+@pytest.mark.parametrize('kind', ['frame', 'arrow', 'batches'])
+def test_parquet_round_trip(kind):
+    frame = _frame()
+    file = write_parquet(_sources(frame)[kind], io.BytesIO(), chunk_rows=128)
+    pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(file.getvalue())), frame)
+
+
+def test_empty_parquet_keeps_the_schema():
+    frame = _frame(0)
+    for source in (frame, pa.Table.from_pandas(frame, preserve_index=False)):
+        table = pq.read_table(write_parquet(source, io.BytesIO()))
+        assert table.num_rows == 0
+        assert table.column_names == list(frame.columns)
+    with pytest.raises(ValueError):
+        write_parquet(iter([]), io.BytesIO())
+
+
+def test_export_file_spools_to_disk(monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_SPOOL_BYTES', 1024)
+    frame = _frame(5_000)
+    file = export_file(frame, 'csv')
+    # Past the spool size the export lives in a real temporary file, rewound for reading
+    assert file._rolled
+    assert file.tell() == 0
+    pd.testing.assert_frame_equal(pd.read_csv(file), frame)
+    assert export_bytes(frame, 'parquet') == export_file(frame, 'parquet').read()
+
+
+def test_unload_to_stage_quotes_the_location(monkeypatch):
+    statements = []
+    monkeypatch.setattr(export, 'run_command', lambda query, session=None: statements.append(query))
+    unload_to_stage("SELECT 1", 'my_db.my_schema."Exports"', "unused_tables_analysis/", 'csv')
+    assert 'COPY INTO @"MY_DB"."MY_SCHEMA"."Exports"/unused_tables_analysis/' in statements[0]
+    assert 'TYPE = CSV' in statements[0]
+    for stage, path in [("s; DROP TABLE t", "x/"), ("s", "../x"), ("s", "x' y")]:
+        with pytest.raises(ValueError):
+            unload_to_stage("SELECT 1", stage, path)
+    assert len(statements) == 1
+
+
+def test_unload_query_without_access_summary(session, monkeypatch):
+    # Without CREATE privileges the unload reads ACCESS_HISTORY directly and gives the same rows
+    def fail(*args, **kwargs):
+        raise RuntimeError("Insufficient privileges to operate on schema")
+
+    reset_access_summary_refresh()
+    monkeypatch.setattr(unused_tables, 'refresh_access_summary', fail)
+    access_summary = access_summary_source('missing_access_summary', session=session)
+    assert access_summary == FULL_HISTORY_ACCESS_SUMMARY
+    fallback = session.sql(unused_tables_query(90, 23.0, access_summary=access_summary)).to_pandas()
+    monkeypatch.undo()
+
+    reset_access_summary_refresh()
+    summary = session.sql(unused_tables_query(90, 23.0, access_summary=access_summary_source(session=session))).to_pandas()
+    assert len(fallback) > 0
+    assert sorted(fallback['TABLE_ID']) == sorted(summary['TABLE_ID'])
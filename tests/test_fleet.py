@@ -0,0 +1,102 @@
+import threading
+import pandas as pd
+import pytest
+
+import storage.fleet as fleet
+
+from storage.fleet import merge_results, run_fleet
+
+PROFILES = {'prod': {'account': 'PROD'}, 'dev': {'account': 'DEV'}}
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    # Stand-in analyses on the local backend, registered under a test name
+    def register(name, analysis):
+        monkeypatch.setitem(fleet.FLEET_ANALYSES, name, analysis)
+        return (name,)
+
+    monkeypatch.setattr(fleet, 'FLEET_POLL_INTERVAL', 0.02)
+    return register
+
+
+def test_merge_results():
+    results = {
+        'prod': {'storage': pd.DataFrame({'GB': [1.0, 2.0]}), 'unused_tables': None},
+        'dev': {'storage': pd.DataFrame({'GB': [3.0]}), 'unused_tables': pd.DataFrame({'NAME': ['T']})},
+    }
+    merged = merge_results(results)
+    assert list(merged['storage'].columns) == ['ACCOUNT', 'GB']
+    assert merged['storage'][['ACCOUNT', 'GB']].values.tolist() == [['prod', 1.0], ['prod', 2.0], ['dev', 3.0]]
+    assert merged['unused_tables']['ACCOUNT'].tolist() == ['dev']
+    assert merge_results({}) == {}
+
+
+def test_run_fleet_on_dedicated_sessions(session, analyses):
+    sessions = []
+
+    def analysis(session, progress, **params):
+        sessions.append(session)
+        return {'rows': session.sql("SELECT 1 AS x").to_pandas()}
+
+    merged, errors = run_fleet(PROFILES, analyses('rows', analysis), timeout=5)
+    assert errors == {}
+    assert sorted(merged['rows']['ACCOUNT']) == ['dev', 'prod']
+    # One session per account, closed once the account is done
+    assert len({id(session) for session in sessions}) == 2
+    assert all(session.connection.is_closed() for session in sessions)
+
+
+def test_retry_with_backoff(analyses, monkeypatch):
+    delays, attempts = [], {'prod': 0}
+    monkeypatch.setattr(fleet.time, 'sleep', delays.append)
+
+    def flaky(session, progress, **params):
+        attempts['prod'] += 1
+        if attempts['prod'] <= 2:
+            raise RuntimeError("transient")
+        return {'rows': pd.DataFrame({'X': [1]})}
+
+    merged, errors = run_fleet({'prod': PROFILES['prod']}, analyses('flaky', flaky), retries=2, backoff=0.5, timeout=0)
+    assert errors == {}
+    assert attempts['prod'] == 3
+    assert delays == [0.5, 1.0]
+
+
+def test_retries_exhausted(analyses, monkeypatch):
+    monkeypatch.setattr(fleet.time, 'sleep', lambda delay: None)
+
+    def failing(session, progress, **params):
+        raise RuntimeError("always fails")
+
+    merged, errors = run_fleet(PROFILES, analyses('failing', failing), retries=1, timeout=0)
+    assert merged == {}
+    assert errors == {'prod': 'always fails', 'dev': 'always fails'}
+
+
+def test_timeout_cancels_only_the_slow_account(analyses):
+    lock, started, cancelled = threading.Lock(), [], []
+    released = threading.Event()
+
+    def maybe_slow(session, progress, **params):
+        # The first account to start hangs until its session is cancelled
+        with lock:
+            first = not started
+            started.append(session)
+        if first:
+            cancel_all = session.cancel_all
+            session.cancel_all = lambda: (cancelled.append(session), released.set(), cancel_all())
+            released.wait(5)
+            raise RuntimeError("query cancelled")
+        return {'rows': pd.DataFrame({'X': [1]})}
+
+    merged, errors = run_fleet(PROFILES, analyses('maybe_slow', maybe_slow), timeout=0.2, retries=0)
+    assert list(errors.values()) == ['timed out after 0.2s']
+    assert cancelled == [started[0]]
+    assert merged['rows']['ACCOUNT'].tolist() == [name for name in PROFILES if name not in errors]
+
+
+def test_refused_on_active_session(monkeypatch):
+    monkeypatch.setattr(fleet, 'has_active_session', lambda: True)
+    with pytest.raises(RuntimeError, match="SiS"):
+        run_fleet(PROFILES)
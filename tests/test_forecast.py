@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage.forecast import FORECAST_COLUMNS, ForecastBackend, LocalForecastBackend, local_forecast
+
+
+def _history(values, start='2025-01-01'):
+    return pd.DataFrame({'USAGE_DATE': pd.date_range(start, periods=len(values), freq='D'), 'STORAGE_GB': values})
+
+
+def _trend_with_noise(n=120, slope=2.0, noise=1.0, seed=0):
+    return 100 + slope * np.arange(n) + np.random.default_rng(seed).normal(0, noise, n)
+
+
+@pytest.mark.parametrize('method', ['holt', 'linear'])
+def test_forecast_shape_and_dates(method):
+    forecast = local_forecast(_history(_trend_with_noise()), 30, method)
+    assert list(forecast.columns) == FORECAST_COLUMNS
+    assert len(forecast) == 30
+    assert forecast['USAGE_DATE'].iloc[0] == pd.Timestamp('2025-01-01') + pd.Timedelta(days=120)
+    assert (forecast['USAGE_DATE'].diff().dropna() == pd.Timedelta(days=1)).all()
+    assert (forecast['LOWER_BOUND_GB'] <= forecast['FORECAST_GB']).all()
+    assert (forecast['FORECAST_GB'] <= forecast['UPPER_BOUND_GB']).all()
+
+
+@pytest.mark.parametrize('method', ['holt', 'linear'])
+def test_forecast_follows_trend(method):
+    forecast = local_forecast(_history(_trend_with_noise()), 30, method)
+    expected = 100 + 2.0 * np.arange(120, 150)
+    assert forecast['FORECAST_GB'].to_numpy() == pytest.approx(expected, rel=0.02)
+
+
+@pytest.mark.parametrize('method', ['holt', 'linear'])
+def test_intervals_widen_with_horizon(method):
+    forecast = local_forecast(_history(_trend_with_noise()), 30, method)
+    width = (forecast['UPPER_BOUND_GB'] - forecast['LOWER_BOUND_GB']).to_numpy()
+    assert (np.diff(width) >= -1e-9).all()
+    assert width[0] > 0
+
+
+def test_linear_exact_line():
+    forecast = local_forecast(_history(5.0 + 0.5 * np.arange(10)), 3, 'linear')
+    assert forecast['FORECAST_GB'].to_numpy() == pytest.approx([10.0, 10.5, 11.0])
+    assert forecast['UPPER_BOUND_GB'].to_numpy() == pytest.approx(forecast['FORECAST_GB'].to_numpy())
+
+
+def test_holt_interval_coverage():
+    # Series from the model Holt's method assumes; the 95% intervals should cover about 95%
+    rng = np.random.default_rng(1)
+    covered = []
+    for _ in range(100):
+        errors = rng.normal(0, 1, 150)
+        level, trend, values = 100.0, 0.5, []
+        for error in errors:
+            values.append(level + trend + error)
+            level, trend = level + trend + 0.3 * error, trend + 0.06 * error
+        values = np.array(values)
+        forecast = local_forecast(_history(values[:120]), 30, 'holt')
+        actual = values[120:]
+        covered.append(((actual >= forecast['LOWER_BOUND_GB']) & (actual <= forecast['UPPER_BOUND_GB'])).mean())
+    assert 0.9 <= np.mean(covered) <= 0.99
+
+
+@pytest.mark.parametrize('method', ['holt', 'linear'])
+def test_forecast_is_clipped_at_zero(method):
+    forecast = local_forecast(_history(100 - 10.0 * np.arange(10)), 30, method)
+    assert (forecast[['FORECAST_GB', 'LOWER_BOUND_GB', 'UPPER_BOUND_GB']] >= 0).all().all()
+
+
+def test_forecast_input_errors():
+    with pytest.raises(ValueError):
+        local_forecast(_history([1.0, 2.0]), 5)
+    with pytest.raises(ValueError):
+        local_forecast(_history(_trend_with_noise()), 5, method='arima')
+
+
+def test_unsorted_history_is_sorted():
+    history = _history(_trend_with_noise())
+    shuffled = history.sample(frac=1, random_state=0)
+    pd.testing.assert_frame_equal(local_forecast(shuffled, 10), local_forecast(history, 10))
+
+
+def test_local_backend_training_window():
+    today = pd.Timestamp.today().normalize()
+    history = pd.DataFrame({
+        'USAGE_DATE': pd.date_range(end=today - pd.Timedelta(days=1), periods=200, freq='D'),
+        'STORAGE_GB': _trend_with_noise(200),
+    })
+    forecast_data, actual_data = LocalForecastBackend(history=history).forecast(60, 30)
+    # Trained on history older than the training window, then forecast from there
+    assert forecast_data['USAGE_DATE'].iloc[0] == today - pd.Timedelta(days=60)
+    assert len(forecast_data) == 30
+    assert pd.to_datetime(actual_data['USAGE_DATE']).min() >= today - pd.Timedelta(days=30)
+
+
+def test_local_backend_on_seeded_history(session):
+    forecast_data, actual_data = LocalForecastBackend().forecast(60, 30, session=session)
+    assert len(forecast_data) == 30
+    assert len(actual_data) > 0
+
+
+def test_forecast_backend_is_abstract():
+    with pytest.raises(TypeError):
+        ForecastBackend()
@@ -0,0 +1,113 @@
+import pytest
+
+from storage.drilldown import DRILLDOWN_QUERY
+from storage.local import script_statements, translate_sql
+from storage.queries import DAILY_STORAGE_QUERY, MONTHLY_STORAGE_QUERY, run_query
+from storage.recommendations import load_table_details
+from storage.stages import list_stages, prefix_summary, stages_query
+from storage.unused_tables import load_table_access, reset_access_summary_refresh
+
+
+def test_translate_account_usage_and_functions():
+    sql = translate_sql("""
+    SELECT TO_CHAR(usage_date, 'Mon-YYYY') AS month, DATEADD(day, -30, CURRENT_TIMESTAMP())
+    FROM snowflake.account_usage.storage_usage;
+    """)
+    assert 'snowflake.' not in sql
+    assert 'account_usage.storage_usage' in sql
+    assert "strftime(usage_date, '%b-%Y')" in sql
+    assert "DATEADD('day'," in sql
+    assert 'CURRENT_TIMESTAMP()' not in sql
+    assert not sql.endswith(';')
+
+
+def test_translate_types_and_timestamps():
+    sql = translate_sql("""
+    CREATE TABLE t (a TIMESTAMP_LTZ, b TIMESTAMP_NTZ, c FLOAT) AS
+    SELECT TO_TIMESTAMP_TZ("last_modified", 'DY, DD MON YYYY HH24:MI:SS GMT')
+    """)
+    assert 'TIMESTAMPTZ' in sql and 'TIMESTAMP_NTZ' not in sql
+    assert 'c DOUBLE' in sql
+    assert "strptime(\"last_modified\", '%a, %d %b %Y %H:%M:%S GMT')" in sql
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM TABLE(model!FORECAST(FORECASTING_PERIODS => 3))",
+    "CREATE snowflake.ml.forecast m(input_data => x)",
+    "COPY INTO @stage/path FROM (SELECT 1)",
+    "SHOW WAREHOUSES",
+])
+def test_translate_unsupported(query):
+    with pytest.raises(NotImplementedError):
+        translate_sql(query)
+
+
+def test_translate_pipe_substitutes_earlier_results():
+    sql = translate_sql(stages_query('DB_1'))
+    assert '$1' not in sql
+    assert "database_name = 'DB_1'" in sql
+
+
+def test_script_statements():
+    block = """
+    BEGIN
+        CREATE TABLE a (x INTEGER);
+        INSERT INTO a VALUES (1);
+    END;
+    """
+    assert script_statements(block) == ['CREATE TABLE a (x INTEGER)', 'INSERT INTO a VALUES (1)']
+    with pytest.raises(NotImplementedError):
+        script_statements("SELECT 1")
+
+
+def test_seeded_storage_queries(session):
+    monthly = run_query(MONTHLY_STORAGE_QUERY, session=session)
+    assert list(monthly.columns) == ['SORT_MONTH', 'MONTH', 'STORAGE', 'STAGE', 'FAILSAFE']
+    assert monthly['SORT_MONTH'].is_monotonic_increasing
+    daily = run_query(DAILY_STORAGE_QUERY, session=session)
+    assert 29 <= len(daily) <= 31
+    assert (daily['STORAGE_GB'] > 0).all()
+
+
+def test_seeded_table_access(session):
+    reset_access_summary_refresh()
+    access = load_table_access(session=session, use_cache=False)
+    assert len(access) > 0
+    assert access['TOTAL_STORAGE_TB'].is_monotonic_decreasing
+    assert access['TABLE_ID'].is_unique
+
+
+def _live_tables(session):
+    return session.sql("SELECT COUNT(*) AS n FROM account_usage.table_storage_metrics WHERE NOT deleted").to_pandas()['N'].iloc[0]
+
+
+def test_seeded_table_details(session):
+    details = load_table_details(session=session, use_cache=False)
+    assert len(details) == _live_tables(session)
+    assert set(details['IS_TRANSIENT'].unique()) == {'YES', 'NO'}
+    assert details['RETENTION_TIME'].notna().all()
+
+
+def test_drilldown_levels_add_up(session):
+    cube = run_query(DRILLDOWN_QUERY, session=session)
+    totals = cube.groupby('DEPTH')['TOTAL_BYTES'].sum()
+    assert totals.index.tolist() == [0, 1, 2, 3]
+    assert totals.to_numpy() == pytest.approx([totals[0]] * 4)
+    assert cube.loc[cube['DEPTH'] == 0, 'TABLES'].iloc[0] == _live_tables(session)
+
+
+def test_stage_listing_matches_seeded_files(session):
+    stages = list_stages(session=session, use_cache=False)
+    # Every tenth seeded stage is external
+    assert len(stages) > 0 and not stages['STAGE_NAME'].str.endswith('9').any()
+    prefixes = prefix_summary(stages, stale_days=90, session=session, use_cache=False)
+    files = session.sql("""
+    SELECT COUNT(*) AS files, SUM(size) AS bytes
+    FROM local_stages.stage_files JOIN local_stages.stages USING (stage_id)
+    WHERE type = 'INTERNAL'
+    """).to_pandas()
+    assert prefixes['FILES'].sum() == files['FILES'].iloc[0]
+    assert prefixes['BYTES'].sum() == pytest.approx(float(files['BYTES'].iloc[0]))
+    assert (prefixes['STALE_FILES'] <= prefixes['FILES']).all()
+    removable = prefixes['ACTION'].notna()
+    assert (prefixes.loc[removable, 'STALE_FILES'] == prefixes.loc[removable, 'FILES']).all()
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from types import SimpleNamespace
+from storage.metrics import QUERY_STATS_COLUMNS, QueryMetrics, dashboard_cost
+
+
+class StatsSession:
+    # Returns QUERY_HISTORY rows for the known query IDs that appear in the statement
+    def __init__(self, database, known):
+        self.database = database
+        self.known = known
+        self.statements = []
+
+    def get_current_database(self):
+        return self.database
+
+    def sql(self, query):
+        self.statements.append(query)
+        rows = [{**dict.fromkeys(QUERY_STATS_COLUMNS), 'QUERY_ID': query_id, 'WAREHOUSE_SIZE': 'X-Small',
+                 'EXECUTION_TIME': 3_600_000, 'BYTES_SCANNED': 1024} for query_id in self.known if f"'{query_id}'" in query]
+        return SimpleNamespace(to_pandas=lambda: pd.DataFrame(rows, columns=QUERY_STATS_COLUMNS))
+
+
+def _metrics():
+    metrics = QueryMetrics()
+    metrics.record("SELECT * FROM storage_usage", 0.5, rows=1, query_id='q1')
+    metrics.record("SELECT * FROM tables", 0.25, rows=1, query_id='q2')
+    metrics.record("SELECT * FROM tables", 0.0, rows=1, cached=True)
+    return metrics
+
+
+def test_fetch_stats_with_a_current_database():
+    metrics, session = _metrics(), StatsSession('"ANALYTICS"', ['q1', 'q2'])
+    assert metrics.fetch_stats(session) == 0
+    assert '"ANALYTICS".information_schema.query_history' in session.statements[0]
+    cost = dashboard_cost(metrics.frame())
+    assert cost['with_stats'] == cost['queries'] == 2
+    assert cost['estimated_credits'] == pytest.approx(2.0)
+    # Known stats are not fetched again
+    assert metrics.fetch_stats(session) == 0
+    assert len(session.statements) == 1
+
+
+def test_fetch_stats_without_a_database():
+    # No current database: ACCOUNT_USAGE, where the newest statement has not landed yet
+    metrics, session = _metrics(), StatsSession(None, ['q1'])
+    assert metrics.fetch_stats(session) == 1
+    assert 'snowflake.account_usage.query_history' in session.statements[0]
+    cost = dashboard_cost(metrics.frame())
+    assert cost['with_stats'] == 1 and cost['queries'] == 2
+
+
+def test_fetch_stats_errors_reach_the_caller():
+    def fail(query):
+        raise RuntimeError("Insufficient privileges")
+
+    session = StatsSession('"ANALYTICS"', [])
+    session.sql = fail
+    with pytest.raises(RuntimeError, match="Insufficient privileges"):
+        _metrics().fetch_stats(session)
@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+import pandas as pd
+import pytest
+
+import storage.queries as queries
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+from storage.queries import (
+    QueryCache,
+    cache_scope,
+    clear_query_cache,
+    normalize_sql,
+    query_cache,
+    query_ttl,
+    run_queries,
+    run_query
+)
+
+
+class FakeSession:
+    # Answers every statement with a one-row frame and counts what it was asked
+    def __init__(self, account='ACME', role='SYSADMIN'):
+        self.account = account
+        self.role = role
+        self.statements = []
+        self.lookups = 0
+        self.lock = threading.Lock()
+
+    def sql(self, query):
+        with self.lock:
+            self.statements.append(query)
+        return SimpleNamespace(to_pandas=lambda **kwargs: pd.DataFrame({'QUERY': [normalize_sql(query)]}))
+
+    @contextmanager
+    def query_history(self, **kwargs):
+        yield SimpleNamespace(queries=[])
+
+    def get_current_account(self):
+        self.lookups += 1
+        return self.account
+
+    def get_current_role(self):
+        self.lookups += 1
+        return self.role
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(queries, 'time', SimpleNamespace(time=lambda: now[0], perf_counter=time.perf_counter))
+    return now
+
+
+def _frame(rows):
+    return pd.DataFrame({'X': range(rows)})
+
+
+def test_normalize_and_ttl():
+    assert normalize_sql("  SELECT *\n\tFROM t ;  ") == "SELECT * FROM t"
+    assert query_ttl("SELECT * FROM snowflake.account_usage.storage_usage") == 2 * 60 * 60
+    # The freshest view decides
+    assert query_ttl("""SELECT * FROM snowflake.ACCOUNT_USAGE.access_history
+                        JOIN snowflake.account_usage.table_storage_metrics USING (id)""") == 90 * 60
+    assert query_ttl("SELECT 1") == queries.DEFAULT_QUERY_TTL
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache()
+    key = cache.key("SELECT 1", ('ACME', 'SYSADMIN'))
+    cache.put(key, _frame(1))
+    clock[0] += 60
+    assert cache.get(key, ttl=60) is not None
+    clock[0] += 1
+    assert cache.get(key, ttl=60) is None
+    assert cache._bytes == 0
+
+
+def test_keys_separate_scopes_and_ignore_whitespace():
+    cache = QueryCache()
+    key = cache.key("SELECT 1", ('ACME', 'SYSADMIN'))
+    assert cache.key("SELECT   1;", ('ACME', 'SYSADMIN')) == key
+    assert cache.key("SELECT 1", ('ACME', 'ACCOUNTADMIN')) != key
+    assert cache.key("SELECT 1", ('OTHER', 'SYSADMIN')) != key
+
+
+def test_lru_eviction_is_bounded_by_bytes():
+    entry_bytes = queries._frame_bytes(_frame(100))
+    cache = QueryCache(max_bytes=3 * entry_bytes)
+    for name in 'abc':
+        cache.put(name, _frame(100))
+    assert cache.get('a', ttl=60) is not None
+    cache.put('d', _frame(100))
+    # 'b' was the least recently used once 'a' was read
+    assert cache.get('b', ttl=60) is None
+    assert [cache.get(name, ttl=60) is not None for name in 'acd'] == [True, True, True]
+    assert cache._bytes <= cache.max_bytes
+
+
+def test_oversize_entries_are_not_kept():
+    cache = QueryCache(max_bytes=queries._frame_bytes(_frame(10)))
+    cache.put('small', _frame(10))
+    cache.put('large', _frame(10_000))
+    assert cache.get('large', ttl=60) is None
+    assert cache.get('small', ttl=60) is not None
+
+
+def test_parquet_tier(tmp_path, clock):
+    cache_dir = str(tmp_path / 'cache')
+    key = QueryCache().key("SELECT 1", ('ACME', 'SYSADMIN'))
+    QueryCache(cache_dir=cache_dir).put(key, _frame(5))
+    # Written to a .tmp file and moved into place, so readers never see a partial file
+    assert os.listdir(cache_dir) == [f"{key}.parquet"]
+
+    # A new process starts with an empty memory tier and reads the file back
+    restarted = QueryCache(cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(restarted.get(key, ttl=60), _frame(5))
+
+    # The file's mtime is its age; an expired file is removed
+    path = os.path.join(cache_dir, f"{key}.parquet")
+    os.utime(path, (clock[0] - 120, clock[0] - 120))
+    assert QueryCache(cache_dir=cache_dir).get(key, ttl=60) is None
+    assert not os.path.exists(path)
+
+
+def test_run_query_caches_by_scope(monkeypatch):
+    clear_query_cache()
+    shared = FakeSession()
+    monkeypatch.setattr(queries, 'get_session', lambda *args, **kwargs: shared)
+    first = run_query("SELECT 1")
+    assert run_query("SELECT  1;") is first
+    assert len(shared.statements) == 1
+    run_query("SELECT 1", use_cache=False)
+    assert len(shared.statements) == 2
+
+
+def test_result_formats_have_separate_keys():
+    cache = QueryCache()
+    scope = ('ACME', 'SYSADMIN')
+    assert cache.key("SELECT 1", scope) == cache.key("SELECT 1", scope, 'pandas')
+    assert len({cache.key("SELECT 1", scope, result_format) for result_format in queries.RESULT_FORMATS}) == \
+        len(queries.RESULT_FORMATS)
+
+
+def test_cache_scope_is_looked_up_once_per_session():
+    clear_query_cache()
+    session = FakeSession()
+    assert cache_scope(session) == ('ACME', 'SYSADMIN')
+    for _ in range(3):
+        run_query("SELECT 1", session=session)
+    assert session.lookups == 2
+    assert len(session.statements) == 1
+    # Another session has its own scope, and so its own cache entries
+    other = FakeSession(role='ACCOUNTADMIN')
+    run_query("SELECT 1", session=other)
+    assert len(other.statements) == 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Every pooled session is a new FakeSession, all recorded
+    sessions = []
+
+    @contextmanager
+    def pooled_session(*args, **kwargs):
+        session = FakeSession()
+        sessions.append(session)
+        yield session
+
+    clear_query_cache()
+    monkeypatch.setattr(queries, 'pooled_session', pooled_session)
+    return sessions
+
+
+def _statements(sessions):
+    return [statement for session in sessions for statement in session.statements]
+
+
+def test_run_queries_uses_the_cache(pool):
+    statements = {'one': "SELECT 1", 'two': "SELECT 2"}
+    first = dict(run_queries(statements))
+    assert sorted(first) == ['one', 'two']
+    assert len(_statements(pool)) == 2
+    # The pre-check finds what the pooled run stored, without taking a session
+    again = dict(run_queries(statements))
+    assert again['one'] is first['one'] and again['two'] is first['two']
+    assert len(pool) == 2
+    # ... and the same entry as a plain run_query under the default scope and format
+    assert query_cache.get(query_cache.key("SELECT 1", cache_scope()), ttl=60) is first['one']
+    dict(run_queries(statements, use_cache=False))
+    assert len(_statements(pool)) == 4
+
+
+def test_run_queries_never_caches_callables(pool):
+    calls = []
+
+    def loader(session):
+        calls.append(session)
+        return pd.DataFrame({'X': [len(calls)]})
+
+    assert dict(run_queries({'loader': loader}))['loader']['X'].iloc[0] == 1
+    assert dict(run_queries({'loader': loader}))['loader']['X'].iloc[0] == 2
+    assert calls == pool
+
+
+def test_run_queries_failure_surfaces_after_the_others_finish(pool):
+    finished = []
+
+    def failing(session):
+        raise RuntimeError("warehouse suspended")
+
+    def slow(session):
+        time.sleep(0.2)
+        finished.append('slow')
+        return pd.DataFrame()
+
+    with pytest.raises(RuntimeError, match="warehouse suspended"):
+        for name, frame in run_queries({'failing': failing, 'slow': slow, 'sql': "SELECT 1"}, max_workers=3):
+            finished.append(name)
+    # The executor is joined before the error reaches the caller, so the slow query still completed
+    assert 'slow' in finished
+    assert 'failing' not in finished
@@ -0,0 +1,84 @@
+import pandas as pd
+
+from storage.recommendations import (
+    GENERAL_RECOMMENDATION,
+    RuleEngine,
+    generate_recommendations,
+    load_table_details,
+    recommendation_engine
+)
+
+
+def _counting_rules(calls):
+    def rule(name, impact):
+        def evaluate(data, storage_cost_per_tb):
+            calls.append(name)
+            return {'type': 'info', 'title': name, 'impact': impact * storage_cost_per_tb, 'content': ''}
+        return evaluate
+
+    return {
+        'small': {'inputs': ('a',), 'evaluate': rule('small', 1)},
+        'large': {'inputs': ('b',), 'evaluate': rule('large', 10)},
+    }
+
+
+def _frames():
+    return {'a': pd.DataFrame({'X': [1, 2]}), 'b': pd.DataFrame({'Y': [3.0]})}
+
+
+def test_results_ranked_by_impact():
+    engine = RuleEngine(_counting_rules([]))
+    assert [rec['title'] for rec in engine.evaluate(_frames(), 1.0)] == ['large', 'small']
+
+
+def test_unchanged_inputs_reuse_results():
+    calls = []
+    engine = RuleEngine(_counting_rules(calls))
+    first = engine.evaluate(_frames(), 1.0)
+    # Equal content in new frame objects still hits the cache
+    second = engine.evaluate(_frames(), 1.0)
+    assert sorted(calls) == ['large', 'small']
+    assert first == second
+
+
+def test_changed_input_reruns_only_its_rules():
+    calls = []
+    engine = RuleEngine(_counting_rules(calls))
+    engine.evaluate(_frames(), 1.0)
+    frames = _frames()
+    frames['a'] = pd.DataFrame({'X': [2, 1]})
+    engine.evaluate(frames, 1.0)
+    assert sorted(calls) == ['large', 'small', 'small']
+
+
+def test_price_change_and_clear_invalidate():
+    calls = []
+    engine = RuleEngine(_counting_rules(calls))
+    engine.evaluate(_frames(), 1.0)
+    results = engine.evaluate(_frames(), 2.0)
+    assert len(calls) == 4
+    assert results[0]['impact'] == 20
+    engine.clear()
+    engine.evaluate(_frames(), 2.0)
+    assert len(calls) == 6
+
+
+def test_missing_or_empty_inputs_skip_rules():
+    calls = []
+    engine = RuleEngine(_counting_rules(calls))
+    assert [rec['title'] for rec in engine.evaluate({'a': None, 'b': _frames()['b']}, 1.0)] == ['large']
+    assert engine.evaluate({'a': pd.DataFrame({'X': []}), 'b': None}, 1.0) == []
+    assert calls == ['large']
+
+
+def test_generate_recommendations_on_seeded_account(session):
+    recommendation_engine.clear()
+    details = load_table_details(session=session)
+    breakdown = pd.DataFrame({'Stage %': [25.0], 'Stage Storage (GB)': [500.0],
+                              'Fail-Safe %': [5.0], 'Failsafe Storage (GB)': [100.0]})
+    recommendations = generate_recommendations(None, None, breakdown, details)
+    assert recommendations[-1] is GENERAL_RECOMMENDATION
+    titles = [rec['title'] for rec in recommendations]
+    assert 'Stage Storage Bloat' in titles and 'High Fail-Safe Share' not in titles
+    impacts = [rec['impact'] for rec in recommendations[:-1]]
+    assert impacts == sorted(impacts, reverse=True)
@@ -0,0 +1,96 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage.recommendations import annual_cost, load_table_details
+from storage.retention import retention_actions, retention_statement, simulate_retention
+
+
+def _details(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    active = rng.integers(0, 10 ** 12, n).astype(float)
+    return pd.DataFrame({
+        'FULLY_QUALIFIED_TABLE_NAME': [f"DB.S.T{i}" for i in range(n)],
+        'TABLE_CATALOG': 'DB',
+        'TABLE_SCHEMA': 'S',
+        'TABLE_NAME': [f"T{i}" for i in range(n)],
+        'IS_TRANSIENT': rng.choice(['YES', 'NO'], n, p=[0.2, 0.8]),
+        'RETENTION_TIME': rng.choice([0, 1, 7, 30, 90], n),
+        'ACTIVE_BYTES': active,
+        'TIME_TRAVEL_BYTES': np.where(rng.random(n) < 0.8, active * rng.random(n) * 2, 0),
+        'FAILSAFE_BYTES': np.where(rng.random(n) < 0.8, active * rng.random(n) * 3, 0),
+    })
+
+
+def _brute_force(details, cap, ratio, cost):
+    # One table and one configuration at a time, straight from the model in storage.retention
+    time_travel_saved = failsafe_saved = 0.0
+    changed = converted = 0
+    for table in details.itertuples(index=False):
+        retention = table.RETENTION_TIME
+        if table.TIME_TRAVEL_BYTES <= 0 and table.FAILSAFE_BYTES <= 0:
+            continue
+        convert = table.IS_TRANSIENT != 'YES' and table.FAILSAFE_BYTES >= ratio * table.ACTIVE_BYTES
+        new_retention = min(retention, min(cap, 1) if convert else cap)
+        if retention > 0:
+            time_travel_saved += table.TIME_TRAVEL_BYTES / retention * (retention - new_retention)
+        if convert:
+            failsafe_saved += table.FAILSAFE_BYTES
+        changed += convert or new_retention < retention
+        converted += convert
+    return {
+        'TABLES_CHANGED': changed,
+        'TABLES_CONVERTED': converted,
+        'TIME_TRAVEL_SAVED_GB': time_travel_saved / 1024 ** 3,
+        'FAILSAFE_SAVED_GB': failsafe_saved / 1024 ** 3,
+        'ANNUAL_SAVINGS': annual_cost(time_travel_saved + failsafe_saved, cost),
+    }
+
+
+@pytest.mark.parametrize('chunk_cells', [4_000_000, 50])
+def test_simulation_matches_brute_force(chunk_cells):
+    details = _details()
+    caps, ratios = [0, 1, 3, 30, 120], [math.inf, 0.5, 1, 2]
+    simulation = simulate_retention(details, caps, ratios, 30.0, chunk_cells=chunk_cells)
+    assert len(simulation) == len(caps) * len(ratios)
+    for row in simulation.itertuples(index=False):
+        expected = _brute_force(details, row.RETENTION_CAP, row.TRANSIENT_RATIO, 30.0)
+        for column, value in expected.items():
+            assert getattr(row, column) == pytest.approx(value, rel=1e-9, abs=1e-6), (row, column)
+    assert simulation['ANNUAL_SAVINGS'].is_monotonic_decreasing
+
+
+def test_no_change_saves_nothing():
+    simulation = simulate_retention(_details(), [1000], [math.inf])
+    assert simulation['ANNUAL_SAVINGS'].iloc[0] == 0
+    assert simulation['TABLES_CHANGED'].iloc[0] == 0
+
+
+def test_actions_add_up_to_the_simulation():
+    details = _details()
+    actions = retention_actions(details, 1, 1.0, 30.0, n=None)
+    expected = _brute_force(details, 1, 1.0, 30.0)
+    assert actions['ANNUAL_SAVINGS'].sum() == pytest.approx(expected['ANNUAL_SAVINGS'])
+    assert actions['ANNUAL_SAVINGS'].is_monotonic_decreasing
+    top = retention_actions(details, 1, 1.0, 30.0, n=5)
+    assert top['FULLY_QUALIFIED_TABLE_NAME'].tolist() == actions['FULLY_QUALIFIED_TABLE_NAME'].head(5).tolist()
+
+
+def test_retention_statements_quote_names():
+    assert retention_statement('db', 'My "S"', 't', 1, False) == \
+        'ALTER TABLE "db"."My ""S"""."t" SET DATA_RETENTION_TIME_IN_DAYS = 1'
+    statements = retention_statement('DB', 'S', 'T', 0, True).split('; ')
+    assert statements[0] == 'CREATE TRANSIENT TABLE "DB"."S"."T_RETENTION_SWAP" LIKE "DB"."S"."T" COPY GRANTS'
+    assert statements[-2] == 'ALTER TABLE "DB"."S"."T" SWAP WITH "DB"."S"."T_RETENTION_SWAP"'
+    # The swapped-out permanent copy is dropped, so nothing is left holding the old bytes
+    assert statements[-1] == 'DROP TABLE "DB"."S"."T_RETENTION_SWAP"'
+
+
+def test_simulation_on_seeded_account(session):
+    details = load_table_details(session=session)
+    simulation = simulate_retention(details, [0, 1, 7], [math.inf, 1])
+    best = simulation.iloc[0]
+    expected = _brute_force(details.astype({'RETENTION_TIME': float}).fillna({'RETENTION_TIME': 1}),
+                            best['RETENTION_CAP'], best['TRANSIENT_RATIO'], 23.0)
+    assert best['ANNUAL_SAVINGS'] == pytest.approx(expected['ANNUAL_SAVINGS'])
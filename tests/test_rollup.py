@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+import storage.rollup as rollup
+
+from storage.rollup import (
+    ACCOUNT_USAGE_QUERIES,
+    ROLLUP_LOOKBACK_DAYS,
+    dashboard_queries,
+    refresh_rollup,
+    reset_rollup_refresh,
+    rollup_queries
+)
+
+TABLE = 'test_storage_rollup'
+
+
+def _frame(session, query):
+    return session.sql(query).to_pandas()
+
+
+def _assert_matches_account_usage(session, table=TABLE):
+    served = rollup_queries(table)
+    for name, query in ACCOUNT_USAGE_QUERIES.items():
+        direct = _frame(session, query)
+        assert len(direct) > 0, name
+        pd.testing.assert_frame_equal(_frame(session, served[name]), direct, check_dtype=False, rtol=1e-9)
+
+
+@pytest.fixture
+def rollup_table(session):
+    session.sql(f"DROP TABLE IF EXISTS {TABLE}").collect()
+    refresh_rollup(TABLE, session=session)
+    yield TABLE
+    session.sql(f"DROP TABLE IF EXISTS {TABLE}").collect()
+
+
+def test_rollup_matches_the_direct_queries(session, rollup_table):
+    _assert_matches_account_usage(session)
+    days = _frame(session, f"SELECT COUNT(*) AS n FROM {TABLE} WHERE grain = 'day'")['N'].iloc[0]
+    assert days == _frame(session, "SELECT COUNT(*) AS n FROM snowflake.account_usage.storage_usage")['N'].iloc[0]
+
+
+def test_incremental_refresh(session, rollup_table):
+    # Revise the latest day the way STORAGE_USAGE does while it catches up, and lose the last
+    # few rollup days, then check a second refresh only rewrites the lookback window
+    latest = _frame(session, "SELECT MAX(usage_date) AS d FROM snowflake.account_usage.storage_usage")['D'].iloc[0]
+    session.sql(f"DELETE FROM {TABLE} WHERE grain = 'day' AND period_start > DATE '{latest}' - 3").collect()
+    session.sql(f"UPDATE {TABLE} SET storage_gb = -1 WHERE grain = 'month'").collect()
+    before = _frame(session, f"SELECT period_start, refreshed_at FROM {TABLE} WHERE grain = 'day'")
+    session.sql(f"UPDATE account_usage.storage_usage SET storage_bytes = storage_bytes + 1e12 "
+                f"WHERE usage_date = DATE '{latest}'").collect()
+    try:
+        refresh_rollup(TABLE, session=session)
+        after = _frame(session, f"SELECT period_start, refreshed_at FROM {TABLE} WHERE grain = 'day'")
+        # Days at or before the watermark minus the lookback are left alone
+        cutoff = pd.Timestamp(before['PERIOD_START'].max()) - pd.Timedelta(days=ROLLUP_LOOKBACK_DAYS)
+        old = before[pd.to_datetime(before['PERIOD_START']) <= cutoff].merge(after, on='PERIOD_START')
+        assert len(old) > 0
+        assert (old['REFRESHED_AT_x'] == old['REFRESHED_AT_y']).all()
+        # Only the months touched by the window are rebuilt
+        months = _frame(session, f"SELECT period_start, storage_gb FROM {TABLE} WHERE grain = 'month' ORDER BY 1")
+        rebuilt = pd.to_datetime(months['PERIOD_START']) >= cutoff.to_period('M').to_timestamp()
+        assert (months.loc[rebuilt, 'STORAGE_GB'] > 0).all()
+        assert (months.loc[~rebuilt, 'STORAGE_GB'] == -1).all()
+        daily = rollup_queries(TABLE)['daily_storage_data']
+        pd.testing.assert_frame_equal(_frame(session, daily), _frame(session, ACCOUNT_USAGE_QUERIES['daily_storage_data']),
+                                      check_dtype=False, rtol=1e-9)
+    finally:
+        session.sql(f"UPDATE account_usage.storage_usage SET storage_bytes = storage_bytes - 1e12 "
+                    f"WHERE usage_date = DATE '{latest}'").collect()
+
+
+def test_dashboard_queries_refresh_once_per_interval(session, monkeypatch):
+    refreshes = []
+    monkeypatch.setattr(rollup, 'refresh_rollup', lambda table, session=None: refreshes.append(table))
+    reset_rollup_refresh()
+    assert dashboard_queries(TABLE, session=session) == rollup_queries(TABLE)
+    assert dashboard_queries(TABLE, session=session) == rollup_queries(TABLE)
+    assert refreshes == [TABLE]
+
+
+def test_dashboard_queries_fall_back_to_account_usage(session, monkeypatch):
+    def fail(table, session=None):
+        raise RuntimeError("Insufficient privileges to operate on schema")
+
+    monkeypatch.setattr(rollup, 'refresh_rollup', fail)
+    reset_rollup_refresh()
+    assert dashboard_queries(TABLE, session=session) == ACCOUNT_USAGE_QUERIES
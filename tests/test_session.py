@@ -0,0 +1,160 @@
+import os
+import threading
+import pytest
+
+import storage.session as session_module
+
+from types import SimpleNamespace
+from storage.session import SessionManager, profile_session_args, session_key
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeSession:
+    created = []
+
+    def __init__(self, config):
+        self.config = config
+        self.connection = FakeConnection()
+        FakeSession.created.append(self)
+
+    def close(self):
+        self.connection.closed = True
+
+
+FakeSession.builder = SimpleNamespace(configs=lambda config: SimpleNamespace(create=lambda: FakeSession(config)))
+
+
+def _no_active_session():
+    raise RuntimeError("No default Session is found")
+
+
+@pytest.fixture
+def token(monkeypatch, tmp_path):
+    # A Snowpark stand-in that records every session it creates, authenticated by a token file
+    token = tmp_path / 'token'
+    token.write_text('first')
+    monkeypatch.setattr(session_module, 'TOKEN_PATH', str(token))
+    monkeypatch.setattr(session_module, 'QUERY_BACKEND', 'snowflake')
+    monkeypatch.setattr(session_module, 'get_active_session', _no_active_session)
+    monkeypatch.setattr(session_module, 'Session', FakeSession)
+    FakeSession.created = []
+    return token
+
+
+def _rotate(token, contents):
+    mtime = os.path.getmtime(token) + 60
+    token.write_text(contents)
+    os.utime(token, (mtime, mtime))
+
+
+def test_shared_session_is_reused_and_revalidated(token):
+    manager = SessionManager(pool_size=2)
+    shared = manager.get_session()
+    assert manager.get_session() is shared
+    assert shared.config['token'] == 'first'
+    shared.connection.closed = True
+    reconnected = manager.get_session()
+    assert reconnected is not shared
+    assert manager.get_session() is reconnected
+
+
+def test_token_rotation_rebuilds_sessions(token):
+    manager = SessionManager(pool_size=2)
+    shared = manager.get_session()
+    with manager.pooled_session() as checked_out:
+        with manager.pooled_session() as idle:
+            pass
+        _rotate(token, 'second')
+        rotated = manager.get_session()
+        assert rotated is not shared
+        assert rotated.config['token'] == 'second'
+        # Sessions on the old token are closed; one still in use is closed once it is returned
+        assert shared.connection.closed and idle.connection.closed
+        assert not checked_out.connection.closed
+    assert checked_out.connection.closed
+    with manager.pooled_session() as fresh:
+        assert fresh not in (idle, checked_out)
+        assert fresh.config['token'] == 'second'
+
+
+def test_pool_reuses_and_bounds_sessions(token):
+    manager = SessionManager(pool_size=1)
+    with manager.pooled_session() as first:
+        pass
+    with manager.pooled_session() as second:
+        assert second is first
+        # The only slot is taken, so another caller waits and then gives up
+        with pytest.raises(TimeoutError):
+            with manager.pooled_session(timeout=0.05):
+                pass
+    assert len(FakeSession.created) == 1
+
+
+def test_pool_hands_out_distinct_sessions_concurrently(token):
+    manager = SessionManager(pool_size=3)
+    barrier = threading.Barrier(3)
+    held = []
+
+    def worker():
+        with manager.pooled_session(timeout=5) as session:
+            held.append(session)
+            barrier.wait(5)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(session) for session in held}) == 3
+    with manager.pooled_session() as reused:
+        assert reused in held
+
+
+def test_sessions_are_scoped_by_key(token):
+    manager = SessionManager(pool_size=1)
+    sysadmin = manager.get_session(role='SYSADMIN')
+    assert manager.get_session(role='SYSADMIN') is sysadmin
+    assert manager.get_session(role='ACCOUNTADMIN') is not sysadmin
+    with manager.pooled_session(role='SYSADMIN'):
+        # A different key has its own pool and slots
+        with manager.pooled_session(role='ACCOUNTADMIN', timeout=0.05) as other:
+            assert other is not sysadmin
+
+
+def test_active_session_is_used_as_is(token, monkeypatch):
+    active = FakeSession({})
+    monkeypatch.setattr(session_module, 'get_active_session', lambda: active)
+    manager = SessionManager(pool_size=1)
+    assert manager.get_session(role='SYSADMIN') is active
+    with manager.pooled_session() as pooled:
+        assert pooled is active
+    assert FakeSession.created == [active]
+
+
+def test_close_closes_every_session(token):
+    manager = SessionManager(pool_size=2)
+    shared = manager.get_session()
+    with manager.pooled_session() as idle:
+        pass
+    manager.close()
+    assert shared.connection.closed and idle.connection.closed
+    assert manager.get_session() is not shared
+
+
+def _key(profile):
+    creds, kwargs = profile_session_args(profile)
+    return session_key(creds, **kwargs)
+
+
+def test_session_key_separates_users():
+    analyst = {'account': 'ACME', 'user': 'ANALYST', 'role': 'SYSADMIN'}
+    auditor = {'account': 'ACME', 'user': 'AUDITOR', 'role': 'SYSADMIN'}
+    assert _key(analyst) != _key(auditor)
+    assert _key(analyst) == _key(dict(analyst))
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage.unused_tables import UNUSED_TABLE_COLUMNS, filter_unused_tables, load_table_access
+
+
+def _access(days, dtype):
+    return pd.DataFrame({
+        'TABLE_ID': range(len(days)),
+        'FULLY_QUALIFIED_TABLE_NAME': [f"DB.S.T{i}" for i in range(len(days))],
+        'TOTAL_STORAGE_TB': np.linspace(4, 1, len(days)),
+        'LAST_ACCESSED_AT': pd.NaT,
+        'LAST_ACCESSED_BY': None,
+        'LAST_QUERY_ID': None,
+        'DAYS_SINCE_LAST_ACCESS': pd.Series(days, dtype=dtype),
+    })
+
+
+@pytest.mark.parametrize('dtype', ['Int64', 'float64', 'object', 'int64[pyarrow]'])
+def test_filter_skips_missing_days(dtype):
+    access = _access([200, None, 10, 91], dtype)
+    unused = filter_unused_tables(access, 90, 23.0)
+    assert unused['TABLE_ID'].tolist() == [0, 3]
+    assert list(unused.columns) == UNUSED_TABLE_COLUMNS
+
+
+def test_filter_cost_and_order():
+    access = _access([100, 100, 100], 'int64')
+    unused = filter_unused_tables(access, 90, 10.0)
+    assert unused['ANNUALIZED_STORAGE_COST'].tolist() == pytest.approx([4 * 120, 2.5 * 120, 1 * 120])
+    assert unused['ANNUALIZED_STORAGE_COST'].is_monotonic_decreasing
+
+
+def test_filter_seeded_access(session):
+    access = load_table_access(session=session)
+    unused = filter_unused_tables(access, 30, 23.0)
+    assert len(unused) > 0
+    assert (unused['DAYS_SINCE_LAST_ACCESS'] > 30).all()
+    assert unused['ANNUALIZED_STORAGE_COST'].is_monotonic_decreasing
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import storage.visualization as visualization
+
+from storage.frames import frame_fingerprint
+from storage.visualization import clear_figure_cache, memoize_figure
+
+
+def _frame():
+    return pd.DataFrame({
+        'USAGE_DATE': pd.date_range('2024-01-01', periods=5),
+        'STORAGE_GB': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'NAME': list('abcde'),
+    })
+
+
+def test_fingerprint_is_stable_for_equal_frames():
+    assert frame_fingerprint(_frame()) == frame_fingerprint(_frame())
+    table = pa.Table.from_pandas(_frame(), preserve_index=False)
+    assert frame_fingerprint(table) == frame_fingerprint(pa.Table.from_pandas(_frame(), preserve_index=False))
+    assert frame_fingerprint(None) == 'none'
+
+
+@pytest.mark.parametrize('change', [
+    lambda frame: frame.assign(STORAGE_GB=frame['STORAGE_GB'].replace(3.0, 3.5)),
+    lambda frame: frame.assign(NAME=frame['NAME'].replace('c', 'z')),
+    lambda frame: frame.astype({'STORAGE_GB': 'float32'}),
+    lambda frame: frame[['STORAGE_GB', 'USAGE_DATE', 'NAME']],
+    lambda frame: frame.rename(columns={'STORAGE_GB': 'STAGE_GB'}),
+    lambda frame: frame.iloc[::-1],
+    lambda frame: frame.iloc[:4],
+])
+def test_fingerprint_changes_with_content(change):
+    assert frame_fingerprint(change(_frame())) != frame_fingerprint(_frame())
+
+
+def test_arrow_fingerprint_changes_with_content():
+    table = pa.Table.from_pandas(_frame(), preserve_index=False)
+    changed = table.set_column(1, 'STORAGE_GB', pa.array(np.arange(5, dtype=float)))
+    assert frame_fingerprint(changed) != frame_fingerprint(table)
+    assert frame_fingerprint(table.cast(table.schema.set(1, pa.field('STORAGE_GB', pa.float32())))) != \
+        frame_fingerprint(table)
+
+
+@pytest.fixture
+def counted_builder():
+    clear_figure_cache()
+    builds = []
+
+    @memoize_figure
+    def build_test_figure(data, title=None):
+        builds.append(title)
+        return object()
+
+    yield build_test_figure, builds
+    clear_figure_cache()
+
+
+def test_memoized_figures_are_reused(counted_builder):
+    build, builds = counted_builder
+    figure = build(_frame(), title="Storage")
+    assert build(_frame(), title="Storage") is figure
+    assert builds == ["Storage"]
+    # A different frame or parameter builds again
+    assert build(_frame().iloc[:3], title="Storage") is not figure
+    assert build(_frame(), title="Stage") is not figure
+    assert len(builds) == 3
+
+
+def test_figure_cache_evicts_least_recently_used(counted_builder, monkeypatch):
+    build, builds = counted_builder
+    monkeypatch.setattr(visualization, 'FIGURE_CACHE_SIZE', 2)
+    first = build(_frame(), title="first")
+    build(_frame(), title="second")
+    # Reading "first" makes "second" the least recently used
+    assert build(_frame(), title="first") is first
+    build(_frame(), title="third")
+    assert build(_frame(), title="first") is first
+    build(_frame(), title="second")
+    assert builds == ["first", "second", "third", "second"]
+    assert len(visualization._figures) == 2